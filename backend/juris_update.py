@@ -18,6 +18,8 @@ import lancedb
 import requests
 from google.genai import types
 
+from rag.lance_schema import EMBED_L2_NORMALIZE, LANCE_VECTOR_TYPE
+
 # Lazy imports — only needed at runtime for scraping / PDF extraction
 fitz = None  # type: ignore[assignment]
 
@@ -1828,7 +1830,8 @@ def _juris_lance_schema():
     import pyarrow as pa
     return pa.schema(
         [
-            pa.field("vector", pa.list_(pa.float32(), EMBED_DIM)),
+            # Mesmo tipo de rag/ingest.LANCE_SCHEMA (LANCE_VECTOR_DTYPE).
+            pa.field("vector", pa.list_(LANCE_VECTOR_TYPE, EMBED_DIM)),
             pa.field("doc_id", pa.utf8()),
             pa.field("tribunal", pa.utf8()),
             pa.field("tipo", pa.utf8()),
@@ -1916,6 +1919,10 @@ def _hash_embed_text(text: str, *, dim: int = EMBED_DIM) -> list[float]:
         sign = 1.0 if (digest[4] % 2 == 0) else -1.0
         weight = 1.0 + ((digest[5] % 9) / 10.0)
         vec[idx] += sign * weight
+    return _l2_normalize(vec)
+
+
+def _l2_normalize(vec: list[float]) -> list[float]:
     norm = math.sqrt(sum(v * v for v in vec))
     if norm <= 0:
         return vec
@@ -1975,7 +1982,10 @@ def _embed_docs(
                     output_dimensionality=EMBED_DIM,
                 ),
             )
+            # Mesma escala das linhas gravadas por rag/ingest (EMBED_L2_NORMALIZE).
             vectors = [list(item.values) for item in (result.embeddings or [])]
+            if EMBED_L2_NORMALIZE:
+                vectors = [_l2_normalize(vec) for vec in vectors]
             if len(vectors) != len(batch):
                 raise RuntimeError("Falha ao gerar embeddings de todos os documentos do lote.")
         except Exception as exc:
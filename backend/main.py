@@ -6,9 +6,11 @@ try:
 except Exception:
     pass
 
+import asyncio
 import base64
-from collections import deque
+from collections import OrderedDict, deque
 import copy
+import functools
 import html
 import io
 import json
@@ -16,7 +18,10 @@ import logging
 import hashlib
 import os
 import queue
+import random
 import re
+import shutil
+import sqlite3
 import threading
 import sys
 import time
@@ -25,7 +30,7 @@ import wave
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from pathlib import Path
-from typing import Any, Callable, Literal, Optional
+from typing import Any, Callable, Iterable, Iterator, Literal, Optional
 
 from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
@@ -40,9 +45,16 @@ try:
 except Exception:  # pragma: no cover - optional runtime dependency in some test harnesses
     pa = None
 try:
-    import fitz
+    import numpy as np
 except Exception:  # pragma: no cover - optional runtime dependency in some test harnesses
-    fitz = None
+    np = None
+# PyMuPDF so e carregado na primeira indexacao de PDF (ver _get_fitz), nao no boot.
+fitz: Any = None
+_FITZ_IMPORT_ATTEMPTED = False
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional speedup, stdlib json is the fallback
+    orjson = None
 from google.genai import types
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 from backend.tts_legacy_google import (
@@ -106,6 +118,7 @@ from rag.query import (  # noqa: E402
     orgao_label,
     run_query,
     type_label,
+    warm_up_reranker_async,
 )
 
 
@@ -187,6 +200,15 @@ if not _API_LOGGER.handlers:
         pass
 
 
+def _json_dumps_text(payload: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(payload, ensure_ascii=False)
+
+
 def _new_trace_id() -> str:
     return uuid.uuid4().hex[:12]
 
@@ -301,28 +323,19 @@ def _get_tts_httpx_client(timeout_ms: int) -> httpx.Client:
         return client
 
 
-def _get_acervo_httpx_client(timeout_ms: int) -> httpx.Client:
-    normalized_timeout_ms = max(5000, min(int(timeout_ms or 60000), 600000))
-    with _ACERVO_HTTPX_CLIENTS_LOCK:
-        existing = _ACERVO_HTTPX_CLIENTS.get(normalized_timeout_ms)
-        if existing is not None:
-            return existing
-
-        timeout_s = normalized_timeout_ms / 1000.0
-        connect_s = min(10.0, timeout_s)
-        timeout = httpx.Timeout(
-            timeout=timeout_s,
-            connect=connect_s,
-            read=timeout_s,
-            write=timeout_s,
-            pool=min(15.0, timeout_s),
-        )
-        client = httpx.Client(
-            timeout=timeout,
-            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+def _get_acervo_httpx_client(timeout_ms: int | None = None) -> httpx.Client:
+    # Um unico pool para OCR/limpeza/embeddings: o timeout de cada chamada segue via
+    # HttpOptions.timeout, entao nao faz sentido abrir um cliente (e novos handshakes
+    # TLS) por valor de timeout.
+    global _ACERVO_HTTPX_CLIENT
+    with _ACERVO_HTTPX_CLIENT_LOCK:
+        if _ACERVO_HTTPX_CLIENT is not None:
+            return _ACERVO_HTTPX_CLIENT
+        _ACERVO_HTTPX_CLIENT = httpx.Client(
+            timeout=httpx.Timeout(timeout=300.0, connect=10.0, pool=15.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=120.0),
         )
-        _ACERVO_HTTPX_CLIENTS[normalized_timeout_ms] = client
-        return client
+        return _ACERVO_HTTPX_CLIENT
 
 app = FastAPI(
     title="Ratio API - Pesquisa Jurisprudencial",
@@ -330,6 +343,18 @@ app = FastAPI(
     description="Backend desacoplado para consulta RAG STF/STJ.",
 )
 
+RERANKER_PREWARM = os.getenv("RERANKER_PREWARM", "1").strip() != "0"
+
+
+def _warm_up_reranker_on_startup() -> None:
+    # Carrega o CrossEncoder local em segundo plano enquanto o servidor sobe: a primeira
+    # consulta deixa de pagar a carga do modelo (sondagem + pesos + tokenizer).
+    if RERANKER_PREWARM:
+        warm_up_reranker_async()
+
+
+app.router.add_event_handler("startup", _warm_up_reranker_on_startup)
+
 RAG_CONFIG_VERSION = "2026-02-24-rich-default-v4-gemini-3-flash-preview-default"
 
 DEFAULT_CORS_ORIGINS = "http://127.0.0.1:5500,http://localhost:5500"
@@ -411,6 +436,76 @@ RATE_LIMIT_JURIS_UPDATE_PER_HOUR = max(0, int(os.getenv("RATE_LIMIT_JURIS_UPDATE
 _RATE_LIMIT_LOCK = threading.Lock()
 _RATE_LIMIT_STATE: dict[str, dict[str, deque[float]]] = {}
 
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "1").strip() != "0"
+QUERY_CACHE_MAX_ENTRIES = max(1, min(int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024")), 100000))
+QUERY_CACHE_TTL_SECONDS = max(0, int(os.getenv("QUERY_CACHE_TTL_SECONDS", "900")))
+TTS_RESPONSE_CACHE_MAX_ENTRIES = max(1, min(int(os.getenv("TTS_RESPONSE_CACHE_MAX_ENTRIES", "64")), 4096))
+TTS_RESPONSE_CACHE_MAX_BYTES = max(0, int(os.getenv("TTS_RESPONSE_CACHE_MAX_MB", "64"))) * 1024 * 1024
+
+
+class _ResponseCache:
+    """Thread-safe LRU with optional TTL and byte budget for whole API responses."""
+
+    def __init__(self, *, max_entries: int, ttl_seconds: float = 0.0, max_bytes: int = 0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.max_bytes = max(0, int(max_bytes))
+        self._items: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            stored_ts, _size, value = entry
+            if self.ttl_seconds and time.monotonic() - stored_ts > self.ttl_seconds:
+                self._pop_locked(key)
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any, *, size: int = 0) -> None:
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop_locked(key)
+            self._items[key] = (time.monotonic(), int(size), value)
+            self._total_bytes += int(size)
+            while len(self._items) > self.max_entries or (self.max_bytes and self._total_bytes > self.max_bytes):
+                self._pop_locked(next(iter(self._items)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._total_bytes = 0
+
+    def _pop_locked(self, key: str) -> None:
+        entry = self._items.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+
+def _is_cacheable_query_response(answer: str, meta: Any) -> bool:
+    # Falhas de geracao (chave invalida, cota, indisponibilidade) nao podem ficar presas no cache.
+    if _QUERY_FAILURE_ANSWER in str(answer or ""):
+        return False
+    generation = meta.get("generation") if isinstance(meta, dict) else None
+    if isinstance(generation, dict) and not str(generation.get("selected_model") or "").strip():
+        return False
+    return True
+
+
+def _response_cache_key(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_QUERY_RESPONSE_CACHE = _ResponseCache(max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+_QUERY_FAILURE_ANSWER = "Nao foi possivel gerar resposta."
+_TTS_RESPONSE_CACHE = _ResponseCache(max_entries=TTS_RESPONSE_CACHE_MAX_ENTRIES, max_bytes=TTS_RESPONSE_CACHE_MAX_BYTES)
+
 
 def _rate_limit_client_key(request: Request) -> str:
     client = getattr(request, "client", None)
@@ -632,6 +727,10 @@ LEGACY_TTS_REQUEST_TIMEOUT_MS = max(
     10000,
     min(int(os.getenv("GOOGLE_TTS_REQUEST_TIMEOUT_MS", "45000")), 300000),
 )
+LEGACY_TTS_MAX_CONCURRENCY = max(1, min(int(os.getenv("GOOGLE_TTS_MAX_CONCURRENCY", "6")), 8))
+LEGACY_TTS_CACHE_DIR = (os.getenv("RATIO_TTS_CACHE") or "").strip()
+LEGACY_TTS_PREWARM = os.getenv("GOOGLE_TTS_PREWARM", "1").strip() != "0"
+LEGACY_TTS_CACHE_MAX_MB = max(16, min(int(os.getenv("GOOGLE_TTS_CACHE_MAX_MB", "256")), 8192))
 LEGACY_GCLOUD_TO_GEMINI_VOICE = {
     "pt-BR-Neural2-B": "charon",
     "pt-BR-Neural2-C": "kore",
@@ -640,6 +739,10 @@ LEGACY_GCLOUD_TO_GEMINI_VOICE = {
 USER_ACERVO_TABLE = (os.getenv("USER_ACERVO_TABLE") or "meu_acervo").strip() or "meu_acervo"
 USER_ACERVO_MANIFEST = _runtime_logs_dir() / "meu_acervo_manifest.json"
 USER_ACERVO_UPLOAD_DIR = _runtime_logs_dir() / "meu_acervo_uploads"
+USER_ACERVO_EMBED_CACHE_PATH = _runtime_logs_dir() / "meu_acervo_embed_cache.sqlite3"
+USER_ACERVO_EMBED_CACHE_ENABLED = os.getenv("USER_ACERVO_EMBED_CACHE_ENABLED", "1").strip() != "0"
+# ~3 KB por linha em 768 dims: 100k linhas ~ 300 MB; acima disso sai o uso mais antigo (LRU).
+USER_ACERVO_EMBED_CACHE_MAX_ROWS = max(1, int(os.getenv("USER_ACERVO_EMBED_CACHE_MAX_ROWS", "100000")))
 USER_ACERVO_LANCE_DIR = _resolve_data_dir("lancedb_store")
 USER_ACERVO_CHUNK_CHARS = max(500, min(int(os.getenv("USER_ACERVO_CHUNK_CHARS", "1400")), 4000))
 USER_ACERVO_MAX_FILES_PER_REQUEST = max(1, min(int(os.getenv("USER_ACERVO_MAX_FILES_PER_REQUEST", "500")), 5000))
@@ -651,10 +754,24 @@ USER_ACERVO_MAX_REQUEST_SIZE_MB = max(
 USER_ACERVO_MAX_FILE_SIZE_BYTES = USER_ACERVO_MAX_FILE_SIZE_MB * 1024 * 1024
 USER_ACERVO_MAX_REQUEST_SIZE_BYTES = USER_ACERVO_MAX_REQUEST_SIZE_MB * 1024 * 1024
 USER_ACERVO_CLEAN_MODEL = (os.getenv("USER_ACERVO_CLEAN_MODEL") or "gemini-2.5-flash").strip() or "gemini-2.5-flash"
+USER_ACERVO_CLEAN_FORCE_LLM = os.getenv("USER_ACERVO_CLEAN_FORCE_LLM", "0").strip() == "1"
+USER_ACERVO_CLEAN_MIN_ALNUM_RATIO = max(0.0, min(float(os.getenv("USER_ACERVO_CLEAN_MIN_ALNUM_RATIO", "0.85")), 1.0))
+USER_ACERVO_CLEAN_CACHE_MAX_ENTRIES = max(0, min(int(os.getenv("USER_ACERVO_CLEAN_CACHE_MAX_ENTRIES", "10000")), 100000))
 USER_ACERVO_OCR_MODEL = (os.getenv("USER_ACERVO_OCR_MODEL") or "gemini-2.5-flash").strip() or "gemini-2.5-flash"
 USER_ACERVO_EMBED_MODEL = (os.getenv("USER_ACERVO_EMBED_MODEL") or "gemini-embedding-001").strip() or "gemini-embedding-001"
 USER_ACERVO_REQUIRE_CONFIRM = os.getenv("USER_ACERVO_REQUIRE_CONFIRM", "1").strip() != "0"
-USER_ACERVO_OCR_DPI = max(96, min(int(os.getenv("USER_ACERVO_OCR_DPI", "144")), 300))
+# Acima de ~200 DPI o OCR de texto juridico nao melhora e so cresce o payload.
+USER_ACERVO_OCR_DPI = max(96, min(int(os.getenv("USER_ACERVO_OCR_DPI", "144")), 200))
+USER_ACERVO_OCR_IMAGE_FORMAT = (
+    "png" if (os.getenv("USER_ACERVO_OCR_IMAGE_FORMAT") or "jpeg").strip().lower() == "png" else "jpeg"
+)
+USER_ACERVO_OCR_JPEG_QUALITY = max(50, min(int(os.getenv("USER_ACERVO_OCR_JPEG_QUALITY", "85")), 95))
+USER_ACERVO_OCR_GRAYSCALE = os.getenv("USER_ACERVO_OCR_GRAYSCALE", "1").strip() != "0"
+USER_ACERVO_OCR_BATCH_SIZE = max(1, min(int(os.getenv("USER_ACERVO_OCR_BATCH_SIZE", "6")), 16))
+USER_ACERVO_OCR_CONCURRENCY = max(
+    1,
+    min(int(os.getenv("USER_ACERVO_OCR_CONCURRENCY", str(min(8, os.cpu_count() or 1)))), 16),
+)
 USER_ACERVO_EMBED_DIM = 768
 USER_ACERVO_CLEAN_TIMEOUT_MS = max(
     10000,
@@ -672,19 +789,40 @@ USER_ACERVO_RETRY_ATTEMPTS = max(
     1,
     min(int(os.getenv("USER_ACERVO_RETRY_ATTEMPTS", "2")), 4),
 )
+# Limite global de chamadas Gemini do Meu Acervo (OCR, limpeza, embeddings); 0 desliga.
+USER_ACERVO_QPS = max(0.0, min(float(os.getenv("USER_ACERVO_QPS", "8")), 200.0))
+USER_ACERVO_BURST = max(1, min(int(os.getenv("USER_ACERVO_BURST", "16")), 400))
 USER_ACERVO_EMBED_BATCH_SIZE = max(
     1,
     min(int(os.getenv("USER_ACERVO_EMBED_BATCH_SIZE", "8")), 32),
 )
+USER_ACERVO_EMBED_PARALLELISM = max(1, min(int(os.getenv("USER_ACERVO_EMBED_PARALLELISM", "4")), 16))
+USER_ACERVO_UPSERT_BATCH_SIZE = max(1, min(int(os.getenv("USER_ACERVO_UPSERT_BATCH_SIZE", "500")), 10000))
+USER_ACERVO_FTS_REBUILD_ROWS = max(1, int(os.getenv("USER_ACERVO_FTS_REBUILD_ROWS", "500")))
+USER_ACERVO_FTS_REBUILD_INTERVAL_SECONDS = max(0, int(os.getenv("USER_ACERVO_FTS_REBUILD_INTERVAL_SECONDS", "300")))
+# 0 desliga o indice vetorial; abaixo do limite a busca exata (sem indice) ja e rapida.
+USER_ACERVO_VECTOR_INDEX_MIN_ROWS = max(0, int(os.getenv("USER_ACERVO_VECTOR_INDEX_MIN_ROWS", "50000")))
 USER_ACERVO_INDEX_MAX_WORKERS = max(1, min(int(os.getenv("USER_ACERVO_INDEX_MAX_WORKERS", "2")), 8))
 USER_ACERVO_INDEX_JOB_POLL_MS = max(500, min(int(os.getenv("USER_ACERVO_INDEX_JOB_POLL_MS", "1200")), 10000))
 USER_ACERVO_INDEX_JOB_TTL_SECONDS = max(600, min(int(os.getenv("USER_ACERVO_INDEX_JOB_TTL_SECONDS", "21600")), 86400))
+USER_ACERVO_INDEX_JOB_MAX_ENTRIES = 4096
 
-_USER_ACERVO_JOBS: dict[str, dict[str, Any]] = {}
+_USER_ACERVO_JOBS: OrderedDict[str, dict[str, Any]] = OrderedDict()
+# (finished_ts, job_id) em ordem de conclusao: a expiracao por TTL so olha o inicio da fila.
+_USER_ACERVO_FINISHED_JOBS: deque[tuple[float, str]] = deque()
 _USER_ACERVO_JOBS_LOCK = threading.Lock()
 _USER_ACERVO_WRITE_LOCK = threading.Lock()
+_USER_ACERVO_VECTOR_INDEX_LOCK = threading.Lock()
 _USER_ACERVO_CLEAN_CIRCUIT_UNTIL = 0.0
+_USER_ACERVO_EMBED_CACHE_CONN: sqlite3.Connection | None = None
+_USER_ACERVO_EMBED_CACHE_ROWS = 0
+_USER_ACERVO_FTS_PENDING_ROWS = 0
+_USER_ACERVO_FTS_LAST_BUILD_TS = time.monotonic()
+_USER_ACERVO_EMBED_CACHE_LOCK = threading.Lock()
 _USER_ACERVO_CLEAN_CIRCUIT_LOCK = threading.Lock()
+# LRU (modelo, sha256 do chunk) -> texto limpo pelo LLM; fallbacks heuristicos nao entram.
+_USER_ACERVO_CLEAN_CACHE: OrderedDict[tuple[str, str], str] = OrderedDict()
+_USER_ACERVO_CLEAN_CACHE_LOCK = threading.Lock()
 JURIS_UPDATE_TARGET_YEAR = max(2026, min(int(os.getenv("JURIS_UPDATE_TARGET_YEAR", "2026")), 2100))
 JURIS_UPDATE_INCLUDE_STF = os.getenv("JURIS_UPDATE_INCLUDE_STF", "1").strip() != "0"
 JURIS_UPDATE_INCLUDE_STJ = os.getenv("JURIS_UPDATE_INCLUDE_STJ", "1").strip() != "0"
@@ -758,8 +896,8 @@ DOC_CITATION_BRACKET_PATTERN = re.compile(
 
 _TTS_HTTPX_CLIENTS: dict[int, httpx.Client] = {}
 _TTS_HTTPX_CLIENTS_LOCK = threading.Lock()
-_ACERVO_HTTPX_CLIENTS: dict[int, httpx.Client] = {}
-_ACERVO_HTTPX_CLIENTS_LOCK = threading.Lock()
+_ACERVO_HTTPX_CLIENT: httpx.Client | None = None
+_ACERVO_HTTPX_CLIENT_LOCK = threading.Lock()
 
 
 def _short(text: str, max_chars: int = 1200) -> str:
@@ -913,15 +1051,31 @@ def _normalize_for_tts(raw: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
-def _build_ssml(chunk: str) -> str:
+# Partes constantes do SSML, montadas uma unica vez.
+_SSML_PREFIX = "<speak>"
+_SSML_SUFFIX = "</speak>"
+_SSML_AFFIX_BYTES = len(_SSML_PREFIX) + len(_SSML_SUFFIX)
+_SSML_BREAK_ALT = f"<break time='{TTS_BREAK_ALT_MS}ms'/>"
+_SSML_BREAK_ART = f"<break time='{TTS_BREAK_ART_MS}ms'/>"
+
+
+def _ssml_body(chunk: str) -> str:
     escaped = html.escape(chunk or "")
-    escaped = escaped.replace(TTS_MARK_ALT, f"<break time='{TTS_BREAK_ALT_MS}ms'/>")
-    escaped = escaped.replace(TTS_MARK_ART, f"<break time='{TTS_BREAK_ART_MS}ms'/>")
-    return f"<speak>{escaped}</speak>"
+    if "[[" in escaped:
+        escaped = escaped.replace(TTS_MARK_ALT, _SSML_BREAK_ALT).replace(TTS_MARK_ART, _SSML_BREAK_ART)
+    return escaped
+
+
+def _build_ssml(chunk: str) -> str:
+    return _SSML_PREFIX + _ssml_body(chunk) + _SSML_SUFFIX
 
 
 def _ssml_bytes(chunk: str) -> int:
-    return len(_build_ssml(chunk).encode("utf-8"))
+    # Chamado em loop pela divisao em blocos: mede o miolo sem montar/encodar o SSML inteiro.
+    body = _ssml_body(chunk)
+    if body.isascii():
+        return _SSML_AFFIX_BYTES + len(body)
+    return _SSML_AFFIX_BYTES + len(body.encode("utf-8"))
 
 
 def _slice_prefix_within_ssml_limit(text: str, max_ssml_bytes: int) -> str:
@@ -1737,6 +1891,14 @@ def _stream_google_tts_chunks(
     ) from last_error
 
 
+def _legacy_tts_cache_dir() -> str:
+    if not TTS_CACHE_ENABLED:
+        return ""
+    if LEGACY_TTS_CACHE_DIR:
+        return LEGACY_TTS_CACHE_DIR
+    return str(_tts_cache_dir() / "legacy")
+
+
 def _legacy_tts_config() -> LegacyGoogleTTSConfig:
     return LegacyGoogleTTSConfig(
         api_key=_legacy_tts_api_key(),
@@ -1747,6 +1909,10 @@ def _legacy_tts_config() -> LegacyGoogleTTSConfig:
         max_ssml_chars=LEGACY_TTS_MAX_CHARS,
         timeout_ms=LEGACY_TTS_REQUEST_TIMEOUT_MS,
         endpoint=LEGACY_TTS_ENDPOINT,
+        max_concurrency=LEGACY_TTS_MAX_CONCURRENCY,
+        cache_dir=_legacy_tts_cache_dir(),
+        cache_max_mb=LEGACY_TTS_CACHE_MAX_MB,
+        prewarm=LEGACY_TTS_PREWARM,
     )
 
 
@@ -2083,6 +2249,7 @@ def _set_user_source_deleted(source_id: str, *, deleted: bool) -> dict[str, Any]
             continue
         src["deleted_at"] = _utc_now_iso() if deleted else None
         _save_user_sources_manifest({"version": 1, "sources": sources})
+        _QUERY_RESPONSE_CACHE.clear()
         return src
 
     raise HTTPException(
@@ -2146,10 +2313,22 @@ def _list_available_sources_payload() -> dict[str, Any]:
     }
 
 
+def _get_fitz() -> Any:
+    global fitz, _FITZ_IMPORT_ATTEMPTED
+    if fitz is None and not _FITZ_IMPORT_ATTEMPTED:
+        _FITZ_IMPORT_ATTEMPTED = True
+        try:
+            import fitz as fitz_module
+        except Exception:  # pragma: no cover - optional runtime dependency in some test harnesses
+            fitz_module = None
+        fitz = fitz_module
+    return fitz
+
+
 def _require_user_acervo_runtime() -> None:
-    if lancedb is None or pa is None:
-        raise RuntimeError("Dependencias de indexacao nao disponiveis (lancedb/pyarrow).")
-    if fitz is None:
+    if lancedb is None or pa is None or np is None:
+        raise RuntimeError("Dependencias de indexacao nao disponiveis (lancedb/pyarrow/numpy).")
+    if _get_fitz() is None:
         raise RuntimeError("PyMuPDF nao disponivel neste ambiente de execucao.")
 
 
@@ -2169,6 +2348,30 @@ def _raise_user_acervo_validation_error(code: str, message: str, hint: str = "")
     raise HTTPException(status_code=400, detail=detail)
 
 
+def _open_unlinked_upload_handle(directory: Path) -> Any:
+    # Linux: arquivo anonimo (O_TMPFILE) so ganha entrada no diretorio apos validacao.
+    tmpfile_flag = getattr(os, "O_TMPFILE", 0)
+    if not tmpfile_flag:
+        return None
+    try:
+        fd = os.open(str(directory), tmpfile_flag | os.O_RDWR, 0o600)
+    except OSError:
+        return None
+    return os.fdopen(fd, "w+b")
+
+
+def _link_unlinked_upload_handle(handle: Any, target: Path) -> None:
+    handle.flush()
+    try:
+        os.link(f"/proc/self/fd/{handle.fileno()}", str(target))
+        return
+    except OSError:
+        pass
+    handle.seek(0)
+    with target.open("wb") as out:
+        shutil.copyfileobj(handle, out, 1024 * 1024)
+
+
 def _store_upload_file(upload: UploadFile, filename: str) -> tuple[Path, str, int]:
     USER_ACERVO_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -2178,7 +2381,11 @@ def _store_upload_file(upload: UploadFile, filename: str) -> tuple[Path, str, in
     total_bytes = 0
 
     try:
-        with temp_path.open("wb") as handle:
+        handle = _open_unlinked_upload_handle(USER_ACERVO_UPLOAD_DIR)
+        unlinked = handle is not None
+        if handle is None:
+            handle = temp_path.open("wb")
+        with handle:
             while True:
                 chunk = upload.file.read(1024 * 1024)
                 if not chunk:
@@ -2195,12 +2402,14 @@ def _store_upload_file(upload: UploadFile, filename: str) -> tuple[Path, str, in
                     )
                 digest.update(chunk)
                 handle.write(chunk)
-        if total_bytes <= 0:
-            raise _UserAcervoValidationError(
-                code="empty_file",
-                message=f"Arquivo '{filename}' esta vazio.",
-                hint="Selecione arquivos PDF validos com conteudo.",
-            )
+            if total_bytes <= 0:
+                raise _UserAcervoValidationError(
+                    code="empty_file",
+                    message=f"Arquivo '{filename}' esta vazio.",
+                    hint="Selecione arquivos PDF validos com conteudo.",
+                )
+            if unlinked:
+                _link_unlinked_upload_handle(handle, temp_path)
         return temp_path, digest.hexdigest(), int(total_bytes)
     except Exception:
         try:
@@ -2456,10 +2665,37 @@ def _open_user_table(create_if_missing: bool = False):
     return db.create_table(USER_ACERVO_TABLE, data=[], schema=_user_lance_schema(), mode="overwrite")
 
 
-def _existing_hashes_for_source(source_id: str) -> set[str]:
+_SHA256_HEX_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _sql_quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _existing_hashes_for_source(source_id: str, digests: Iterable[str] | None = None) -> set[str]:
     tbl = _open_user_table(create_if_missing=False)
     if tbl is None:
         return set()
+    wanted = sorted({str(d or "").strip().lower() for d in digests or ()} - {""}) if digests is not None else None
+    if wanted is not None:
+        wanted = [digest for digest in wanted if _SHA256_HEX_RE.match(digest)]
+        if not wanted:
+            return set()
+        # Consulta so os hashes do upload e so a coluna doc_sha256; o to_list() da tabela
+        # inteira materializava vetores e texto integral de todo o acervo a cada job.
+        try:
+            rows = (
+                tbl.search()
+                .where(
+                    f"source_id = {_sql_quote(source_id)} AND doc_sha256 IN ({', '.join(map(_sql_quote, wanted))})"
+                )
+                .select(["doc_sha256"])
+                .limit(None)
+                .to_list()
+            )
+            return {str(row.get("doc_sha256") or "").strip() for row in rows} - {""}
+        except Exception as exc:
+            _acervo_log_event("acervo_existing_hashes_query_fallback", error=_short(str(exc), max_chars=300))
     try:
         rows = tbl.to_list()
     except Exception:
@@ -2469,7 +2705,7 @@ def _existing_hashes_for_source(source_id: str) -> set[str]:
         if str(row.get("source_id") or "").strip() != source_id:
             continue
         digest = str(row.get("doc_sha256") or "").strip()
-        if digest:
+        if digest and (wanted is None or digest in wanted):
             hashes.add(digest)
     return hashes
 
@@ -2481,7 +2717,7 @@ def _acervo_log_event(event: str, **fields: Any) -> None:
             continue
         payload[str(key)] = value
     try:
-        _ACERVO_LOGGER.info(json.dumps(payload, ensure_ascii=False))
+        _ACERVO_LOGGER.info(_json_dumps_text(payload))
     except Exception:
         _ACERVO_LOGGER.info("%s", event)
 
@@ -2772,6 +3008,7 @@ def _run_juris_update_job(
             progress_cb=_progress_callback,
             log_cb=lambda event, fields: _juris_log_event(event, job_id=job_id, **(fields or {})),
         )
+        _QUERY_RESPONSE_CACHE.clear()
         result_payload = dict(summary)
         result_payload["chromium_executable"] = chromium_path
         latest_dates = summary.get("latest_dates")
@@ -2878,6 +3115,75 @@ def _run_with_hard_timeout(
     return payload
 
 
+class _TokenBucket:
+    """Blocking token bucket; ``throttle`` halves the refill rate for a cooldown window."""
+
+    def __init__(self, *, rate_per_sec: float, burst: int) -> None:
+        self.rate_per_sec = max(0.0, float(rate_per_sec))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last_ts = time.monotonic()
+        self._throttled_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate_per_sec <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                rate = self.rate_per_sec / 2.0 if now < self._throttled_until else self.rate_per_sec
+                self._tokens = min(float(self.burst), self._tokens + (now - self._last_ts) * rate)
+                self._last_ts = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_s = (1.0 - self._tokens) / rate
+            time.sleep(wait_s)
+
+    def throttle(self, seconds: float) -> None:
+        with self._lock:
+            self._throttled_until = max(self._throttled_until, time.monotonic() + max(0.0, float(seconds)))
+
+
+_USER_ACERVO_GEMINI_LIMITER = _TokenBucket(rate_per_sec=USER_ACERVO_QPS, burst=USER_ACERVO_BURST)
+_USER_ACERVO_RETRYABLE_ERROR_CODES = frozenset({"quota_exhausted", "rate_limited", "upstream_unavailable"})
+
+
+def _run_acervo_gemini_call(
+    *,
+    label: str,
+    timeout_ms: int,
+    operation: Callable[[], Any],
+) -> Any:
+    # Substitui o HttpRetryOptions do SDK: cada tentativa passa pelo limitador global e
+    # o backoff exponencial com jitter evita que N workers x R tentativas disparem juntos.
+    # Timeout hard nao e repetido (quem chama decide, p.ex. abrindo o circuito).
+    attempts = max(1, min(int(USER_ACERVO_RETRY_ATTEMPTS or 1), 4))
+    for attempt in range(attempts):
+        _USER_ACERVO_GEMINI_LIMITER.acquire()
+        try:
+            return _run_with_hard_timeout(label=label, timeout_ms=timeout_ms, operation=operation)
+        except TimeoutError:
+            raise
+        except Exception as exc:
+            _status, detail = _classify_runtime_error(exc)
+            if attempt + 1 >= attempts or detail.get("code") not in _USER_ACERVO_RETRYABLE_ERROR_CODES:
+                raise
+            if detail.get("code") in {"quota_exhausted", "rate_limited"}:
+                _USER_ACERVO_GEMINI_LIMITER.throttle(60)
+            delay_s = min(2**attempt, 30) + random.uniform(0, 1)
+            _acervo_log_event(
+                "acervo_gemini_retry",
+                label=label,
+                attempt=attempt + 1,
+                delay_s=round(delay_s, 2),
+                error=_short(str(exc), max_chars=300),
+            )
+            time.sleep(delay_s)
+    raise RuntimeError(f"{label}: tentativas esgotadas")  # pragma: no cover - loop sempre retorna/levanta
+
+
 def _is_user_acervo_clean_circuit_open() -> bool:
     now = time.time()
     with _USER_ACERVO_CLEAN_CIRCUIT_LOCK:
@@ -2889,23 +3195,63 @@ def _open_user_acervo_clean_circuit(cooldown_seconds: int = 300) -> None:
     now = time.time()
     with _USER_ACERVO_CLEAN_CIRCUIT_LOCK:
         _USER_ACERVO_CLEAN_CIRCUIT_UNTIL = max(_USER_ACERVO_CLEAN_CIRCUIT_UNTIL, now + max(30, int(cooldown_seconds)))
+    _USER_ACERVO_GEMINI_LIMITER.throttle(max(30, int(cooldown_seconds)))
+
+
+# Linhas de ruido (paginacao, cabecalhos de tribunal, assinaturas) numa unica passada.
+_USER_CHUNK_NOISE_LINE_RE = re.compile(
+    r"^\s*(?:"
+    r"p[aá]gina\s+\d+\s*"
+    r"|\d+\s*"
+    r"|(?:tribunal|poder judici[aá]rio|justi[cç]a)[^\n]{0,120}"
+    r"|(?:assinado digitalmente|documento assinado)[^\n]*"
+    r")$",
+    flags=re.IGNORECASE | re.MULTILINE,
+)
+_USER_CHUNK_SPACE_RUN_RE = re.compile(r"[ \t]{2,}")
+_USER_CHUNK_BLANK_LINES_RE = re.compile(r"\n{3,}")
 
 
 def _clean_user_chunk_heuristic(text: str) -> str:
     chunk = (text or "").strip()
     if not chunk:
         return ""
-    cleaned = chunk
-    cleaned = re.sub(r"(?im)^\s*p[aá]gina\s+\d+\s*$", " ", cleaned)
-    cleaned = re.sub(r"(?im)^\s*\d+\s*$", " ", cleaned)
-    cleaned = re.sub(r"(?im)^\s*(tribunal|poder judici[aá]rio|justi[cç]a)[^\n]{0,120}$", " ", cleaned)
-    cleaned = re.sub(r"(?im)^\s*(assinado digitalmente|documento assinado)[^\n]*$", " ", cleaned)
-    cleaned = re.sub(r"[ \\t]{2,}", " ", cleaned)
-    cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+    cleaned = _USER_CHUNK_NOISE_LINE_RE.sub(" ", chunk)
+    cleaned = _USER_CHUNK_SPACE_RUN_RE.sub(" ", cleaned)
+    cleaned = _USER_CHUNK_BLANK_LINES_RE.sub("\n\n", cleaned)
     normalized = cleaned.strip()
     return normalized or chunk
 
 
+def _pop_oldest_finished_user_acervo_job_locked() -> None:
+    finished_ts, stale_id = _USER_ACERVO_FINISHED_JOBS.popleft()
+    stale_job = _USER_ACERVO_JOBS.get(stale_id)
+    if (
+        isinstance(stale_job, dict)
+        and str(stale_job.get("status") or "") in {"done", "error"}
+        and float(stale_job.get("finished_ts") or 0.0) == finished_ts
+    ):
+        _USER_ACERVO_JOBS.pop(stale_id, None)
+
+
+def _evict_user_acervo_jobs_locked(now_ts: float) -> None:
+    cutoff = now_ts - USER_ACERVO_INDEX_JOB_TTL_SECONDS
+    while _USER_ACERVO_FINISHED_JOBS and _USER_ACERVO_FINISHED_JOBS[0][0] < cutoff:
+        _pop_oldest_finished_user_acervo_job_locked()
+    # No limite, so jobs concluidos saem; um job ativo removido daria 404 no polling.
+    while len(_USER_ACERVO_JOBS) >= USER_ACERVO_INDEX_JOB_MAX_ENTRIES and _USER_ACERVO_FINISHED_JOBS:
+        _pop_oldest_finished_user_acervo_job_locked()
+    if len(_USER_ACERVO_JOBS) >= USER_ACERVO_INDEX_JOB_MAX_ENTRIES:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "code": "acervo_jobs_busy",
+                "message": "Muitos lotes de indexacao do Meu Acervo em andamento.",
+                "hint": "Aguarde a conclusao dos lotes atuais e tente novamente.",
+            },
+        )
+
+
 def _new_user_acervo_job(
     *,
     source_id: str,
@@ -2951,16 +3297,7 @@ def _new_user_acervo_job(
         "error": None,
     }
     with _USER_ACERVO_JOBS_LOCK:
-        cutoff = now_ts - USER_ACERVO_INDEX_JOB_TTL_SECONDS
-        stale_ids = [
-            key
-            for key, value in _USER_ACERVO_JOBS.items()
-            if str(value.get("status") or "") in {"done", "error"}
-            and float(value.get("finished_ts") or 0.0) > 0.0
-            and float(value.get("finished_ts") or 0.0) < cutoff
-        ]
-        for stale_id in stale_ids:
-            _USER_ACERVO_JOBS.pop(stale_id, None)
+        _evict_user_acervo_jobs_locked(now_ts)
         _USER_ACERVO_JOBS[job_id] = job
     _acervo_log_event(
         "acervo_job_created",
@@ -2997,6 +3334,7 @@ def _update_user_acervo_job(
             if status in {"done", "error"}:
                 job["finished_ts"] = now_ts
                 job["finished_at"] = now_iso
+                _USER_ACERVO_FINISHED_JOBS.append((now_ts, job_id))
         if stage is not None:
             job["stage"] = str(stage or "").strip() or str(job.get("stage") or "upload")
         if message is not None:
@@ -3073,10 +3411,15 @@ def _get_user_acervo_job_payload(job_id: str) -> dict[str, Any] | None:
     return payload
 
 
+def _json_prefix_for_chunk_index(const_meta: dict[str, Any]) -> str:
+    # Serializa uma vez os metadados constantes do arquivo; cada chunk so anexa chunk_index.
+    return _json_dumps_text(const_meta)[:-1] + ',"chunk_index":'
+
+
 def _build_user_acervo_record_batch(
     *,
     cleaned_batch: list[str],
-    vectors: list[list[float]],
+    vectors: Any,
     batch_start: int,
     total_chunks: int,
     source_id: str,
@@ -3085,53 +3428,52 @@ def _build_user_acervo_record_batch(
     digest: str,
     ocr_missing_only: bool,
 ) -> list[dict[str, Any]]:
+    metadata_prefix = _json_prefix_for_chunk_index(
+        {
+            "source_kind": "user",
+            "source_id": source_id,
+            "source_label": source_label,
+            "file_name": filename,
+            "doc_sha256": digest,
+            "chunk_total": total_chunks,
+            "ocr_missing_only": bool(ocr_missing_only),
+        }
+    )
+    doc_id_prefix = f"{source_id}:{digest[:16]}:"
+    template: dict[str, Any] = {
+        "tribunal": "MEU_ACERVO",
+        "tipo": "acervo_usuario",
+        "processo": filename,
+        "relator": "-",
+        "ramo_direito": "",
+        "data_julgamento": "",
+        "orgao_julgador": "Meu Acervo",
+        "url": "",
+        "source_id": source_id,
+        "source_label": source_label,
+        "source_kind": "user",
+        "doc_sha256": digest,
+        "file_name": filename,
+        "chunk_total": total_chunks,
+    }
     records_batch: list[dict[str, Any]] = []
     for local_idx, (chunk_text, vector) in enumerate(zip(cleaned_batch, vectors), start=1):
         chunk_index = batch_start + local_idx
-        metadata_extra = json.dumps(
-            {
-                "source_kind": "user",
-                "source_id": source_id,
-                "source_label": source_label,
-                "file_name": filename,
-                "doc_sha256": digest,
-                "chunk_index": chunk_index,
-                "chunk_total": total_chunks,
-                "ocr_missing_only": bool(ocr_missing_only),
-            },
-            ensure_ascii=False,
-        )
-        records_batch.append(
-            {
-                "vector": vector,
-                "doc_id": f"{source_id}:{digest[:16]}:{chunk_index}",
-                "tribunal": "MEU_ACERVO",
-                "tipo": "acervo_usuario",
-                "processo": filename,
-                "relator": "-",
-                "ramo_direito": "",
-                "data_julgamento": "",
-                "orgao_julgador": "Meu Acervo",
-                "texto_busca": chunk_text[:8000],
-                "texto_integral": chunk_text,
-                "url": "",
-                "metadata_extra": metadata_extra,
-                "source_id": source_id,
-                "source_label": source_label,
-                "source_kind": "user",
-                "doc_sha256": digest,
-                "file_name": filename,
-                "chunk_index": chunk_index,
-                "chunk_total": total_chunks,
-            }
-        )
+        record = dict(template)
+        record["vector"] = vector
+        record["doc_id"] = f"{doc_id_prefix}{chunk_index}"
+        record["texto_busca"] = chunk_text[:8000]
+        record["texto_integral"] = chunk_text
+        record["metadata_extra"] = f"{metadata_prefix}{chunk_index}}}"
+        record["chunk_index"] = chunk_index
+        records_batch.append(record)
     return records_batch
 
 
 def _build_user_acervo_record_batch_json(
     *,
     cleaned_batch: list[str],
-    vectors: list[list[float]],
+    vectors: Any,
     batch_start: int,
     total_chunks: int,
     source_id: str,
@@ -3142,48 +3484,47 @@ def _build_user_acervo_record_batch_json(
     decision_total: int,
     decision_meta: dict[str, str],
 ) -> list[dict[str, Any]]:
+    metadata_prefix = _json_prefix_for_chunk_index(
+        {
+            "source_kind": "user",
+            "source_id": source_id,
+            "source_label": source_label,
+            "file_name": filename,
+            "doc_sha256": digest,
+            "file_kind": "json",
+            "decision_index": decision_index,
+            "decision_total": decision_total,
+            "chunk_total": total_chunks,
+        }
+    )
+    doc_id_prefix = f"{source_id}:{digest[:16]}:dec{decision_index}:chunk"
+    template: dict[str, Any] = {
+        "tribunal": decision_meta.get("tribunal") or "MEU_ACERVO",
+        "tipo": decision_meta.get("tipo") or "acervo_json",
+        "processo": decision_meta.get("processo") or filename,
+        "relator": decision_meta.get("relator") or "-",
+        "ramo_direito": decision_meta.get("ramo_direito") or "",
+        "data_julgamento": decision_meta.get("data_julgamento") or "",
+        "orgao_julgador": decision_meta.get("orgao_julgador") or "Meu Acervo",
+        "url": "",
+        "source_id": source_id,
+        "source_label": source_label,
+        "source_kind": "user",
+        "doc_sha256": digest,
+        "file_name": filename,
+        "chunk_total": total_chunks,
+    }
     records_batch: list[dict[str, Any]] = []
     for local_idx, (chunk_text, vector) in enumerate(zip(cleaned_batch, vectors), start=1):
         chunk_index = batch_start + local_idx
-        metadata_extra = json.dumps(
-            {
-                "source_kind": "user",
-                "source_id": source_id,
-                "source_label": source_label,
-                "file_name": filename,
-                "doc_sha256": digest,
-                "file_kind": "json",
-                "decision_index": decision_index,
-                "decision_total": decision_total,
-                "chunk_index": chunk_index,
-                "chunk_total": total_chunks,
-            },
-            ensure_ascii=False,
-        )
-        records_batch.append(
-            {
-                "vector": vector,
-                "doc_id": f"{source_id}:{digest[:16]}:dec{decision_index}:chunk{chunk_index}",
-                "tribunal": decision_meta.get("tribunal") or "MEU_ACERVO",
-                "tipo": decision_meta.get("tipo") or "acervo_json",
-                "processo": decision_meta.get("processo") or filename,
-                "relator": decision_meta.get("relator") or "-",
-                "ramo_direito": decision_meta.get("ramo_direito") or "",
-                "data_julgamento": decision_meta.get("data_julgamento") or "",
-                "orgao_julgador": decision_meta.get("orgao_julgador") or "Meu Acervo",
-                "texto_busca": chunk_text[:8000],
-                "texto_integral": chunk_text,
-                "url": "",
-                "metadata_extra": metadata_extra,
-                "source_id": source_id,
-                "source_label": source_label,
-                "source_kind": "user",
-                "doc_sha256": digest,
-                "file_name": filename,
-                "chunk_index": chunk_index,
-                "chunk_total": total_chunks,
-            }
-        )
+        record = dict(template)
+        record["vector"] = vector
+        record["doc_id"] = f"{doc_id_prefix}{chunk_index}"
+        record["texto_busca"] = chunk_text[:8000]
+        record["texto_integral"] = chunk_text
+        record["metadata_extra"] = f"{metadata_prefix}{chunk_index}}}"
+        record["chunk_index"] = chunk_index
+        records_batch.append(record)
     return records_batch
 
 
@@ -3268,6 +3609,8 @@ def _index_single_user_acervo_file(
             file_inserted_rows = 0
             file_total_chunks = 0
             batch_size = 32
+            # Acumula registros entre decisoes para gravar em lotes maiores no LanceDB.
+            pending_records: list[dict[str, Any]] = []
 
             for dec_idx, dec_meta in enumerate(decisions):
                 dec_text_parts: list[str] = []
@@ -3277,9 +3620,8 @@ def _index_single_user_acervo_file(
                     dec_text_parts.append(tb)
                 if ti and ti != tb:
                     dec_text_parts.append(ti)
-                dec_text = "\n\n".join(dec_text_parts)
 
-                chunks = _split_user_text_chunks(dec_text, max_chars=USER_ACERVO_CHUNK_CHARS)
+                chunks = list(_iter_user_text_chunks(dec_text_parts, max_chars=USER_ACERVO_CHUNK_CHARS))
                 if not chunks:
                     continue
 
@@ -3309,9 +3651,15 @@ def _index_single_user_acervo_file(
                         decision_total=decision_total,
                         decision_meta=dec_meta,
                     )
-                    if records_batch:
+                    pending_records.extend(records_batch)
+                    if len(pending_records) >= USER_ACERVO_UPSERT_BATCH_SIZE:
                         with _USER_ACERVO_WRITE_LOCK:
-                            file_inserted_rows += _upsert_user_records(records_batch)
+                            file_inserted_rows += _upsert_user_records(pending_records)
+                        pending_records = []
+
+            if pending_records:
+                with _USER_ACERVO_WRITE_LOCK:
+                    file_inserted_rows += _upsert_user_records(pending_records)
 
             summary["indexed_docs"] = 1
             summary["indexed_chunks"] = int(file_total_chunks)
@@ -3338,15 +3686,16 @@ def _index_single_user_acervo_file(
                 message=f"Extraindo texto: {filename}",
                 progress_set={"current_file": filename},
             )
-            extracted_text, page_stats = _extract_pdf_text_with_optional_ocr(temp_path, bool(ocr_missing_only))
+            page_stats: dict[str, int] = {}
+            chunks = list(
+                _iter_user_text_chunks(
+                    _iter_pdf_pages_with_optional_ocr(temp_path, bool(ocr_missing_only), page_stats),
+                    max_chars=USER_ACERVO_CHUNK_CHARS,
+                )
+            )
             summary["pages_text"] = int(page_stats.get("pages_with_text") or 0)
             summary["pages_ocr"] = int(page_stats.get("pages_with_ocr") or 0)
 
-            if not extracted_text:
-                summary["skipped_files"] = 1
-                return summary
-
-            chunks = _split_user_text_chunks(extracted_text, max_chars=USER_ACERVO_CHUNK_CHARS)
             if not chunks:
                 summary["skipped_files"] = 1
                 return summary
@@ -3354,6 +3703,7 @@ def _index_single_user_acervo_file(
             total_chunks = len(chunks)
             batch_size = 32
             file_inserted_rows = 0
+            pending_records = []
             for batch_start in range(0, total_chunks, batch_size):
                 raw_batch = chunks[batch_start : batch_start + batch_size]
                 _update_user_acervo_job(
@@ -3381,9 +3731,15 @@ def _index_single_user_acervo_file(
                     digest=digest,
                     ocr_missing_only=bool(ocr_missing_only),
                 )
-                if records_batch:
+                pending_records.extend(records_batch)
+                if len(pending_records) >= USER_ACERVO_UPSERT_BATCH_SIZE:
                     with _USER_ACERVO_WRITE_LOCK:
-                        file_inserted_rows += _upsert_user_records(records_batch)
+                        file_inserted_rows += _upsert_user_records(pending_records)
+                    pending_records = []
+
+            if pending_records:
+                with _USER_ACERVO_WRITE_LOCK:
+                    file_inserted_rows += _upsert_user_records(pending_records)
 
             summary["indexed_docs"] = 1
             summary["indexed_chunks"] = int(total_chunks)
@@ -3447,7 +3803,10 @@ def _run_user_acervo_index_job(
     )
 
     try:
-        existing_hashes = _existing_hashes_for_source(source_id)
+        existing_hashes = _existing_hashes_for_source(
+            source_id,
+            digests=[str(item.get("digest") or "") for item in stored_files],
+        )
         inflight_hashes: set[str] = set()
         hash_lock = threading.Lock()
         processed_files = 0
@@ -3520,6 +3879,8 @@ def _run_user_acervo_index_job(
                     message=f"Processando lote: {processed_files}/{total_files} arquivo(s).",
                 )
 
+        _flush_user_fts_index()
+
         payload = _get_user_acervo_job_payload(job_id) or {}
         progress = payload.get("progress") if isinstance(payload.get("progress"), dict) else {}
         indexed_docs = int(progress.get("indexed_docs") or 0)
@@ -3637,33 +3998,99 @@ def _start_user_acervo_index_job(
     return job_id
 
 
-def _split_user_text_chunks(text: str, max_chars: int = USER_ACERVO_CHUNK_CHARS) -> list[str]:
-    content = (text or "").strip()
-    if not content:
-        return []
-    paragraphs = [p.strip() for p in re.split(r"\n{2,}", content) if p.strip()]
-    chunks: list[str] = []
+_USER_PARAGRAPH_SPLIT_RE = re.compile(r"\n{2,}")
+
+
+def _iter_oversized_paragraph_parts(paragraph: str, max_chars: int) -> Iterator[str]:
+    # Corta em espaco/quebra de linha na segunda metade da janela para nao partir palavras.
+    length = len(paragraph)
+    min_cut = max(1, max_chars // 2)
+    start = 0
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length and not paragraph[end].isspace():
+            cut = max(
+                paragraph.rfind(" ", start + min_cut, end),
+                paragraph.rfind("\n", start + min_cut, end),
+            )
+            if cut > start:
+                end = cut
+        part = paragraph[start:end].strip()
+        if part:
+            yield part
+        start = end
+
+
+def _iter_user_text_chunks(blocks: Iterable[str], max_chars: int = USER_ACERVO_CHUNK_CHARS) -> Iterator[str]:
+    """Lazily pack the paragraphs of *blocks* (e.g. PDF pages) into chunks of up to *max_chars*."""
     current = ""
-    for paragraph in paragraphs:
-        candidate = f"{current}\n\n{paragraph}".strip() if current else paragraph
-        if len(candidate) <= max_chars:
-            current = candidate
-            continue
-        if current:
-            chunks.append(current)
-            current = ""
-        if len(paragraph) <= max_chars:
-            current = paragraph
-            continue
-        start = 0
-        while start < len(paragraph):
-            part = paragraph[start : start + max_chars].strip()
-            if part:
-                chunks.append(part)
-            start += max_chars
+    for block in blocks:
+        for raw_paragraph in _USER_PARAGRAPH_SPLIT_RE.split(block or ""):
+            paragraph = raw_paragraph.strip()
+            if not paragraph:
+                continue
+            candidate = f"{current}\n\n{paragraph}" if current else paragraph
+            if len(candidate) <= max_chars:
+                current = candidate
+                continue
+            if current:
+                yield current
+                current = ""
+            if len(paragraph) <= max_chars:
+                current = paragraph
+                continue
+            yield from _iter_oversized_paragraph_parts(paragraph, max_chars)
     if current:
-        chunks.append(current)
-    return chunks
+        yield current
+
+
+def _split_user_text_chunks(text: str, max_chars: int = USER_ACERVO_CHUNK_CHARS) -> list[str]:
+    return list(_iter_user_text_chunks([text], max_chars=max_chars))
+
+
+# Residuos que a heuristica nao remove e que justificam a limpeza via LLM.
+_USER_CHUNK_LLM_MARKERS_RE = re.compile(
+    r"p[aá]gina\s+\d+\s+de\s+\d+"
+    r"|\bfls?\.\s*\d+"
+    r"|assinad[oa]\s+(?:digital|eletronica)"
+    r"|c[oó]digo\s+verificador"
+    r"|https?://",
+    flags=re.IGNORECASE,
+)
+
+
+def _is_user_chunk_already_clean(text: str) -> bool:
+    visible = [ch for ch in text if not ch.isspace()]
+    if not visible:
+        return True
+    alnum_ratio = sum(1 for ch in visible if ch.isalnum()) / len(visible)
+    if alnum_ratio < USER_ACERVO_CLEAN_MIN_ALNUM_RATIO:
+        return False
+    return _USER_CHUNK_LLM_MARKERS_RE.search(text) is None
+
+
+def _user_acervo_clean_cache_key(chunk: str) -> tuple[str, str]:
+    return (USER_ACERVO_CLEAN_MODEL, hashlib.sha256(chunk.encode("utf-8")).hexdigest())
+
+
+def _user_acervo_clean_cache_get(key: tuple[str, str]) -> str | None:
+    if USER_ACERVO_CLEAN_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _USER_ACERVO_CLEAN_CACHE_LOCK:
+        cached = _USER_ACERVO_CLEAN_CACHE.get(key)
+        if cached is not None:
+            _USER_ACERVO_CLEAN_CACHE.move_to_end(key)
+        return cached
+
+
+def _user_acervo_clean_cache_put(key: tuple[str, str], cleaned: str) -> None:
+    if USER_ACERVO_CLEAN_CACHE_MAX_ENTRIES <= 0:
+        return
+    with _USER_ACERVO_CLEAN_CACHE_LOCK:
+        _USER_ACERVO_CLEAN_CACHE[key] = cleaned
+        _USER_ACERVO_CLEAN_CACHE.move_to_end(key)
+        while len(_USER_ACERVO_CLEAN_CACHE) > USER_ACERVO_CLEAN_CACHE_MAX_ENTRIES:
+            _USER_ACERVO_CLEAN_CACHE.popitem(last=False)
 
 
 def _clean_user_chunk_with_flash(text: str) -> str:
@@ -3671,6 +4098,12 @@ def _clean_user_chunk_with_flash(text: str) -> str:
     if not chunk:
         return ""
     heuristic = _clean_user_chunk_heuristic(chunk)
+    if not USER_ACERVO_CLEAN_FORCE_LLM and _is_user_chunk_already_clean(heuristic):
+        return heuristic
+    cache_key = _user_acervo_clean_cache_key(chunk)
+    cached = _user_acervo_clean_cache_get(cache_key)
+    if cached is not None:
+        return cached
     if _is_user_acervo_clean_circuit_open():
         return heuristic
     prompt = (
@@ -3681,10 +4114,9 @@ def _clean_user_chunk_with_flash(text: str) -> str:
         "Retorne apenas o texto limpo."
     )
     timeout_ms = max(10000, min(int(USER_ACERVO_CLEAN_TIMEOUT_MS or 45000), 300000))
-    retry_attempts = max(1, min(int(USER_ACERVO_RETRY_ATTEMPTS or 1), 4))
     http_client = _get_acervo_httpx_client(timeout_ms)
     try:
-        response = _run_with_hard_timeout(
+        response = _run_acervo_gemini_call(
             label="acervo_clean_chunk",
             timeout_ms=timeout_ms,
             operation=lambda: get_gemini_client().models.generate_content(
@@ -3695,14 +4127,17 @@ def _clean_user_chunk_with_flash(text: str) -> str:
                     max_output_tokens=4096,
                     http_options=types.HttpOptions(
                         timeout=timeout_ms,
-                        retry_options=types.HttpRetryOptions(attempts=retry_attempts),
+                        retry_options=types.HttpRetryOptions(attempts=1),
                         httpx_client=http_client,
                     ),
                 ),
             ),
         )
         cleaned = str(response.text or "").strip()
-        return cleaned or heuristic
+        if not cleaned:
+            return heuristic
+        _user_acervo_clean_cache_put(cache_key, cleaned)
+        return cleaned
     except TimeoutError:
         _open_user_acervo_clean_circuit(cooldown_seconds=300)
         _acervo_log_event(
@@ -3720,29 +4155,28 @@ def _clean_user_chunk_with_flash(text: str) -> str:
         return heuristic
 
 
-def _ocr_png_with_gemini(png_bytes: bytes) -> str:
+def _ocr_page_image_with_gemini(image_bytes: bytes, mime_type: str = "image/png") -> str:
     prompt = (
         "Extraia o texto desta pagina de PDF juridico em portugues.\n"
         "Retorne apenas texto corrido, sem markdown, sem comentarios."
     )
     timeout_ms = max(10000, min(int(USER_ACERVO_OCR_TIMEOUT_MS or 60000), 300000))
-    retry_attempts = max(1, min(int(USER_ACERVO_RETRY_ATTEMPTS or 1), 4))
     http_client = _get_acervo_httpx_client(timeout_ms)
-    response = _run_with_hard_timeout(
+    response = _run_acervo_gemini_call(
         label="acervo_ocr_page",
         timeout_ms=timeout_ms,
         operation=lambda: get_gemini_client().models.generate_content(
             model=USER_ACERVO_OCR_MODEL,
             contents=[
-                types.Part.from_text(prompt),
-                types.Part.from_bytes(data=png_bytes, mime_type="image/png"),
+                types.Part.from_text(text=prompt),
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
             ],
             config=types.GenerateContentConfig(
                 temperature=0.0,
                 max_output_tokens=4096,
                 http_options=types.HttpOptions(
                     timeout=timeout_ms,
-                    retry_options=types.HttpRetryOptions(attempts=retry_attempts),
+                    retry_options=types.HttpRetryOptions(attempts=1),
                     httpx_client=http_client,
                 ),
             ),
@@ -3751,19 +4185,165 @@ def _ocr_png_with_gemini(png_bytes: bytes) -> str:
     return str(response.text or "").strip()
 
 
-def _extract_pdf_text_with_optional_ocr(pdf_path: Path, ocr_missing_only: bool) -> tuple[str, dict[str, int]]:
+_OCR_BATCH_PAGE_RE = re.compile(r"\[\[PAGE_(\d+)\]\](.*?)\[\[/PAGE_\1\]\]", flags=re.DOTALL)
+
+
+def _ocr_page_image_batch_with_gemini(
+    pages: list[tuple[int, bytes]],
+    mime_type: str = "image/png",
+) -> dict[int, str]:
+    if not pages:
+        return {}
+    if len(pages) == 1:
+        page_idx, image_bytes = pages[0]
+        return {page_idx: _ocr_page_image_with_gemini(image_bytes, mime_type)}
+
+    prompt = (
+        "Extraia o texto de cada imagem abaixo (paginas de PDF juridico em portugues).\n"
+        "Cada imagem vem precedida de um marcador [[PAGE_n]]. Para cada uma, responda com "
+        "[[PAGE_n]] seguido do texto corrido da pagina e feche com [[/PAGE_n]].\n"
+        "Sem markdown, sem comentarios."
+    )
+    contents: list[Any] = [types.Part.from_text(text=prompt)]
+    for page_idx, image_bytes in pages:
+        contents.append(types.Part.from_text(text=f"[[PAGE_{page_idx + 1}]]"))
+        contents.append(types.Part.from_bytes(data=image_bytes, mime_type=mime_type))
+
+    timeout_ms = max(10000, min(int(USER_ACERVO_OCR_TIMEOUT_MS or 60000) * len(pages), 300000))
+    http_client = _get_acervo_httpx_client(timeout_ms)
+    texts: dict[int, str] = {}
+    try:
+        response = _run_acervo_gemini_call(
+            label="acervo_ocr_batch",
+            timeout_ms=timeout_ms,
+            operation=lambda: get_gemini_client().models.generate_content(
+                model=USER_ACERVO_OCR_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    temperature=0.0,
+                    max_output_tokens=min(65536, 4096 * len(pages)),
+                    http_options=types.HttpOptions(
+                        timeout=timeout_ms,
+                        retry_options=types.HttpRetryOptions(attempts=1),
+                        httpx_client=http_client,
+                    ),
+                ),
+            ),
+        )
+        for match in _OCR_BATCH_PAGE_RE.finditer(str(response.text or "")):
+            texts[int(match.group(1)) - 1] = match.group(2).strip()
+    except Exception as exc:
+        _acervo_log_event(
+            "acervo_ocr_batch_fallback",
+            model=USER_ACERVO_OCR_MODEL,
+            pages=len(pages),
+            error=_short(str(exc), max_chars=400),
+        )
+
+    # Paginas ausentes na resposta em lote voltam para o OCR individual.
+    for page_idx, image_bytes in pages:
+        if texts.get(page_idx):
+            continue
+        try:
+            texts[page_idx] = _ocr_page_image_with_gemini(image_bytes, mime_type)
+        except Exception:
+            texts[page_idx] = ""
+    return texts
+
+
+def _ocr_pixmap_kwargs() -> dict[str, Any]:
+    # Escala de cinza: 1/3 dos bytes para rasterizar e comprimir, sem perda para OCR de texto.
+    kwargs: dict[str, Any] = {"dpi": USER_ACERVO_OCR_DPI, "alpha": False}
+    gray = getattr(_get_fitz(), "csGRAY", None) if USER_ACERVO_OCR_GRAYSCALE else None
+    if gray is not None:
+        kwargs["colorspace"] = gray
+    return kwargs
+
+
+def _ocr_image_mime_type() -> str:
+    return "image/png" if USER_ACERVO_OCR_IMAGE_FORMAT == "png" else "image/jpeg"
+
+
+def _encode_ocr_pixmap(pix: Any) -> bytes:
+    # JPEG evita o deflate do PNG e costuma sair 4-6x menor para paginas rasterizadas.
+    if USER_ACERVO_OCR_IMAGE_FORMAT == "png":
+        return pix.tobytes("png")
+    return pix.tobytes("jpg", jpg_quality=USER_ACERVO_OCR_JPEG_QUALITY)
+
+
+def _render_ocr_page_image(page: Any, pixmap_kwargs: dict[str, Any]) -> bytes:
+    # Pixmap local a esta funcao: o buffer cru (varios MB por pagina) e liberado assim
+    # que a imagem comprimida sai, em vez de ficar preso no frame do gerador de
+    # paginas ate a proxima renderizacao (inclusive durante o yield para o embed).
+    return _encode_ocr_pixmap(page.get_pixmap(**pixmap_kwargs))
+
+
+def _resolve_pdf_page_text(
+    entry: tuple[int, str, bool],
+    ocr_futures: dict[int, Future],
+    stats: dict[str, int],
+) -> str:
+    idx, raw_text, use_ocr = entry
+    ocr_future = ocr_futures.pop(idx, None) if use_ocr else None
+    if ocr_future is not None:
+        try:
+            ocr_text = str((ocr_future.result() or {}).get(idx) or "")
+            if ocr_text:
+                raw_text = ocr_text
+                stats["pages_with_ocr"] += 1
+        except Exception:
+            pass
+    if not raw_text:
+        return ""
+    stats["pages_with_text"] += 1
+    return f"[PAGINA {idx + 1}]\n{raw_text}"
+
+
+def _iter_pdf_pages_with_optional_ocr(
+    pdf_path: Path,
+    ocr_missing_only: bool,
+    stats: dict[str, int],
+) -> Iterator[str]:
+    """Yield each page text (OCR when needed) while accumulating page counters in *stats*."""
     _require_user_acervo_runtime()
     try:
-        doc = fitz.open(str(pdf_path))
+        doc = _get_fitz().open(str(pdf_path))
     except Exception as exc:
         raise RuntimeError(f"PDF invalido ou corrompido: {exc}") from exc
 
-    total_pages = 0
-    text_pages = 0
-    ocr_pages = 0
-    page_chunks: list[str] = []
+    stats["pages_total"] = 0
+    stats["pages_with_text"] = 0
+    stats["pages_with_ocr"] = 0
+    # PyMuPDF nao e thread-safe (contexto global do MuPDF, inclusive tobytes): a
+    # renderizacao fica nesta thread e so as chamadas de OCR ao Gemini (em lotes de
+    # paginas) vao para o pool. A janela limita quantas paginas ficam em memoria.
+    concurrency = max(1, int(USER_ACERVO_OCR_CONCURRENCY))
+    batch_size = max(1, int(USER_ACERVO_OCR_BATCH_SIZE))
+    window = (concurrency + 1) * batch_size
+    pending: deque[tuple[int, str, bool]] = deque()
+    ocr_batch: list[tuple[int, bytes]] = []
+    ocr_futures: dict[int, Future] = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="acervo-ocr")
+    pixmap_kwargs = _ocr_pixmap_kwargs()
+    image_mime = _ocr_image_mime_type()
+
+    def _flush_ocr_batch() -> None:
+        if not ocr_batch:
+            return
+        future = executor.submit(_ocr_page_image_batch_with_gemini, list(ocr_batch), image_mime)
+        for page_idx, _png in ocr_batch:
+            ocr_futures[page_idx] = future
+        ocr_batch.clear()
+
+    def _pop_page_text() -> str:
+        entry = pending.popleft()
+        if entry[2] and entry[0] not in ocr_futures:
+            _flush_ocr_batch()
+        return _resolve_pdf_page_text(entry, ocr_futures, stats)
+
     try:
         total_pages = len(doc)
+        stats["pages_total"] = int(total_pages)
         for idx in range(total_pages):
             page = doc.load_page(idx)
             raw_text = (page.get_text("text") or "").strip()
@@ -3776,70 +4356,319 @@ def _extract_pdf_text_with_optional_ocr(pdf_path: Path, ocr_missing_only: bool)
 
             if use_ocr:
                 try:
-                    pix = page.get_pixmap(dpi=USER_ACERVO_OCR_DPI, alpha=False)
-                    png = pix.tobytes("png")
-                    ocr_text = _ocr_png_with_gemini(png)
-                    if ocr_text:
-                        raw_text = ocr_text
-                        ocr_pages += 1
+                    ocr_batch.append((idx, _render_ocr_page_image(page, pixmap_kwargs)))
                 except Exception:
-                    pass
-
-            if raw_text:
-                text_pages += 1
-                page_chunks.append(f"[PAGINA {idx + 1}]\n{raw_text}")
+                    use_ocr = False
+                if len(ocr_batch) >= batch_size:
+                    _flush_ocr_batch()
+
+            pending.append((idx, raw_text, use_ocr))
+            page = None
+            while len(pending) >= window:
+                page_text = _pop_page_text()
+                if page_text:
+                    yield page_text
+        while pending:
+            page_text = _pop_page_text()
+            if page_text:
+                yield page_text
     finally:
+        executor.shutdown(wait=False, cancel_futures=True)
         doc.close()
 
-    return "\n\n".join(page_chunks).strip(), {
-        "pages_total": int(total_pages),
-        "pages_with_text": int(text_pages),
-        "pages_with_ocr": int(ocr_pages),
-    }
+
+def _user_acervo_embed_cache_key(chunk: str) -> bytes:
+    raw = f"{USER_ACERVO_EMBED_MODEL}:{USER_ACERVO_EMBED_DIM}:{chunk}".encode("utf-8", errors="ignore")
+    return hashlib.sha256(raw).digest()
+
+
+def _user_acervo_embed_cache_conn_locked() -> sqlite3.Connection | None:
+    global _USER_ACERVO_EMBED_CACHE_CONN, _USER_ACERVO_EMBED_CACHE_ROWS
+    if _USER_ACERVO_EMBED_CACHE_CONN is not None:
+        return _USER_ACERVO_EMBED_CACHE_CONN
+    try:
+        conn = sqlite3.connect(str(USER_ACERVO_EMBED_CACHE_PATH), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embed_cache "
+            "(key BLOB PRIMARY KEY, vec BLOB NOT NULL, used_ts REAL NOT NULL DEFAULT 0)"
+        )
+        # Caches criados antes do limite de linhas nao tem used_ts.
+        columns = {str(row[1]) for row in conn.execute("PRAGMA table_info(embed_cache)")}
+        if "used_ts" not in columns:
+            conn.execute("ALTER TABLE embed_cache ADD COLUMN used_ts REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS embed_cache_used_ts ON embed_cache (used_ts)")
+        conn.commit()
+        _USER_ACERVO_EMBED_CACHE_ROWS = int(conn.execute("SELECT COUNT(*) FROM embed_cache").fetchone()[0])
+    except Exception as exc:
+        _acervo_log_event("acervo_embed_cache_unavailable", error=_short(str(exc), max_chars=400))
+        return None
+    _USER_ACERVO_EMBED_CACHE_CONN = conn
+    return conn
+
+
+def _evict_user_acervo_embed_cache_locked(conn: sqlite3.Connection) -> None:
+    # Chamar com _USER_ACERVO_EMBED_CACHE_LOCK adquirido.
+    global _USER_ACERVO_EMBED_CACHE_ROWS
+    excess = _USER_ACERVO_EMBED_CACHE_ROWS - USER_ACERVO_EMBED_CACHE_MAX_ROWS
+    if excess <= 0:
+        return
+    conn.execute(
+        "DELETE FROM embed_cache WHERE key IN (SELECT key FROM embed_cache ORDER BY used_ts LIMIT ?)",
+        (excess,),
+    )
+    # A contagem incremental superestima com INSERT OR REPLACE; recalcula apos a evicao.
+    _USER_ACERVO_EMBED_CACHE_ROWS = int(conn.execute("SELECT COUNT(*) FROM embed_cache").fetchone()[0])
+
+
+def _user_acervo_embed_cache_load(keys: list[bytes]) -> dict[bytes, Any]:
+    if not USER_ACERVO_EMBED_CACHE_ENABLED or not keys:
+        return {}
+    found: dict[bytes, Any] = {}
+    unique_keys = list(dict.fromkeys(keys))
+    try:
+        with _USER_ACERVO_EMBED_CACHE_LOCK:
+            conn = _user_acervo_embed_cache_conn_locked()
+            if conn is None:
+                return {}
+            # 500 fica abaixo do limite de variaveis do SQLite em builds antigos (999).
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vec FROM embed_cache WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    if len(blob) == USER_ACERVO_EMBED_DIM * 4:
+                        found[bytes(key)] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                # Marca o uso recente para a evicao LRU.
+                hits = list(found)
+                now_ts = time.time()
+                for start in range(0, len(hits), 500):
+                    batch = hits[start : start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    conn.execute(
+                        f"UPDATE embed_cache SET used_ts = ? WHERE key IN ({placeholders})",
+                        [now_ts, *batch],
+                    )
+                conn.commit()
+    except Exception as exc:
+        _acervo_log_event("acervo_embed_cache_read_error", error=_short(str(exc), max_chars=400))
+        return {}
+    return found
+
+
+def _user_acervo_embed_cache_store(entries: list[tuple[bytes, Any]]) -> None:
+    if not USER_ACERVO_EMBED_CACHE_ENABLED or not entries:
+        return
+    global _USER_ACERVO_EMBED_CACHE_ROWS
+    try:
+        now_ts = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now_ts) for key, vector in entries]
+        with _USER_ACERVO_EMBED_CACHE_LOCK:
+            conn = _user_acervo_embed_cache_conn_locked()
+            if conn is None:
+                return
+            conn.executemany("INSERT OR REPLACE INTO embed_cache (key, vec, used_ts) VALUES (?, ?, ?)", rows)
+            _USER_ACERVO_EMBED_CACHE_ROWS += len(rows)
+            _evict_user_acervo_embed_cache_locked(conn)
+            conn.commit()
+    except Exception as exc:
+        _acervo_log_event("acervo_embed_cache_write_error", error=_short(str(exc), max_chars=400))
 
 
-def _embed_user_chunks(chunks: list[str]) -> list[list[float]]:
-    vectors: list[list[float]] = []
+def _embed_user_chunks(chunks: list[str]) -> Any:
+    """Return a float32 ``(len(chunks), dim)`` matrix, one embedding row per chunk."""
     if not chunks:
-        return vectors
-    batch_size = max(1, min(int(USER_ACERVO_EMBED_BATCH_SIZE or 8), 32))
+        return np.empty((0, USER_ACERVO_EMBED_DIM), dtype=np.float32)
+    keys = [_user_acervo_embed_cache_key(chunk) for chunk in chunks]
+    cached = _user_acervo_embed_cache_load(keys)
+    # Chunks repetidos (cabecalhos, ementas) sao embedados uma unica vez.
+    misses: dict[bytes, str] = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in cached and key not in misses:
+            misses[key] = chunk
+    if misses:
+        fresh_vectors = _embed_user_chunks_remote(list(misses.values()))
+        fresh_entries = list(zip(misses.keys(), fresh_vectors))
+        _user_acervo_embed_cache_store(fresh_entries)
+        cached.update(fresh_entries)
+    rows = [cached.get(key) for key in keys]
+    if any(row is None for row in rows):
+        raise RuntimeError("Falha ao gerar embeddings de todos os chunks do Meu Acervo.")
+    return np.stack(rows).astype(np.float32, copy=False)
+
+
+def _embed_user_chunk_batch(batch: list[str]) -> Any:
     timeout_ms = max(10000, min(int(USER_ACERVO_EMBED_TIMEOUT_MS or 45000), 300000))
-    retry_attempts = max(1, min(int(USER_ACERVO_RETRY_ATTEMPTS or 1), 4))
     http_client = _get_acervo_httpx_client(timeout_ms)
-    for start in range(0, len(chunks), batch_size):
-        batch = chunks[start : start + batch_size]
-        result = _run_with_hard_timeout(
-            label="acervo_embed_batch",
-            timeout_ms=timeout_ms,
-            operation=lambda: get_gemini_client().models.embed_content(
-                model=USER_ACERVO_EMBED_MODEL,
-                contents=batch,
-                config=types.EmbedContentConfig(
-                    task_type="RETRIEVAL_DOCUMENT",
-                    output_dimensionality=USER_ACERVO_EMBED_DIM,
-                    http_options=types.HttpOptions(
-                        timeout=timeout_ms,
-                        retry_options=types.HttpRetryOptions(attempts=retry_attempts),
-                        httpx_client=http_client,
-                    ),
+    result = _run_acervo_gemini_call(
+        label="acervo_embed_batch",
+        timeout_ms=timeout_ms,
+        operation=lambda: get_gemini_client().models.embed_content(
+            model=USER_ACERVO_EMBED_MODEL,
+            contents=batch,
+            config=types.EmbedContentConfig(
+                task_type="RETRIEVAL_DOCUMENT",
+                output_dimensionality=USER_ACERVO_EMBED_DIM,
+                http_options=types.HttpOptions(
+                    timeout=timeout_ms,
+                    retry_options=types.HttpRetryOptions(attempts=1),
+                    httpx_client=http_client,
                 ),
             ),
-        )
-        embeddings = getattr(result, "embeddings", None) or []
-        for e in embeddings:
-            vals = getattr(e, "values", None)
-            if vals is None:
-                raise RuntimeError(
-                    f"Embedding retornou objeto sem 'values': {type(e).__name__}"
-                )
-            vectors.append(list(vals))
-        if start + batch_size < len(chunks):
-            time.sleep(0.3)  # avoid 429 on large uploads
-    if len(vectors) != len(chunks):
+        ),
+    )
+    rows: list[Any] = []
+    embeddings = getattr(result, "embeddings", None) or []
+    for e in embeddings:
+        vals = getattr(e, "values", None)
+        if vals is None:
+            raise RuntimeError(
+                f"Embedding retornou objeto sem 'values': {type(e).__name__}"
+            )
+        rows.append(vals)
+    if len(rows) != len(batch):
+        raise RuntimeError("Falha ao gerar embeddings de todos os chunks do Meu Acervo.")
+    # Uma unica conversao para float32 (n, dim): nada de listas de floats Python por chunk.
+    return np.asarray(rows, dtype=np.float32)
+
+
+def _embed_user_chunks_remote(chunks: list[str]) -> Any:
+    if not chunks:
+        return np.empty((0, USER_ACERVO_EMBED_DIM), dtype=np.float32)
+    batch_size = max(1, min(int(USER_ACERVO_EMBED_BATCH_SIZE or 8), 32))
+    starts = list(range(0, len(chunks), batch_size))
+    parallelism = max(1, min(int(USER_ACERVO_EMBED_PARALLELISM or 1), len(starts)))
+    parts: dict[int, Any] = {}
+
+    if parallelism <= 1:
+        for start in starts:
+            parts[start] = _embed_user_chunk_batch(chunks[start : start + batch_size])
+            if start + batch_size < len(chunks):
+                time.sleep(0.3)  # avoid 429 on large uploads
+    else:
+        # Concorrencia limitada para respeitar a cota; o limitador global cobre 429 pontuais.
+        with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="acervo-embed") as executor:
+            futures = {
+                executor.submit(_embed_user_chunk_batch, chunks[start : start + batch_size]): start
+                for start in starts
+            }
+            for future in as_completed(futures):
+                parts[futures[future]] = future.result()
+
+    vectors = np.concatenate([np.asarray(parts[start], dtype=np.float32) for start in starts])
+    if vectors.shape[0] != len(chunks):
         raise RuntimeError("Falha ao gerar embeddings de todos os chunks do Meu Acervo.")
     return vectors
 
 
+def _maybe_rebuild_user_fts_index(tbl: Any, *, new_rows: int = 0, force: bool = False) -> bool:
+    # O indice FTS e sempre reconstruido por inteiro (O(total de linhas)); por isso so
+    # reconstruimos apos acumular linhas suficientes, apos um intervalo ou ao fim do job.
+    # Chamar com _USER_ACERVO_WRITE_LOCK adquirido.
+    global _USER_ACERVO_FTS_PENDING_ROWS, _USER_ACERVO_FTS_LAST_BUILD_TS
+    _USER_ACERVO_FTS_PENDING_ROWS += max(0, int(new_rows))
+    if _USER_ACERVO_FTS_PENDING_ROWS <= 0:
+        return False
+    now = time.monotonic()
+    due = (
+        force
+        or _USER_ACERVO_FTS_PENDING_ROWS >= USER_ACERVO_FTS_REBUILD_ROWS
+        or now - _USER_ACERVO_FTS_LAST_BUILD_TS >= USER_ACERVO_FTS_REBUILD_INTERVAL_SECONDS
+    )
+    if not due:
+        return False
+    try:
+        tbl.create_fts_index("texto_busca", use_tantivy=False, replace=True)
+    except Exception:
+        return False
+    _USER_ACERVO_FTS_PENDING_ROWS = 0
+    _USER_ACERVO_FTS_LAST_BUILD_TS = now
+    return True
+
+
+def _user_table_has_vector_index(tbl: Any) -> bool:
+    try:
+        return any("vector" in (getattr(index, "columns", None) or ()) for index in tbl.list_indices())
+    except Exception:
+        return False
+
+
+def _maybe_build_user_vector_index(tbl: Any) -> bool:
+    # IVF_HNSW_SQ guarda os vetores quantizados em int8 (1/4 dos bytes do float32 por
+    # varredura); a consulta continua em float32. Linhas novas ficam na busca exata ate
+    # o proximo _optimize_user_vector_index_locked. Chamar SEM o _USER_ACERVO_WRITE_LOCK:
+    # o treino inicial do indice nao pode travar uploads e exclusoes.
+    if USER_ACERVO_VECTOR_INDEX_MIN_ROWS <= 0:
+        return False
+    # Um build por vez; um flush concorrente so pula (o proximo cobre as linhas).
+    if not _USER_ACERVO_VECTOR_INDEX_LOCK.acquire(blocking=False):
+        return False
+    try:
+        if _user_table_has_vector_index(tbl):
+            return False
+        if tbl.count_rows() < USER_ACERVO_VECTOR_INDEX_MIN_ROWS:
+            return False
+        tbl.create_index(metric="l2", vector_column_name="vector", index_type="IVF_HNSW_SQ", replace=True)
+    except Exception as exc:
+        _acervo_log_event("acervo_vector_index_failed", error=_short(str(exc), max_chars=300))
+        return False
+    finally:
+        _USER_ACERVO_VECTOR_INDEX_LOCK.release()
+    _acervo_log_event("acervo_vector_index_built", index_type="IVF_HNSW_SQ")
+    return True
+
+
+def _optimize_user_vector_index_locked(tbl: Any) -> bool:
+    # Incorpora ao indice as linhas gravadas desde o ultimo build. optimize() tambem
+    # compacta fragmentos e poda versoes, entao conflitaria com merge_insert/exclusoes
+    # concorrentes: chamar com _USER_ACERVO_WRITE_LOCK adquirido.
+    if USER_ACERVO_VECTOR_INDEX_MIN_ROWS <= 0 or not _user_table_has_vector_index(tbl):
+        return False
+    try:
+        tbl.optimize()
+    except Exception as exc:
+        _acervo_log_event("acervo_vector_index_failed", error=_short(str(exc), max_chars=300))
+        return False
+    _acervo_log_event("acervo_vector_index_optimized")
+    return True
+
+
+def _flush_user_fts_index() -> None:
+    with _USER_ACERVO_WRITE_LOCK:
+        if _USER_ACERVO_FTS_PENDING_ROWS <= 0:
+            return
+        tbl = _open_user_table(create_if_missing=False)
+        if tbl is None:
+            return
+        _maybe_rebuild_user_fts_index(tbl, force=True)
+        if _user_table_has_vector_index(tbl):
+            _optimize_user_vector_index_locked(tbl)
+            return
+    # Fim de job: unico ponto em que vale contar linhas para decidir o indice vetorial.
+    # Fora do lock de escrita: o treino inicial pode levar minutos em tabelas grandes.
+    _maybe_build_user_vector_index(tbl)
+
+
+def _user_records_to_arrow(records: list[dict[str, Any]]) -> Any:
+    # Monta a tabela Arrow direto do bloco float32 dos vetores, sem passar por um
+    # float Python por dimensao na conversao que o LanceDB faria de list[dict].
+    if pa is None or np is None or not records or any("vector" not in record for record in records):
+        return records
+    schema = _user_lance_schema()
+    flat = np.stack([np.asarray(record["vector"], dtype=np.float32) for record in records]).reshape(-1)
+    columns: list[Any] = []
+    for field in schema:
+        if field.name == "vector":
+            columns.append(pa.FixedSizeListArray.from_arrays(pa.array(flat, type=pa.float32()), USER_ACERVO_EMBED_DIM))
+        else:
+            columns.append(pa.array([record.get(field.name) for record in records], type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
 def _upsert_user_records(records: list[dict[str, Any]]) -> int:
     if not records:
         return 0
@@ -3847,111 +4676,145 @@ def _upsert_user_records(records: list[dict[str, Any]]) -> int:
     if tbl is None:
         raise RuntimeError("Tabela do Meu Acervo indisponivel para escrita.")
 
-    try:
-        before = int(tbl.count_rows())
-    except Exception:
-        before = 0
+    # count_rows() antes/depois custava duas varreduras da tabela por gravacao; o
+    # MergeResult das versoes recentes do LanceDB ja informa as linhas inseridas.
+    inserted_rows = 0
+    batch_size = max(1, int(USER_ACERVO_UPSERT_BATCH_SIZE))
+    for start in range(0, len(records), batch_size):
+        batch = records[start : start + batch_size]
+        data = _user_records_to_arrow(batch)
+        try:
+            merge_result = (
+                tbl.merge_insert("doc_id")
+                .when_matched_update_all()
+                .when_not_matched_insert_all()
+                .execute(data)
+            )
+        except Exception:
+            # Fallback para ambientes sem suporte a merge_insert.
+            tbl.add(data)
+            inserted_rows += len(batch)
+            continue
+        num_inserted = getattr(merge_result, "num_inserted_rows", None)
+        inserted_rows += int(num_inserted) if num_inserted is not None else len(batch)
 
-    try:
-        (
-            tbl.merge_insert("doc_id")
-            .when_matched_update_all()
-            .when_not_matched_insert_all()
-            .execute(records)
-        )
-    except Exception:
-        # Fallback para ambientes sem suporte a merge_insert.
-        tbl.add(records)
+    _maybe_rebuild_user_fts_index(tbl, new_rows=len(records))
+    _QUERY_RESPONSE_CACHE.clear()
+    return max(0, inserted_rows)
 
-    try:
-        tbl.create_fts_index("texto_busca", use_tantivy=False, replace=True)
-    except Exception:
-        pass
 
-    try:
-        after = int(tbl.count_rows())
-        return max(0, after - before)
-    except Exception:
-        return len(records)
+# Regras em ordem de prioridade (a primeira que casar vence). Condicoes "A e B" usam
+# lookaheads ancorados em \A para manter uma unica varredura em C por regra.
+_RUNTIME_ERROR_RULES: tuple[tuple[re.Pattern[str], int, dict[str, str]], ...] = tuple(
+    (re.compile(pattern, flags=re.DOTALL), status_code, detail)
+    for pattern, status_code, detail in (
+        (
+            r"\A(?=.*(?:gemini_api_key|google_tts_api_key))(?=.*(?:ausente|not found|nao configur))",
+            400,
+            {
+                "code": "missing_api_key",
+                "message": "Chave de API ausente.",
+                "hint": "Configure a chave Gemini/Google TTS no guia inicial ou em .env antes de consultar.",
+            },
+        ),
+        (
+            r"api key not valid|\A(?=.*invalid)(?=.*api key)",
+            401,
+            {
+                "code": "invalid_api_key",
+                "message": "Chave de API invalida.",
+                "hint": "Confira se a chave foi copiada corretamente no Google AI Studio.",
+            },
+        ),
+        (
+            r"permission_denied|\A(?=.*api key)(?=.*permission)",
+            401,
+            {
+                "code": "api_key_not_active",
+                "message": "Chave de API sem permissao para uso.",
+                "hint": "Ative a Gemini API no projeto Google Cloud associado a chave e tente novamente.",
+            },
+        ),
+        (
+            r"resource_exhausted|quota",
+            429,
+            {
+                "code": "quota_exhausted",
+                "message": "Cota da API esgotada.",
+                "hint": "Cota gratuita/escalonamento atingido. Aguarde reset ou ajuste billing/limites.",
+            },
+        ),
+        (
+            r"rate limit|too many requests",
+            429,
+            {
+                "code": "rate_limited",
+                "message": "Limite de taxa da API atingido.",
+                "hint": "Reduza paralelismo e frequencia das consultas por minuto.",
+            },
+        ),
+        (
+            r"\A(?=.*model)(?=.*(?:not found|unsupported))",
+            400,
+            {
+                "code": "model_unavailable",
+                "message": "Modelo solicitado indisponivel.",
+                "hint": "Escolha outro modelo Gemini nas configuracoes da plataforma.",
+            },
+        ),
+        (
+            r"nenhum modelo de voz (?:suporta audio|disponivel)",
+            400,
+            {
+                "code": "model_unavailable",
+                "message": "Modelo de voz indisponivel.",
+                "hint": "A chave/API atual nao possui modelo de voz compativel neste endpoint. Configure um modelo TTS suportado.",
+            },
+        ),
+        (
+            r"\A(?=.*falha no tts gemini)"
+            r"(?=.*(?:500 internal|an internal error has occurred|status': 'internal'|\"status\": \"internal\"))",
+            503,
+            {
+                "code": "upstream_unavailable",
+                "message": "Servico de voz temporariamente indisponivel.",
+                "hint": "Servico de voz Gemini indisponivel no momento (erro interno 500). Tente novamente em instantes.",
+            },
+        ),
+        (
+            r"indisponibilidade upstream apos tentativas",
+            503,
+            {
+                "code": "upstream_unavailable",
+                "message": "Servico de voz temporariamente indisponivel.",
+                "hint": "Servico de voz Gemini instavel no momento. Tente novamente em instantes.",
+            },
+        ),
+        (
+            r"timeout|timed out|deadline|unavailable|503",
+            503,
+            {
+                "code": "upstream_unavailable",
+                "message": "Servico Gemini temporariamente indisponivel.",
+                "hint": "Servico Gemini indisponivel no momento. Tente novamente em instantes.",
+            },
+        ),
+    )
+)
+_RUNTIME_ERROR_DEFAULT: dict[str, str] = {
+    "code": "internal_error",
+    "message": "Falha interna no backend.",
+    "hint": "Verifique logs do backend para diagnostico detalhado.",
+}
 
 
 def _classify_runtime_error(exc: Exception) -> tuple[int, dict[str, str]]:
     message = str(exc).strip() or "Falha interna no backend."
     norm = message.lower()
-
-    if (
-        ("gemini_api_key" in norm or "google_tts_api_key" in norm)
-        and ("ausente" in norm or "not found" in norm or "nao configur" in norm)
-    ):
-        return 400, {
-            "code": "missing_api_key",
-            "message": "Chave de API ausente.",
-            "hint": "Configure a chave Gemini/Google TTS no guia inicial ou em .env antes de consultar.",
-        }
-    if "api key not valid" in norm or ("invalid" in norm and "api key" in norm):
-        return 401, {
-            "code": "invalid_api_key",
-            "message": "Chave de API invalida.",
-            "hint": "Confira se a chave foi copiada corretamente no Google AI Studio.",
-        }
-    if "permission_denied" in norm or "api key" in norm and "permission" in norm:
-        return 401, {
-            "code": "api_key_not_active",
-            "message": "Chave de API sem permissao para uso.",
-            "hint": "Ative a Gemini API no projeto Google Cloud associado a chave e tente novamente.",
-        }
-    if "resource_exhausted" in norm or "quota" in norm:
-        return 429, {
-            "code": "quota_exhausted",
-            "message": "Cota da API esgotada.",
-            "hint": "Cota gratuita/escalonamento atingido. Aguarde reset ou ajuste billing/limites.",
-        }
-    if "rate limit" in norm or "too many requests" in norm:
-        return 429, {
-            "code": "rate_limited",
-            "message": "Limite de taxa da API atingido.",
-            "hint": "Reduza paralelismo e frequencia das consultas por minuto.",
-        }
-    if "model" in norm and ("not found" in norm or "unsupported" in norm):
-        return 400, {
-            "code": "model_unavailable",
-            "message": "Modelo solicitado indisponivel.",
-            "hint": "Escolha outro modelo Gemini nas configuracoes da plataforma.",
-        }
-    if "nenhum modelo de voz suporta audio" in norm or "nenhum modelo de voz disponivel" in norm:
-        return 400, {
-            "code": "model_unavailable",
-            "message": "Modelo de voz indisponivel.",
-            "hint": "A chave/API atual nao possui modelo de voz compativel neste endpoint. Configure um modelo TTS suportado.",
-        }
-    if "falha no tts gemini" in norm and (
-        "500 internal" in norm
-        or "an internal error has occurred" in norm
-        or "status': 'internal'" in norm
-        or '"status": "internal"' in norm
-    ):
-        return 503, {
-            "code": "upstream_unavailable",
-            "message": "Servico de voz temporariamente indisponivel.",
-            "hint": "Servico de voz Gemini indisponivel no momento (erro interno 500). Tente novamente em instantes.",
-        }
-    if "indisponibilidade upstream apos tentativas" in norm:
-        return 503, {
-            "code": "upstream_unavailable",
-            "message": "Servico de voz temporariamente indisponivel.",
-            "hint": "Servico de voz Gemini instavel no momento. Tente novamente em instantes.",
-        }
-    if "timeout" in norm or "timed out" in norm or "deadline" in norm or "unavailable" in norm or "503" in norm:
-        return 503, {
-            "code": "upstream_unavailable",
-            "message": "Servico Gemini temporariamente indisponivel.",
-            "hint": "Servico Gemini indisponivel no momento. Tente novamente em instantes.",
-        }
-    return 500, {
-        "code": "internal_error",
-        "message": "Falha interna no backend.",
-        "hint": "Verifique logs do backend para diagnostico detalhado.",
-    }
+    for pattern, status_code, detail in _RUNTIME_ERROR_RULES:
+        if pattern.search(norm) is not None:
+            return status_code, dict(detail)
+    return 500, dict(_RUNTIME_ERROR_DEFAULT)
 
 
 def _is_soft_gemini_validation_error(exc: Exception) -> bool:
@@ -3999,6 +4862,11 @@ def _raise_api_error(exc: Exception, trace_id: str | None = None) -> None:
 
 
 def _jsonl_line(payload: dict[str, Any]) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
     return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
 
 
@@ -4213,23 +5081,29 @@ def health() -> dict[str, Any]:
         "version": str(version_info.get("version", "")),
         "build": int(version_info.get("build", 0) or 0),
         "reranker_warning": rw if rw else None,
-        "defaults": {
-            "reranker_backend": RERANKER_BACKEND,
-            "reranker_model": RERANKER_MODEL,
-            "gemini_rerank_model": GEMINI_RERANK_MODEL,
-            "generation_model": GENERATION_MODEL,
-            "persona_prompt_defaults": get_persona_prompt_defaults(),
-            "explain_model": EXPLAIN_MODEL,
-            "tts_provider": TTS_PROVIDER,
-            "tts_model": _tts_response_model(),
-            "tts_voice": _tts_response_voice(),
-            "tts_rate": TTS_RATE,
-            "tts_pitch_semitones": TTS_PITCH_SEMITONES,
-            "tts_break_alt_ms": TTS_BREAK_ALT_MS,
-            "tts_break_art_ms": TTS_BREAK_ART_MS,
-            "tts_max_ssml_chars": _tts_response_max_chars(),
-            "rag_tuning": get_rag_tuning_defaults(),
-        },
+        "defaults": _health_defaults(),
+    }
+
+
+# Os defaults so mudam via /api/tts/config e /api/gemini/config, que limpam este cache.
+@functools.lru_cache(maxsize=1)
+def _health_defaults() -> dict[str, Any]:
+    return {
+        "reranker_backend": RERANKER_BACKEND,
+        "reranker_model": RERANKER_MODEL,
+        "gemini_rerank_model": GEMINI_RERANK_MODEL,
+        "generation_model": GENERATION_MODEL,
+        "persona_prompt_defaults": get_persona_prompt_defaults(),
+        "explain_model": EXPLAIN_MODEL,
+        "tts_provider": TTS_PROVIDER,
+        "tts_model": _tts_response_model(),
+        "tts_voice": _tts_response_voice(),
+        "tts_rate": TTS_RATE,
+        "tts_pitch_semitones": TTS_PITCH_SEMITONES,
+        "tts_break_alt_ms": TTS_BREAK_ALT_MS,
+        "tts_break_art_ms": TTS_BREAK_ART_MS,
+        "tts_max_ssml_chars": _tts_response_max_chars(),
+        "rag_tuning": get_rag_tuning_defaults(),
     }
 
 
@@ -4272,6 +5146,7 @@ def tts_config_update_api(payload: TTSProviderConfigRequest) -> dict[str, Any]:
     provider = _normalize_tts_provider(raw_provider)
     global TTS_PROVIDER
     TTS_PROVIDER = provider
+    _health_defaults.cache_clear()
 
     if payload.persist_env:
         _upsert_env_tts_provider(provider)
@@ -4328,6 +5203,8 @@ def gemini_config_api(payload: GeminiConfigRequest) -> dict[str, Any]:
         else:
             _raise_api_error(exc)
 
+    _health_defaults.cache_clear()
+    _QUERY_RESPONSE_CACHE.clear()
     if payload.persist_env:
         _upsert_env_gemini_key(key)
     return {
@@ -4578,6 +5455,8 @@ def meu_acervo_index_api(
                     temp_path.unlink()
             except Exception:
                 pass
+        if isinstance(exc, HTTPException):
+            raise
         _raise_api_error(exc)
 
     return {
@@ -4721,6 +5600,13 @@ def query_api(payload: QueryRequest, request: Request) -> dict[str, Any]:
         limit=RATE_LIMIT_QUERY_PER_MIN,
         window_seconds=60,
     )
+    # Respostas com trace carregam diagnostico da execucao e nao sao reaproveitadas.
+    cache_key = ""
+    if QUERY_CACHE_ENABLED and not payload.trace:
+        cache_key = _response_cache_key("query", payload.model_dump())
+        cached = _QUERY_RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
     try:
         answer, docs, meta = run_query(
             query=payload.query,
@@ -4744,25 +5630,42 @@ def query_api(payload: QueryRequest, request: Request) -> dict[str, Any]:
     except Exception as exc:
         _raise_api_error(exc)
 
-    return {
+    response = {
         "answer": answer,
         "docs": [_serialize_doc(i, d) for i, d in enumerate(docs, 1)],
         "meta": meta,
     }
+    if cache_key and _is_cacheable_query_response(answer, meta):
+        _QUERY_RESPONSE_CACHE.put(cache_key, copy.deepcopy(response))
+    return response
+
+
+def _threadsafe_queue_put(event_queue: asyncio.Queue) -> Callable[[Any], None]:
+    # O worker roda em thread propria; os eventos entram na fila pelo loop do request.
+    loop = asyncio.get_running_loop()
+
+    def put(item: Any) -> None:
+        try:
+            loop.call_soon_threadsafe(event_queue.put_nowait, item)
+        except RuntimeError:
+            pass  # loop encerrado: cliente ja desconectou
+
+    return put
 
 
 @app.post("/api/query/stream")
-def query_stream_api(payload: QueryRequest, request: Request) -> StreamingResponse:
+async def query_stream_api(payload: QueryRequest, request: Request) -> StreamingResponse:
     _enforce_rate_limit(
         request,
         bucket="query",
         limit=RATE_LIMIT_QUERY_PER_MIN,
         window_seconds=60,
     )
-    event_queue: queue.Queue[Optional[dict[str, Any]]] = queue.Queue()
+    event_queue: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue()
+    put_event = _threadsafe_queue_put(event_queue)
 
     def stage_callback(stage: str, stage_payload: dict[str, Any]) -> None:
-        event_queue.put(
+        put_event(
             {
                 "event": "stage",
                 "stage": str(stage or ""),
@@ -4792,7 +5695,7 @@ def query_stream_api(payload: QueryRequest, request: Request) -> StreamingRespon
                 stage_callback=stage_callback,
                 return_meta=True,
             )
-            event_queue.put(
+            put_event(
                 {
                     "event": "result",
                     "data": {
@@ -4804,7 +5707,7 @@ def query_stream_api(payload: QueryRequest, request: Request) -> StreamingRespon
             )
         except Exception as exc:  # pragma: no cover - integration-level behavior
             status_code, detail = _classify_runtime_error(exc)
-            event_queue.put(
+            put_event(
                 {
                     "event": "error",
                     "status_code": int(status_code),
@@ -4812,14 +5715,14 @@ def query_stream_api(payload: QueryRequest, request: Request) -> StreamingRespon
                 }
             )
         finally:
-            event_queue.put(None)
+            put_event(None)
 
-    def stream_iter():
+    async def stream_iter():
         yield _jsonl_line({"event": "started"})
         while True:
             try:
-                item = event_queue.get(timeout=0.5)
-            except queue.Empty:
+                item = await asyncio.wait_for(event_queue.get(), timeout=0.5)
+            except asyncio.TimeoutError:
                 yield _jsonl_line({"event": "heartbeat"})
                 continue
             if item is None:
@@ -4861,14 +5764,32 @@ def tts_api(payload: TTSRequest, request: Request) -> dict[str, Any]:
         window_seconds=60,
     )
     trace_id = _new_trace_id()
-    try:
-        synthesized = _synthesize_tts(payload.text, trace_id=trace_id)
-    except Exception as exc:
-        _raise_api_error(exc, trace_id=trace_id)
+    cache_key = ""
+    synthesized = None
+    if TTS_CACHE_ENABLED:
+        cache_key = _response_cache_key(
+            "tts",
+            TTS_PROVIDER,
+            _tts_response_model(),
+            _tts_response_voice(),
+            TTS_RATE,
+            TTS_PITCH_SEMITONES,
+            TTS_BREAK_ALT_MS,
+            TTS_BREAK_ART_MS,
+            payload.text,
+        )
+        synthesized = _TTS_RESPONSE_CACHE.get(cache_key)
+    if synthesized is None:
+        try:
+            synthesized = _synthesize_tts(payload.text, trace_id=trace_id)
+        except Exception as exc:
+            _raise_api_error(exc, trace_id=trace_id)
     if isinstance(synthesized, tuple):
         audio, mime_type = synthesized
     else:
         audio, mime_type = synthesized, "audio/mpeg"
+    if cache_key and audio:
+        _TTS_RESPONSE_CACHE.put(cache_key, (audio, mime_type), size=len(audio))
     return {
         "mime_type": mime_type,
         "audio_base64": base64.b64encode(audio).decode("ascii"),
@@ -4885,14 +5806,15 @@ def tts_api(payload: TTSRequest, request: Request) -> dict[str, Any]:
 
 
 @app.post("/api/tts/stream")
-def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
+async def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
     _enforce_rate_limit(
         request,
         bucket="tts",
         limit=RATE_LIMIT_TTS_PER_MIN,
         window_seconds=60,
     )
-    event_queue: queue.Queue[Optional[dict[str, Any]]] = queue.Queue()
+    event_queue: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue()
+    put_event = _threadsafe_queue_put(event_queue)
     trace_id = _new_trace_id()
 
     def worker() -> None:
@@ -4903,7 +5825,7 @@ def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
                 trace_id=trace_id,
             ):
                 emitted += 1
-                event_queue.put(
+                put_event(
                     {
                         "event": "chunk",
                         "trace_id": trace_id,
@@ -4915,7 +5837,7 @@ def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
                         "provider": TTS_PROVIDER,
                     }
                 )
-            event_queue.put(
+            put_event(
                 {
                     "event": "done",
                     "trace_id": trace_id,
@@ -4926,7 +5848,7 @@ def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
             status_code, detail = _classify_runtime_error(exc)
             detail = dict(detail)
             detail["trace_id"] = trace_id
-            event_queue.put(
+            put_event(
                 {
                     "event": "error",
                     "trace_id": trace_id,
@@ -4935,9 +5857,9 @@ def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
                 }
             )
         finally:
-            event_queue.put(None)
+            put_event(None)
 
-    def stream_iter():
+    async def stream_iter():
         yield _jsonl_line(
             {
                 "event": "started",
@@ -4949,8 +5871,8 @@ def tts_stream_api(payload: TTSRequest, request: Request) -> StreamingResponse:
         )
         while True:
             try:
-                item = event_queue.get(timeout=0.5)
-            except queue.Empty:
+                item = await asyncio.wait_for(event_queue.get(), timeout=0.5)
+            except asyncio.TimeoutError:
                 yield _jsonl_line({"event": "heartbeat", "trace_id": trace_id})
                 continue
             if item is None:
@@ -1,15 +1,44 @@
 from __future__ import annotations
 
-import base64
+import binascii
+import functools
+import hashlib
+import io
 import json
+import os
+import re
+import tempfile
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Callable, Generator
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - fallback para json da stdlib
+    orjson = None
+
+try:
+    import pycurl
+except Exception:  # pragma: no cover - transporte nativo opcional
+    pycurl = None
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx so negocia HTTP/2 com o pacote h2 instalado)
+except Exception:  # pragma: no cover - HTTP/2 e opcional
+    httpx = None
 
 
 DEFAULT_ENDPOINT = "https://texttospeech.googleapis.com/v1/text:synthesize"
+_AUDIO_CONTENT_RE = re.compile(rb'"audioContent"\s*:\s*"([^"]*)"')
 
 
 @dataclass(frozen=True)
@@ -22,6 +51,173 @@ class LegacyGoogleTTSConfig:
     max_ssml_chars: int = 5000
     timeout_ms: int = 45000
     endpoint: str = DEFAULT_ENDPOINT
+    max_concurrency: int = 6
+    cache_dir: str = ""
+    cache_max_mb: int = 256
+    prewarm: bool = False
+    coalesce_chunks: bool = True
+
+
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    # Sessao compartilhada: os chunks (e chamadas seguintes) reaproveitam a conexao
+    # TLS com texttospeech.googleapis.com em vez de um handshake por requests.post.
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            retry = Retry(
+                total=2,
+                backoff_factor=0.2,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}),
+                raise_on_status=False,
+            )
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+            _SESSION = session
+        return _SESSION
+
+
+_HTTP2_CLIENT: Any = None
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_RETRIES = 2
+_CURL_LOCAL = threading.local()
+_CURL_SHARE: Any = None
+
+
+@dataclass(frozen=True)
+class _CurlResponse:
+    status_code: int
+    content: bytes
+
+
+def _get_http2_client() -> Any:
+    # Com h2 disponivel, os chunks em voo viram streams multiplexados numa unica
+    # conexao TLS; sem ele, seguimos na sessao HTTP/1.1 pooled.
+    global _HTTP2_CLIENT
+    if httpx is None:
+        return None
+    with _SESSION_LOCK:
+        if _HTTP2_CLIENT is None:
+            _HTTP2_CLIENT = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+            )
+        return _HTTP2_CLIENT
+
+
+def _get_curl_handle() -> Any:
+    # Um easy handle por thread do pool, cada um com suas proprias conexoes keep-alive.
+    # O share fica so com DNS e sessao TLS: o cache de conexoes do libcurl nao e seguro
+    # entre easy handles rodando em paralelo.
+    global _CURL_SHARE
+    handle = getattr(_CURL_LOCAL, "handle", None)
+    if handle is not None:
+        return handle
+    with _SESSION_LOCK:
+        if _CURL_SHARE is None:
+            share = pycurl.CurlShare()
+            for lock_name in ("LOCK_DATA_DNS", "LOCK_DATA_SSL_SESSION"):
+                lock_data = getattr(pycurl, lock_name, None)
+                if lock_data is None:
+                    continue
+                try:
+                    share.setopt(pycurl.SH_SHARE, lock_data)
+                except pycurl.error:
+                    continue
+            _CURL_SHARE = share
+    handle = pycurl.Curl()
+    handle.setopt(pycurl.SHARE, _CURL_SHARE)
+    handle.setopt(pycurl.TCP_KEEPALIVE, 1)
+    try:
+        handle.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+    except (AttributeError, pycurl.error):
+        pass
+    _CURL_LOCAL.handle = handle
+    return handle
+
+
+def _curl_request(endpoint: str, *, body: bytes | None, headers: dict, timeout: float) -> _CurlResponse:
+    # perform() roda sem o GIL: os chunks paralelos nao disputam o interpretador no I/O.
+    handle = _get_curl_handle()
+    buffer = io.BytesIO()
+    handle.setopt(pycurl.URL, endpoint)
+    handle.setopt(pycurl.HTTPHEADER, [f"{name}: {value}" for name, value in headers.items()])
+    handle.setopt(pycurl.TIMEOUT_MS, int(timeout * 1000))
+    handle.setopt(pycurl.CONNECTTIMEOUT_MS, int(min(timeout, 10.0) * 1000))
+    handle.setopt(pycurl.WRITEDATA, buffer)
+    if body is None:
+        handle.setopt(pycurl.NOBODY, 1)
+    else:
+        handle.setopt(pycurl.NOBODY, 0)
+        handle.setopt(pycurl.POST, 1)
+        handle.setopt(pycurl.POSTFIELDS, body)
+    handle.perform()
+    return _CurlResponse(status_code=int(handle.getinfo(pycurl.RESPONSE_CODE)), content=buffer.getvalue())
+
+
+def _send_with_retries(send: Callable[[], Any], retry_errors: tuple[type[BaseException], ...]) -> Any:
+    attempt = 0
+    while True:
+        try:
+            response = send()
+        except retry_errors:
+            if attempt >= _MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in _RETRY_STATUSES or attempt >= _MAX_RETRIES:
+                return response
+        # Mesmo backoff do Retry da sessao requests (0.2s, 0.4s).
+        time.sleep(0.2 * (2**attempt))
+        attempt += 1
+
+
+def _post_chunk_request(endpoint: str, *, body: bytes, headers: dict, timeout: float) -> Any:
+    if pycurl is not None:
+        return _send_with_retries(
+            lambda: _curl_request(endpoint, body=body, headers=headers, timeout=timeout),
+            (pycurl.error,),
+        )
+    client = _get_http2_client()
+    if client is None:
+        return _get_session().post(endpoint, data=body, headers=headers, timeout=timeout)
+    return _send_with_retries(
+        lambda: client.post(endpoint, content=body, headers=headers, timeout=timeout),
+        (httpx.TransportError,),
+    )
+
+
+_PREWARM_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _prewarm_connection(endpoint: str) -> None:
+    # So abre/reaproveita a conexao TLS no pool; a resposta (405/404) e descartada.
+    try:
+        if pycurl is not None:
+            _curl_request(endpoint, body=None, headers={}, timeout=2.0)
+            return
+        client = _get_http2_client()
+        if client is None:
+            _get_session().head(endpoint, timeout=2.0).close()
+        else:
+            client.head(endpoint, timeout=2.0)
+    except Exception:
+        return
+
+
+def _start_prewarm(config: LegacyGoogleTTSConfig) -> None:
+    global _PREWARM_EXECUTOR
+    if not config.prewarm or not (config.api_key or "").strip():
+        return
+    endpoint = (config.endpoint or DEFAULT_ENDPOINT).strip() or DEFAULT_ENDPOINT
+    with _SESSION_LOCK:
+        if _PREWARM_EXECUTOR is None:
+            _PREWARM_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-legacy-prewarm")
+        executor = _PREWARM_EXECUTOR
+    executor.submit(_prewarm_connection, endpoint)
 
 
 LogEventFn = Callable[..., None]
@@ -39,18 +235,83 @@ def _log(log_event: LogEventFn | None, event: str, trace_id: str, **fields: Any)
         return
 
 
-def _extract_error_detail(resp: requests.Response) -> str:
+def _loads_json(body: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _dumps_json(payload: Any) -> bytes:
+    # Serializa o corpo uma unica vez; requests/httpx enviam os bytes sem reprocessar.
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _utf8_len(text: str) -> int:
+    # SSML ASCII tem 1 byte por caractere: evita o encode so para medir.
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8"))
+
+
+def _decode_audio_content(body: bytes) -> bytes:
+    # O corpo e quase todo base64: extrai audioContent direto dos bytes, sem montar o dict.
+    match = _AUDIO_CONTENT_RE.search(body)
+    b64: bytes | memoryview
+    if match is not None and body.find(b"\\", match.start(1), match.end(1)) == -1:
+        # Fatia sem copia: o base64 (varios MB) e decodificado direto do buffer da resposta.
+        b64 = memoryview(body)[match.start(1) : match.end(1)]
+    else:
+        data = _loads_json(body)
+        b64 = str((data or {}).get("audioContent") or "").encode("ascii", "ignore")
+    try:
+        audio = binascii.a2b_base64(b64)
+    except binascii.Error as exc:
+        raise RuntimeError("Falha no TTS Google: audioContent invalido.") from exc
+    if not audio:
+        raise RuntimeError("Falha no TTS Google: resposta sem audioContent.")
+    return audio
+
+
+def _extract_error_detail(resp: Any) -> str:
     try:
-        payload = resp.json()
+        payload = _loads_json(resp.content)
         if isinstance(payload, dict):
             error = payload.get("error")
             if isinstance(error, dict):
                 message = str(error.get("message") or "").strip()
                 if message:
                     return message
-        return json.dumps(payload, ensure_ascii=False)[:300]
+        return _dumps_json(payload).decode("utf-8", errors="replace")[:300]
     except Exception:
-        return (resp.text or "")[:300]
+        # resp.text dispararia a deteccao de charset do requests; o corpo de erro e UTF-8.
+        return bytes(resp.content or b"")[:300].decode("utf-8", errors="replace")
+
+
+@functools.lru_cache(maxsize=32)
+def _payload_suffix(language_code: str, voice_name: str, speaking_rate: float, pitch: float) -> bytes:
+    # Campos constantes por configuracao, serializados uma vez sem as chaves externas.
+    return _dumps_json(
+        {
+            "voice": {"languageCode": language_code, "name": voice_name},
+            "audioConfig": {
+                "audioEncoding": "MP3",
+                "speakingRate": speaking_rate,
+                "pitch": pitch,
+            },
+        }
+    )[1:-1]
+
+
+def _build_request_body(ssml: str, config: LegacyGoogleTTSConfig) -> bytes:
+    suffix = _payload_suffix(
+        config.language_code,
+        config.voice_name,
+        float(config.speaking_rate),
+        float(config.pitch_semitones),
+    )
+    return b'{"input":{"ssml":' + _dumps_json(ssml) + b"}," + suffix + b"}"
 
 
 def _request_chunk_audio(
@@ -58,35 +319,19 @@ def _request_chunk_audio(
     ssml: str,
     config: LegacyGoogleTTSConfig,
 ) -> bytes:
-    payload = {
-        "input": {"ssml": ssml},
-        "voice": {"languageCode": config.language_code, "name": config.voice_name},
-        "audioConfig": {
-            "audioEncoding": "MP3",
-            "speakingRate": float(config.speaking_rate),
-            "pitch": float(config.pitch_semitones),
-        },
-    }
     timeout_seconds = max(5.0, min(float(config.timeout_ms) / 1000.0, 300.0))
     endpoint = (config.endpoint or DEFAULT_ENDPOINT).strip() or DEFAULT_ENDPOINT
-    response = requests.post(
+    response = _post_chunk_request(
         endpoint,
-        json=payload,
-        headers={"X-Goog-Api-Key": config.api_key},
+        body=_build_request_body(ssml, config),
+        headers={"X-Goog-Api-Key": config.api_key, "Content-Type": "application/json"},
         timeout=timeout_seconds,
     )
     if response.status_code >= 400:
         detail = _extract_error_detail(response)
         raise RuntimeError(f"Falha no TTS Google ({response.status_code}): {detail}")
 
-    data = response.json()
-    b64 = str((data or {}).get("audioContent") or "").strip()
-    if not b64:
-        raise RuntimeError("Falha no TTS Google: resposta sem audioContent.")
-    try:
-        return base64.b64decode(b64)
-    except Exception as exc:
-        raise RuntimeError("Falha no TTS Google: audioContent invalido.") from exc
+    return _decode_audio_content(response.content)
 
 
 def _prepare_chunks(
@@ -105,7 +350,192 @@ def _prepare_chunks(
     return prepared, chunks
 
 
-def synthesize_legacy_google_tts(
+def _coalesce_chunks(chunks: list[str], *, build_ssml: BuildSSMLFn, limit: int) -> list[str]:
+    # Junta blocos vizinhos enquanto o SSML resultante couber no limite: menos requisicoes.
+    merged: list[str] = []
+    current = ""
+    current_bytes = 0
+    for chunk in chunks:
+        if not current:
+            current = chunk
+            current_bytes = _utf8_len(build_ssml(chunk))
+            continue
+        # Limite inferior barato (o escape so aumenta o texto) antes de medir o candidato.
+        if current_bytes + 1 + _utf8_len(chunk) > limit:
+            merged.append(current)
+            current = chunk
+            current_bytes = _utf8_len(build_ssml(chunk))
+            continue
+        candidate = f"{current} {chunk}"
+        candidate_bytes = _utf8_len(build_ssml(candidate))
+        if candidate_bytes <= limit:
+            current = candidate
+            current_bytes = candidate_bytes
+        else:
+            merged.append(current)
+            current = chunk
+            current_bytes = _utf8_len(build_ssml(chunk))
+    if current:
+        merged.append(current)
+    return merged
+
+
+def _build_chunk_jobs(
+    *,
+    chunks: list[str],
+    config: LegacyGoogleTTSConfig,
+    build_ssml: BuildSSMLFn,
+) -> list[tuple[int, str, str]]:
+    # Monta e mede todos os blocos primeiro; um unico ponto de erro antes do disparo.
+    ssmls = [build_ssml(chunk) for chunk in chunks]
+    sizes = [_utf8_len(ssml) for ssml in ssmls]
+    limit = int(config.max_ssml_chars)
+    if sizes and max(sizes) > limit:
+        worst = max(range(len(sizes)), key=sizes.__getitem__)
+        oversized = sum(1 for size in sizes if size > limit)
+        raise RuntimeError(
+            f"Falha no TTS Google: bloco SSML {worst + 1} com {sizes[worst]} bytes excede o limite de {limit} bytes"
+            f" ({oversized} de {len(sizes)} blocos acima do limite)."
+        )
+    return [(idx, ssml, chunk) for idx, (ssml, chunk) in enumerate(zip(ssmls, chunks), start=1)]
+
+
+_CHUNK_CACHE_EVICT_EVERY = 64
+_CHUNK_CACHE_STORES = 0
+_CHUNK_CACHE_LOCK = threading.Lock()
+
+
+def _chunk_cache_path(ssml: str, config: LegacyGoogleTTSConfig) -> Path | None:
+    if not config.cache_dir:
+        return None
+    raw = "|".join(
+        (
+            config.voice_name,
+            config.language_code,
+            f"{float(config.speaking_rate):.3f}",
+            f"{float(config.pitch_semitones):.3f}",
+            ssml,
+        )
+    ).encode("utf-8", errors="ignore")
+    key = hashlib.blake2b(raw, digest_size=20).hexdigest()
+    return Path(config.cache_dir) / key[:2] / f"{key}.mp3"
+
+
+def _load_cached_chunk(path: Path) -> bytes | None:
+    try:
+        audio = path.read_bytes()
+    except OSError:
+        return None
+    if not audio:
+        return None
+    try:
+        # mtime marca o uso recente para a evicao LRU.
+        os.utime(path)
+    except OSError:
+        pass
+    return audio
+
+
+def _evict_chunk_cache(cache_dir: Path, max_bytes: int) -> None:
+    entries: list[tuple[float, int, Path]] = []
+    total = 0
+    for path in cache_dir.glob("*/*.mp3"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _mtime, size, path in entries:
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        if total <= max_bytes:
+            return
+
+
+def _store_cached_chunk(path: Path, audio: bytes, config: LegacyGoogleTTSConfig) -> None:
+    global _CHUNK_CACHE_STORES
+    if not audio:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(audio)
+            os.replace(tmp_name, path)
+        except Exception:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+    except Exception:
+        return
+    with _CHUNK_CACHE_LOCK:
+        _CHUNK_CACHE_STORES += 1
+        should_evict = _CHUNK_CACHE_STORES % _CHUNK_CACHE_EVICT_EVERY == 1
+    if should_evict:
+        _evict_chunk_cache(Path(config.cache_dir), max(1, int(config.cache_max_mb)) * 1024 * 1024)
+
+
+def _timed_chunk_audio(ssml: str, config: LegacyGoogleTTSConfig) -> tuple[bytes, int]:
+    started = time.perf_counter()
+    cache_path = _chunk_cache_path(ssml, config)
+    audio = _load_cached_chunk(cache_path) if cache_path is not None else None
+    if audio is None:
+        audio = _request_chunk_audio(ssml=ssml, config=config)
+        if cache_path is not None:
+            _store_cached_chunk(cache_path, audio, config)
+    return audio, int((time.perf_counter() - started) * 1000)
+
+
+def _iter_chunk_audio_in_order(
+    *,
+    jobs: list[tuple[int, str, str]],
+    config: LegacyGoogleTTSConfig,
+    trace_id: str,
+    log_event: LogEventFn | None,
+    event_prefix: str,
+) -> Iterator[tuple[int, bytes]]:
+    """Synthesize *jobs* concurrently and yield ``(index, audio)`` in submission order."""
+    if not jobs:
+        return
+    workers = max(1, min(int(config.max_concurrency or 1), len(jobs)))
+    pending: deque[tuple[int, str, Future]] = deque()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-legacy")
+    try:
+        next_job = 0
+        while next_job < len(jobs) or pending:
+            # Janela de `workers` requisicoes em voo; o consumidor recebe sempre o proximo indice.
+            while next_job < len(jobs) and len(pending) < workers:
+                idx, ssml, chunk = jobs[next_job]
+                next_job += 1
+                _log(log_event, f"{event_prefix}_chunk_start", trace_id, chunk_index=idx, chunk_chars=len(chunk))
+                pending.append((idx, chunk, executor.submit(_timed_chunk_audio, ssml, config)))
+            idx, chunk, future = pending.popleft()
+            audio, duration_ms = future.result()
+            _log(
+                log_event,
+                f"{event_prefix}_chunk_ok",
+                trace_id,
+                chunk_index=idx,
+                chunk_chars=len(chunk),
+                audio_bytes=len(audio),
+                duration_ms=duration_ms,
+            )
+            yield idx, audio
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def synthesize_legacy_google_tts_iter(
     *,
     text: str,
     trace_id: str,
@@ -114,13 +544,17 @@ def synthesize_legacy_google_tts(
     split_tts_chunks: SplitFn,
     build_ssml: BuildSSMLFn,
     log_event: LogEventFn | None = None,
-) -> tuple[bytes, str]:
+) -> Iterator[bytes]:
+    """Yield the MP3 bytes of each chunk in order; frames concatenate into one stream."""
+    _start_prewarm(config)
     prepared, chunks = _prepare_chunks(
         text=text,
         config=config,
         normalize_for_tts=normalize_for_tts,
         split_tts_chunks=split_tts_chunks,
     )
+    if config.coalesce_chunks:
+        chunks = _coalesce_chunks(chunks, build_ssml=build_ssml, limit=int(config.max_ssml_chars))
     started = time.perf_counter()
     _log(
         log_event,
@@ -133,37 +567,50 @@ def synthesize_legacy_google_tts(
         timeout_ms=config.timeout_ms,
     )
 
-    parts: list[bytes] = []
-    for idx, chunk in enumerate(chunks, start=1):
-        ssml = build_ssml(chunk)
-        ssml_bytes = len(ssml.encode("utf-8"))
-        if ssml_bytes > int(config.max_ssml_chars):
-            raise RuntimeError(
-                f"Falha no TTS Google: bloco SSML com {ssml_bytes} bytes excede o limite de {int(config.max_ssml_chars)} bytes."
-            )
-        chunk_started = time.perf_counter()
-        _log(log_event, "tts_legacy_chunk_start", trace_id, chunk_index=idx, chunk_chars=len(chunk))
-        audio = _request_chunk_audio(ssml=ssml, config=config)
-        parts.append(audio)
-        _log(
-            log_event,
-            "tts_legacy_chunk_ok",
-            trace_id,
-            chunk_index=idx,
-            chunk_chars=len(chunk),
-            audio_bytes=len(audio),
-            duration_ms=int((time.perf_counter() - chunk_started) * 1000),
-        )
+    jobs = _build_chunk_jobs(chunks=chunks, config=config, build_ssml=build_ssml)
+    output_bytes = 0
+    for _idx, audio in _iter_chunk_audio_in_order(
+        jobs=jobs,
+        config=config,
+        trace_id=trace_id,
+        log_event=log_event,
+        event_prefix="tts_legacy",
+    ):
+        output_bytes += len(audio)
+        yield audio
 
-    merged = b"".join(parts)
     _log(
         log_event,
         "tts_legacy_success",
         trace_id,
-        output_bytes=len(merged),
+        output_bytes=output_bytes,
         total_duration_ms=int((time.perf_counter() - started) * 1000),
     )
-    return merged, "audio/mpeg"
+
+
+def synthesize_legacy_google_tts(
+    *,
+    text: str,
+    trace_id: str,
+    config: LegacyGoogleTTSConfig,
+    normalize_for_tts: NormalizeFn,
+    split_tts_chunks: SplitFn,
+    build_ssml: BuildSSMLFn,
+    log_event: LogEventFn | None = None,
+) -> tuple[bytes, str]:
+    # Cada chunk vai direto para o buffer e e liberado; sem lista intermediaria + join.
+    buffer = io.BytesIO()
+    for audio in synthesize_legacy_google_tts_iter(
+        text=text,
+        trace_id=trace_id,
+        config=config,
+        normalize_for_tts=normalize_for_tts,
+        split_tts_chunks=split_tts_chunks,
+        build_ssml=build_ssml,
+        log_event=log_event,
+    ):
+        buffer.write(audio)
+    return buffer.getvalue(), "audio/mpeg"
 
 
 def stream_legacy_google_tts_chunks(
@@ -176,6 +623,7 @@ def stream_legacy_google_tts_chunks(
     build_ssml: BuildSSMLFn,
     log_event: LogEventFn | None = None,
 ) -> Generator[tuple[bytes, str, int, int], None, None]:
+    _start_prewarm(config)
     prepared, chunks = _prepare_chunks(
         text=text,
         config=config,
@@ -194,25 +642,14 @@ def stream_legacy_google_tts_chunks(
         timeout_ms=config.timeout_ms,
     )
 
-    for idx, chunk in enumerate(chunks, start=1):
-        ssml = build_ssml(chunk)
-        ssml_bytes = len(ssml.encode("utf-8"))
-        if ssml_bytes > int(config.max_ssml_chars):
-            raise RuntimeError(
-                f"Falha no TTS Google: bloco SSML com {ssml_bytes} bytes excede o limite de {int(config.max_ssml_chars)} bytes."
-            )
-        chunk_started = time.perf_counter()
-        _log(log_event, "tts_legacy_stream_chunk_start", trace_id, chunk_index=idx, chunk_chars=len(chunk))
-        audio = _request_chunk_audio(ssml=ssml, config=config)
-        _log(
-            log_event,
-            "tts_legacy_stream_chunk_ok",
-            trace_id,
-            chunk_index=idx,
-            chunk_chars=len(chunk),
-            audio_bytes=len(audio),
-            duration_ms=int((time.perf_counter() - chunk_started) * 1000),
-        )
+    jobs = _build_chunk_jobs(chunks=chunks, config=config, build_ssml=build_ssml)
+    for idx, audio in _iter_chunk_audio_in_order(
+        jobs=jobs,
+        config=config,
+        trace_id=trace_id,
+        log_event=log_event,
+        event_prefix="tts_legacy_stream",
+    ):
         yield audio, "audio/mpeg", idx, total_chunks
 
     _log(log_event, "tts_legacy_stream_done", trace_id, chunks_emitted=total_chunks)
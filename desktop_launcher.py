@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-import contextlib
+import errno
 import io
 import os
+import select
 import socket
 import sys
 import threading
 import time
 import webbrowser
-from functools import partial
-from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
 
 BACKEND_HOST = "127.0.0.1"
 BACKEND_PORT = 8000
@@ -20,6 +22,7 @@ FRONTEND_HOST = "127.0.0.1"
 FRONTEND_PORT = 5500
 BACKEND_URL = f"http://{BACKEND_HOST}:{BACKEND_PORT}"
 FRONTEND_URL = f"http://{FRONTEND_HOST}:{FRONTEND_PORT}"
+SUPERVISOR_WAKE_S = 2.0
 
 
 class _NullTextIO(io.TextIOBase):
@@ -65,18 +68,6 @@ def _ensure_safe_stdio() -> None:
         setattr(sys, name, _SafeTextIO(stream))
 
 
-class QuietSimpleHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """SimpleHTTPRequestHandler variant safe for frozen apps without stderr.
-
-    When the packaged EXE is started without a usable console, ``sys.stderr``
-    may be ``None``. The stdlib handler writes an access log for every
-    request and crashes before responding if ``stderr`` is unavailable.
-    """
-
-    def log_message(self, format: str, *args) -> None:  # noqa: A003 - stdlib signature
-        return
-
-
 def _runtime_root() -> Path:
     if getattr(sys, "frozen", False):
         return Path(sys.executable).resolve().parent
@@ -159,38 +150,146 @@ def _handle_probe_cli(argv: list[str]) -> int | None:
         return 1
 
 
+_CONNECT_PENDING_ERRNOS = {
+    code
+    for code in (
+        getattr(errno, "EINPROGRESS", None),
+        getattr(errno, "EWOULDBLOCK", None),
+        getattr(errno, "EALREADY", None),
+        getattr(errno, "WSAEWOULDBLOCK", None),
+    )
+    if code is not None
+}
+
+
+def _probe_port(host: str, port: int, timeout_s: float) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setblocking(False)
+        result = sock.connect_ex((host, port))
+        if result == 0:
+            return True
+        if result not in _CONNECT_PENDING_ERRNOS:
+            return False
+        # No Windows a recusa chega em exceptfds, nao em writefds.
+        _, writable, failed = select.select([], [sock], [sock], max(0.0, timeout_s))
+        if failed or not writable:
+            return False
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+
+
 def _is_port_busy(host: str, port: int) -> bool:
+    # Tenta o bind com as mesmas opcoes do uvicorn: falha = porta ocupada, mesmo que o
+    # dono ainda nao esteja aceitando conexoes.
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        sock.settimeout(0.25)
-        return sock.connect_ex((host, port)) == 0
+        if os.name == "nt":
+            exclusive = getattr(socket, "SO_EXCLUSIVEADDRUSE", None)
+            if exclusive is not None:
+                sock.setsockopt(socket.SOL_SOCKET, exclusive, 1)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return True
+        return False
 
 
 def _wait_port(host: str, port: int, timeout_s: float) -> bool:
-    deadline = time.time() + timeout_s
-    while time.time() < deadline:
-        if _is_port_busy(host, port):
+    deadline = time.monotonic() + timeout_s
+    delay = 0.005
+    while True:
+        remaining = deadline - time.monotonic()
+        if _probe_port(host, port, min(max(remaining, 0.0), 1.0)):
             return True
-        time.sleep(0.15)
-    return _is_port_busy(host, port)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        # Backoff curto: detecta o listen() em milissegundos sem girar a CPU.
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
 
 
-def _start_frontend_server(frontend_dir: Path) -> ThreadingHTTPServer:
-    handler = partial(QuietSimpleHTTPRequestHandler, directory=str(frontend_dir))
-    server = ThreadingHTTPServer((FRONTEND_HOST, FRONTEND_PORT), handler)
-    worker = threading.Thread(target=server.serve_forever, daemon=True, name="ratio-frontend")
+def _uvicorn_runtime_options() -> dict[str, str]:
+    # uvloop (so POSIX) e httptools sao opcionais; sem eles fica asyncio + h11.
+    options = {"loop": "asyncio", "http": "h11"}
+    if sys.platform != "win32":
+        try:
+            import uvloop  # noqa: F401
+
+            options["loop"] = "uvloop"
+        except Exception:
+            pass
+    try:
+        import httptools  # noqa: F401
+
+        options["http"] = "httptools"
+    except Exception:
+        pass
+    return options
+
+
+class _ReadyServer(uvicorn.Server):
+    """uvicorn.Server that signals a threading.Event once its sockets are listening."""
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self.ready = threading.Event()
+
+    async def startup(self, *args, **kwargs) -> None:
+        await super().startup(*args, **kwargs)
+        if self.started:
+            self.ready.set()
+
+
+def _wait_server_ready(
+    server: _ReadyServer | None,
+    worker: threading.Thread | None,
+    host: str,
+    port: int,
+    timeout_s: float,
+) -> bool:
+    # Servidor de outro processo: so resta sondar a porta.
+    if server is None or worker is None:
+        return _wait_port(host, port, timeout_s)
+    deadline = time.monotonic() + timeout_s
+    while not server.ready.wait(timeout=min(0.25, max(deadline - time.monotonic(), 0.0))):
+        if not worker.is_alive() or time.monotonic() >= deadline:
+            return server.ready.is_set()
+    return True
+
+
+def _build_frontend_app(frontend_dir: Path) -> Starlette:
+    return Starlette(routes=[Mount("/", app=StaticFiles(directory=str(frontend_dir), html=True), name="frontend")])
+
+
+def _start_frontend_server(frontend_dir: Path) -> tuple[_ReadyServer, threading.Thread]:
+    # Mesma porta/origem de antes (o localStorage do frontend depende dela), mas servido
+    # pelo uvicorn em vez do SimpleHTTPRequestHandler bloqueante.
+    config = uvicorn.Config(
+        app=_build_frontend_app(frontend_dir),
+        host=FRONTEND_HOST,
+        port=FRONTEND_PORT,
+        log_level="warning",
+        access_log=False,
+        **_uvicorn_runtime_options(),
+    )
+    server = _ReadyServer(config)
+    worker = threading.Thread(target=server.run, daemon=True, name="ratio-frontend")
     worker.start()
-    return server
+    return server, worker
 
 
-def _start_backend_server() -> tuple[uvicorn.Server, threading.Thread]:
+def _start_backend_server() -> tuple[_ReadyServer, threading.Thread]:
     backend_app = _load_backend_app()
     config = uvicorn.Config(
         app=backend_app,
         host=BACKEND_HOST,
         port=BACKEND_PORT,
         log_level="info",
+        access_log=False,
+        **_uvicorn_runtime_options(),
     )
-    server = uvicorn.Server(config)
+    server = _ReadyServer(config)
     worker = threading.Thread(target=server.run, daemon=True, name="ratio-backend")
     worker.start()
     return server, worker
@@ -237,8 +336,9 @@ def main() -> int:
         print("Inclua a pasta lancedb_store ao lado do Ratio.exe e tente novamente.")
         return 5
 
-    frontend_server: ThreadingHTTPServer | None = None
-    backend_server: uvicorn.Server | None = None
+    frontend_server: _ReadyServer | None = None
+    frontend_thread: threading.Thread | None = None
+    backend_server: _ReadyServer | None = None
     backend_thread: threading.Thread | None = None
 
     try:
@@ -252,12 +352,12 @@ def main() -> int:
             print(f"[INFO] Frontend ja estava ativo em {FRONTEND_URL}.")
         else:
             print(f"[2/3] Iniciando frontend em {FRONTEND_URL} ...")
-            frontend_server = _start_frontend_server(frontend_dir)
+            frontend_server, frontend_thread = _start_frontend_server(frontend_dir)
 
-        if not _wait_port(BACKEND_HOST, BACKEND_PORT, timeout_s=50):
+        if not _wait_server_ready(backend_server, backend_thread, BACKEND_HOST, BACKEND_PORT, timeout_s=50):
             print("[ERRO] Backend nao respondeu dentro de 50s.")
             return 2
-        if not _wait_port(FRONTEND_HOST, FRONTEND_PORT, timeout_s=20):
+        if not _wait_server_ready(frontend_server, frontend_thread, FRONTEND_HOST, FRONTEND_PORT, timeout_s=20):
             print("[ERRO] Frontend nao respondeu dentro de 20s.")
             return 3
 
@@ -266,8 +366,13 @@ def main() -> int:
         print("Aplicacao iniciada. Pressione Ctrl+C para encerrar.")
 
         while True:
-            time.sleep(0.4)
-            if backend_thread and not backend_thread.is_alive():
+            if backend_thread is None:
+                time.sleep(SUPERVISOR_WAKE_S)
+                continue
+            # join retorna assim que o backend morre; o timeout so existe para o Ctrl+C
+            # ser entregue no Windows, onde um join sem timeout nao e interrompivel.
+            backend_thread.join(timeout=SUPERVISOR_WAKE_S)
+            if not backend_thread.is_alive():
                 print("[ERRO] Backend encerrou inesperadamente.")
                 return 4
     except KeyboardInterrupt:
@@ -277,10 +382,7 @@ def main() -> int:
         if backend_server is not None:
             backend_server.should_exit = True
         if frontend_server is not None:
-            with contextlib.suppress(Exception):
-                frontend_server.shutdown()
-            with contextlib.suppress(Exception):
-                frontend_server.server_close()
+            frontend_server.should_exit = True
 
 
 if __name__ == "__main__":
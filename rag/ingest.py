@@ -20,16 +20,24 @@ Usage:
 from __future__ import annotations
 
 import argparse
+import functools
+import hashlib
 import html
 import json
 import os
+import random
 import re
 import sqlite3
 import sys
+import threading
 import time
+from array import array
+from collections import deque
+from itertools import chain
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Iterable, Iterator, List, Optional, Sized
 
 from google import genai
 from google.genai import types
@@ -37,6 +45,27 @@ import lancedb
 import pyarrow as pa
 from dotenv import load_dotenv
 
+# Execucao direta (py rag/ingest.py) nao tem a raiz do projeto no sys.path.
+if str(Path(__file__).resolve().parent.parent) not in sys.path:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rag.lance_schema import EMBED_L2_NORMALIZE, LANCE_VECTOR_TYPE  # noqa: E402
+
+try:
+    import lxml.html as lxml_html
+except Exception:  # pragma: no cover - fallback para as regex
+    lxml_html = None
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - normalizacao em Python puro
+    np = None
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - fallback para json
+    orjson = None
+
 # Avoid Windows cp1252 crashes when logs contain Unicode.
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
@@ -69,9 +98,30 @@ LANCE_DIR = PROJECT_ROOT / "lancedb_store"
 # Embedding config
 EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
 EMBED_DELAY = float(os.getenv("EMBED_DELAY", "0.0"))
+# Limites da cota Gemini (0 = sem limite); EMBED_DELAY legado vira o RPM equivalente.
+EMBED_RPM = max(0, int(os.getenv("EMBED_RPM", str(int(60 / EMBED_DELAY) if EMBED_DELAY > 0 else 0))))
+EMBED_TPM = max(0, int(os.getenv("EMBED_TPM", "0")))
+EMBED_CONCURRENCY = max(1, min(int(os.getenv("EMBED_CONCURRENCY", "4")), 16))
+EMBED_BATCH_MAX_CHARS = max(1000, int(os.getenv("EMBED_BATCH_MAX_CHARS", "180000")))
 EMBED_DIM = 768  # We enforce 768 dimension to save space
+EMBED_MIN_CHARS = max(1, int(os.getenv("EMBED_MIN_CHARS", "16")))
 EMBED_MODEL = os.getenv("EMBED_MODEL", "gemini-embedding-001")
 
+# Cache persistente de vetores por hash de conteudo, junto dos dados do LanceDB (fora
+# da raiz versionada); EMBED_CACHE_PATH vazio desliga.
+_embed_cache_env = os.getenv("EMBED_CACHE_PATH", str(LANCE_DIR / "rag_embed_cache.db")).strip()
+EMBED_CACHE_PATH: Optional[Path] = Path(_embed_cache_env) if _embed_cache_env else None
+
+# Transformacao linha -> Document em processos (fontes grandes: acordaos, monocraticas)
+INGEST_WORKERS = max(1, int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1)))))
+INGEST_PARALLEL_MIN_ROWS = max(1, int(os.getenv("INGEST_PARALLEL_MIN_ROWS", "5000")))
+INGEST_FETCH_SIZE = max(1, int(os.getenv("INGEST_FETCH_SIZE", "2000")))
+# PRAGMAs da fase de leitura: mmap e cache de paginas maiores para os SELECTs grandes.
+INGEST_SQLITE_MMAP_MB = max(0, int(os.getenv("INGEST_SQLITE_MMAP_MB", "256")))
+INGEST_SQLITE_CACHE_MB = max(2, int(os.getenv("INGEST_SQLITE_CACHE_MB", "64")))
+LANCE_WRITE_BATCH_ROWS = max(1, int(os.getenv("LANCE_WRITE_BATCH_ROWS", "65536")))
+LANCE_WRITE_CONCURRENCY = max(1, min(int(os.getenv("LANCE_WRITE_CONCURRENCY", "4")), 16))
+
 
 @dataclass
 class Document:
@@ -94,24 +144,86 @@ class Document:
 # Source readers
 # ---------------------------------------------------------------------------
 
+_RE_BR = re.compile(r"<br\s*/?>", re.I)
+_RE_CLOSE_TAGS = re.compile(r"</(p|div|li|tr|h\d|section|article)>", re.I)
+_RE_LI = re.compile(r"<li[^>]*>", re.I)
+_RE_ANY_TAG = re.compile(r"<[^>]+>", re.I)
+_RE_HEADER_NOISE = re.compile(
+    r"^\s*(supremo tribunal federal|superior tribunal de justiça|página \d+|p. \d+).*$",
+    re.I | re.M,
+)
+_RE_BLANK_RUNS = re.compile(r"\n{3,}")
+_BLOCK_TAGS = frozenset({"p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"})
+
+
+def _strip_html_regex(text: str) -> str:
+    text = _RE_BR.sub("\n", text)
+    text = _RE_CLOSE_TAGS.sub("\n", text)
+    text = _RE_LI.sub("- ", text)
+    return _RE_ANY_TAG.sub("", text)
+
+
+def _strip_html(text: str) -> str:
+    """Strip tags with lxml, keeping the <br>/<li>/block-break markers of the regex path."""
+    if lxml_html is None:
+        return _strip_html_regex(text)
+    try:
+        root = lxml_html.fragment_fromstring(text, create_parent="div")
+    except Exception:
+        return _strip_html_regex(text)
+    for el in root.iter():
+        tag = el.tag.lower() if isinstance(el.tag, str) else ""
+        if tag == "br":
+            el.tail = "\n" + (el.tail or "")
+        elif tag == "li":
+            el.text = "- " + (el.text or "")
+        if tag in _BLOCK_TAGS and el is not root:
+            el.tail = "\n" + (el.tail or "")
+    return root.text_content()
+
+
+def _json_dumps_text(payload) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(payload, ensure_ascii=False)
+
+
 def clean_legal_text(raw: str) -> str:
-    text = html.unescape((raw or "").replace("\r\n", "\n").replace("\r", "\n"))
-    text = re.sub(r"(?i)<br\s*/?>", "\n", text)
-    text = re.sub(r"(?i)</(p|div|li|tr|h\d|section|article)>", "\n", text)
-    text = re.sub(r"(?i)<li[^>]*>", "- ", text)
-    text = re.sub(r"(?i)<[^>]+>", "", text)
-    text = re.sub(
-        r"(?im)^\s*(supremo tribunal federal|superior tribunal de justiça|página \d+|p. \d+).*$",
-        "",
-        text,
-    )
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    # Campos vazios (relator, orgao, datas) sao a maioria nos leitores: nada de regex.
+    if not raw:
+        return ""
+    text = raw.replace("\r\n", "\n").replace("\r", "\n") if "\r" in raw else raw
+    text = html.unescape(text)
+    if "<" in text:
+        text = _strip_html(text)
+    text = _RE_HEADER_NOISE.sub("", text)
+    text = _RE_BLANK_RUNS.sub("\n\n", text)
     return text.strip()
 
+
+@functools.lru_cache(maxsize=4096)
+def clean_field(raw: str) -> str:
+    """clean_legal_text for low-cardinality short fields (relator, orgao, ramo), memoized."""
+    return clean_legal_text(raw)
+
+
+def open_db(path: Path | str) -> sqlite3.Connection:
+    """Open a source DB for reading with sqlite3.Row rows and read-tuned PRAGMAs."""
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute(f"PRAGMA mmap_size={INGEST_SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute(f"PRAGMA cache_size=-{INGEST_SQLITE_CACHE_MB * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
 def read_sumulas() -> List[Document]:
     db = DATA_DIR / "sumulas" / "sumulas.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     rows = conn.execute("SELECT * FROM sumulas").fetchall()
     conn.close()
 
@@ -133,18 +245,17 @@ def read_sumulas() -> List[Document]:
             texto_busca=texto[:8000],
             texto_integral=(texto + "\n\n" + jurisprudencia)[:30000],
             url=r["url"] or "",
-            metadata_extra=json.dumps({
+            metadata_extra=_json_dumps_text({
                 "status": r["status"],
                 "observacoes": r["observacoes"]
-            }, ensure_ascii=False),
+            }),
         ))
     return docs
 
 
 def read_stj_informativos() -> List[Document]:
     db = DATA_DIR / "stj_informativos" / "stj_informativos.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     rows = conn.execute("SELECT * FROM stj_informativos").fetchall()
     conn.close()
 
@@ -165,26 +276,25 @@ def read_stj_informativos() -> List[Document]:
             tribunal="STJ",
             tipo="informativo",
             processo=clean_legal_text(r["processo"] or ""),
-            relator=clean_legal_text(r["relator"] or ""),
-            ramo_direito=clean_legal_text(r["ramo_direito"] or ""),
+            relator=clean_field(r["relator"] or ""),
+            ramo_direito=clean_field(r["ramo_direito"] or ""),
             data_julgamento=r["data_julgamento"] or "",
-            orgao_julgador=clean_legal_text(r["orgao_julgador"] or ""),
+            orgao_julgador=clean_field(r["orgao_julgador"] or ""),
             texto_busca=texto_busca[:8000],
             texto_integral=texto_integral[:30000],
             url="",
-            metadata_extra=json.dumps({
+            metadata_extra=_json_dumps_text({
                 "informativo_numero": r["informativo_numero"],
                 "source_pdf": r["source_pdf"],
                 "tema": tema,
-            }, ensure_ascii=False),
+            }),
         ))
     return docs
 
 
 def read_stj_sumulas() -> List[Document]:
     db = DATA_DIR / "stj_informativos" / "stj_informativos.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     sumulas_rows = conn.execute("SELECT * FROM stj_sumulas ORDER BY sumula_numero DESC").fetchall()
     ramo_rows = conn.execute(
         """
@@ -195,6 +305,7 @@ def read_stj_sumulas() -> List[Document]:
     ).fetchall()
     conn.close()
 
+    no_ramos: dict[str, list[str]] = {"ramos": [], "assuntos": []}
     ramo_map: dict[int, dict[str, list[str]]] = {}
     for r in ramo_rows:
         numero = int(r["sumula_numero"])
@@ -210,10 +321,10 @@ def read_stj_sumulas() -> List[Document]:
     for r in sumulas_rows:
         numero = int(r["sumula_numero"])
         enunciado = clean_legal_text((r["enunciado"] or "").strip())
-        orgao = clean_legal_text((r["orgao_julgador"] or "").strip())
+        orgao = clean_field((r["orgao_julgador"] or "").strip())
         data_julgamento = clean_legal_text((r["data_julgamento"] or "").strip())
         data_publicacao = clean_legal_text((r["data_publicacao"] or "").strip())
-        ramo_info = ramo_map.get(numero, {"ramos": [], "assuntos": []})
+        ramo_info = ramo_map.get(numero, no_ramos)
         ramos = ramo_info["ramos"]
         assuntos = ramo_info["assuntos"]
 
@@ -252,7 +363,7 @@ def read_stj_sumulas() -> List[Document]:
                 texto_busca=texto_busca,
                 texto_integral=texto_integral,
                 url="",
-                metadata_extra=json.dumps(
+                metadata_extra=_json_dumps_text(
                     {
                         "sumula_numero": numero,
                         "data_publicacao": data_publicacao,
@@ -261,7 +372,6 @@ def read_stj_sumulas() -> List[Document]:
                         "ramos": ramos,
                         "assuntos": assuntos,
                     },
-                    ensure_ascii=False,
                 ),
             )
         )
@@ -270,8 +380,7 @@ def read_stj_sumulas() -> List[Document]:
 
 def read_stj_repetitivos() -> List[Document]:
     db = DATA_DIR / "stj_informativos" / "stj_informativos.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     rows = conn.execute("SELECT * FROM stj_temas_repetitivos ORDER BY tema_repetitivo, id").fetchall()
     conn.close()
 
@@ -284,11 +393,11 @@ def read_stj_repetitivos() -> List[Document]:
         ementa = clean_legal_text((r["ementa_resumo"] or "").strip())
         raw_contexto = clean_legal_text((r["raw_contexto"] or "").strip())
         processo_referencia = clean_legal_text((r["processo_referencia"] or "").strip())
-        relator = clean_legal_text((r["relator"] or "").strip())
-        orgao = clean_legal_text((r["orgao_julgador"] or "").strip())
+        relator = clean_field((r["relator"] or "").strip())
+        orgao = clean_field((r["orgao_julgador"] or "").strip())
         data_julgamento = clean_legal_text((r["data_julgamento"] or "").strip())
         data_publicacao = clean_legal_text((r["data_publicacao"] or "").strip())
-        ramo = clean_legal_text((r["ramo_direito"] or "").strip())
+        ramo = clean_field((r["ramo_direito"] or "").strip())
 
         processo = processo_referencia or tema_label
         texto_busca = (
@@ -321,7 +430,7 @@ def read_stj_repetitivos() -> List[Document]:
                 texto_busca=texto_busca,
                 texto_integral=texto_integral,
                 url="",
-                metadata_extra=json.dumps(
+                metadata_extra=_json_dumps_text(
                     {
                         "tema_repetitivo": tema,
                         "titulo": titulo,
@@ -330,7 +439,6 @@ def read_stj_repetitivos() -> List[Document]:
                         "source_pdf": r["source_pdf"],
                         "source_page": r["source_page"],
                     },
-                    ensure_ascii=False,
                 ),
             )
         )
@@ -339,8 +447,7 @@ def read_stj_repetitivos() -> List[Document]:
 
 def read_sumulas_vinculantes() -> List[Document]:
     db = DATA_DIR / "sumulas_vinculantes" / "sumulas_vinculantes.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     rows = conn.execute("SELECT * FROM sumulas_vinculantes").fetchall()
 
 
@@ -362,10 +469,10 @@ def read_sumulas_vinculantes() -> List[Document]:
             texto_busca=texto_busca,
             texto_integral=ementa[:30000],
             url=r["inteiro_teor_url"] or "",
-            metadata_extra=json.dumps({
+            metadata_extra=_json_dumps_text({
                 "legislacao_citada": r["legislacao_citada"],
                 "indexacao": r["indexacao"]
-            }, ensure_ascii=False),
+            }),
         ))
 
     # Also extract the SV extras (Acórdãos and Monocráticas)
@@ -386,12 +493,12 @@ def read_sumulas_vinculantes() -> List[Document]:
                 tribunal="STF",
                 tipo=tipo,
                 processo=titulo,
-                relator=clean_legal_text(r["relator"] or ""),
+                relator=clean_field(r["relator"] or ""),
                 ramo_direito="Constitucional",
                 data_julgamento=r["julgamento_data"] or "",
                 orgao_julgador=(
                     "Decisão Monocrática" if tipo == "monocratica_sv"
-                    else clean_legal_text(r["orgao_julgador"] or "")
+                    else clean_field(r["orgao_julgador"] or "")
                 ),
                 texto_busca=texto_busca,
                 texto_integral=texto_integral[:30000],
@@ -405,19 +512,41 @@ def read_sumulas_vinculantes() -> List[Document]:
     return docs
 
 
+_STF_INFORMATIVO_COLUMNS = (
+    "id",
+    "titulo",
+    "processo_codigo",
+    "resumo",
+    "ementa",
+    "tese",
+    "relator",
+    "julgamento_data",
+    "orgao_julgador",
+    "inteiro_teor_url",
+    "informativo_numero",
+    "informativo_titulo",
+)
+
+
+def _select_columns(conn: sqlite3.Connection, table: str, columns: Iterable[str]) -> str:
+    """SELECT with an explicit column list; columns missing from the table come back as NULL."""
+    present = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    exprs = [col if col in present else f"NULL AS {col}" for col in columns]
+    return f"SELECT {', '.join(exprs)} FROM {table}"
+
+
 def read_stf_informativos() -> List[Document]:
     db = DATA_DIR / "informativos" / "informativos.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM informativos").fetchall()
+    conn = open_db(db)
+    query = _select_columns(conn, "informativos", _STF_INFORMATIVO_COLUMNS)
+    rows = conn.execute(query).fetchall()
     conn.close()
 
     docs = []
-    for row in rows:
-        r = dict(row)
-        resumo = clean_legal_text(r.get("resumo") or "")
-        ementa = clean_legal_text(r.get("ementa") or "")
-        tese = clean_legal_text(r.get("tese") or "")
+    for r in rows:
+        resumo = clean_legal_text(r["resumo"] or "")
+        ementa = clean_legal_text(r["ementa"] or "")
+        tese = clean_legal_text(r["tese"] or "")
         texto_busca = f"{tese}\n{ementa}\n{resumo}"[:8000]
         texto_integral = f"{ementa}\n\n{resumo}"[:30000]
 
@@ -425,106 +554,125 @@ def read_stf_informativos() -> List[Document]:
             doc_id=f"stf-info-{r['id']}",
             tribunal="STF",
             tipo="informativo",
-            processo=clean_legal_text(r.get("processo_codigo") or r["titulo"] or ""),
-            relator=clean_legal_text(r["relator"] or ""),
+            processo=clean_legal_text(r["processo_codigo"] or r["titulo"] or ""),
+            relator=clean_field(r["relator"] or ""),
             ramo_direito="",
             data_julgamento=r["julgamento_data"] or "",
-            orgao_julgador=clean_legal_text(r["orgao_julgador"] or ""),
+            orgao_julgador=clean_field(r["orgao_julgador"] or ""),
             texto_busca=texto_busca,
             texto_integral=texto_integral,
             url=r["inteiro_teor_url"] or "",
-            metadata_extra=json.dumps({
+            metadata_extra=_json_dumps_text({
                 "informativo_numero": r["informativo_numero"],
                 "informativo_titulo": r["informativo_titulo"],
-            }, ensure_ascii=False),
+            }),
         ))
     return docs
 
 
-def read_acordaos(limit: Optional[int] = None) -> List[Document]:
+def _iter_row_docs(db: Path, query: str, transform: Callable[[dict], Document]) -> Iterator[Document]:
+    """Stream rows with fetchmany and yield Documents; large tables go through a process pool."""
+    conn = open_db(db)
+    pool: Optional[ProcessPoolExecutor] = None
+    try:
+        cursor = conn.execute(query)
+        cursor.arraysize = INGEST_FETCH_SIZE
+        seen = 0
+        while True:
+            # sqlite3.Row nao e picklable: converte para dict antes de enviar aos workers.
+            rows = [dict(r) for r in cursor.fetchmany()]
+            if not rows:
+                break
+            seen += len(rows)
+            # clean_legal_text e CPU-bound: o GIL impede ganho com threads aqui.
+            if pool is None and INGEST_WORKERS > 1 and seen >= INGEST_PARALLEL_MIN_ROWS:
+                pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS)
+            if pool is None:
+                yield from (transform(r) for r in rows)
+            else:
+                yield from pool.map(transform, rows, chunksize=max(1, min(512, len(rows) // INGEST_WORKERS)))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        conn.close()
+
+
+def _row_to_acordao_doc(r: dict) -> Document:
+    ementa = clean_legal_text(r["ementa"] or "")
+    tese = clean_legal_text(r["tese"] or "")
+    indexacao = clean_legal_text(r["indexacao"] or "")
+    texto_busca = f"{tese}\n{ementa}\n{indexacao}"[:8000]
+
+    classe = r["classe_sigla"] or ""
+    numero = r["processo_numero"] or ""
+    processo = f"{classe} {numero}".strip()
+
+    return Document(
+        doc_id=f"stf-ac-{r['id']}",
+        tribunal="STF",
+        tipo="acordao",
+        processo=processo,
+        relator=clean_field(r["relator"] or ""),
+        ramo_direito=clean_field(r["ramo_direito"] or ""),
+        data_julgamento=r["julgamento_data"] or "",
+        orgao_julgador=clean_field(r["orgao_julgador"] or ""),
+        texto_busca=texto_busca,
+        texto_integral=ementa[:30000],
+        url=r["inteiro_teor_url"] or "",
+        metadata_extra=_json_dumps_text({
+            "tese_tema": r["tese_tema"],
+            "legislacao_citada": r["legislacao_citada"],
+            "ai_tags": r["ai_tags"],
+            "is_repercussao_geral": r["is_repercussao_geral"],
+        }),
+    )
+
+
+def read_acordaos(limit: Optional[int] = None) -> Iterator[Document]:
     db = DATA_DIR / "acordaos" / "acordaos.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
     query = "SELECT * FROM acordaos ORDER BY julgamento_data DESC"
     if limit:
         query += f" LIMIT {limit}"
-    rows = conn.execute(query).fetchall()
-    conn.close()
-
-    docs = []
-    for r in rows:
-        ementa = clean_legal_text(r["ementa"] or "")
-        tese = clean_legal_text(r["tese"] or "")
-        indexacao = clean_legal_text(r["indexacao"] or "")
-        texto_busca = f"{tese}\n{ementa}\n{indexacao}"[:8000]
-
-        classe = r["classe_sigla"] or ""
-        numero = r["processo_numero"] or ""
-        processo = f"{classe} {numero}".strip()
-
-        docs.append(Document(
-            doc_id=f"stf-ac-{r['id']}",
-            tribunal="STF",
-            tipo="acordao",
-            processo=processo,
-            relator=clean_legal_text(r["relator"] or ""),
-            ramo_direito=clean_legal_text(r["ramo_direito"] or ""),
-            data_julgamento=r["julgamento_data"] or "",
-            orgao_julgador=clean_legal_text(r["orgao_julgador"] or ""),
-            texto_busca=texto_busca,
-            texto_integral=ementa[:30000],
-            url=r["inteiro_teor_url"] or "",
-            metadata_extra=json.dumps({
-                "tese_tema": r["tese_tema"],
-                "legislacao_citada": r["legislacao_citada"],
-                "ai_tags": r["ai_tags"],
-                "is_repercussao_geral": r["is_repercussao_geral"],
-            }, ensure_ascii=False),
-        ))
-    return docs
+    return _iter_row_docs(db, query, _row_to_acordao_doc)
+
+
+def _row_to_monocratica_doc(r: dict) -> Document:
+    decisao = clean_legal_text(r["decisao"] or "")
+    titulo = clean_legal_text(r["titulo"] or "")
+
+    classe = r["classe_sigla"] or ""
+    numero = r["processo_numero"] or ""
+    processo = f"{classe} {numero}".strip()
+
+    texto_busca = f"{titulo}\n{decisao}"[:8000]
+
+    return Document(
+        doc_id=f"stf-mon-{r['id']}",
+        tribunal="STF",
+        tipo="monocratica",
+        processo=processo,
+        relator=clean_field(r["relator"] or ""),
+        ramo_direito=clean_field(r["ramo_direito"] or ""),
+        data_julgamento=r["julgamento_data"] or "",
+        orgao_julgador="Decisão Monocrática",
+        texto_busca=texto_busca,
+        texto_integral=decisao[:30000],
+        url=r["inteiro_teor_url"] or "",
+        metadata_extra=_json_dumps_text({
+            "titulo": titulo,
+            "ai_tags": r["ai_tags"],
+        }),
+    )
 
 
-def read_monocraticas(limit: Optional[int] = None, offset: int = 0) -> List[Document]:
+def read_monocraticas(limit: Optional[int] = None, offset: int = 0) -> Iterator[Document]:
     db = DATA_DIR / "monocraticas" / "monocraticas.db"
-    conn = sqlite3.connect(db)
-    conn.row_factory = sqlite3.Row
     query = "SELECT * FROM monocraticas WHERE julgamento_data >= '2015-01-01' ORDER BY julgamento_data DESC, id DESC"
     if limit is not None:
         query += f" LIMIT {int(limit)}"
     if offset:
         query += f" OFFSET {int(offset)}"
-    rows = conn.execute(query).fetchall()
-    conn.close()
-
-    docs = []
-    for r in rows:
-        decisao = clean_legal_text(r["decisao"] or "")
-        titulo = clean_legal_text(r["titulo"] or "")
-        
-        classe = r["classe_sigla"] or ""
-        numero = r["processo_numero"] or ""
-        processo = f"{classe} {numero}".strip()
-        
-        texto_busca = f"{titulo}\n{decisao}"[:8000]
-
-        docs.append(Document(
-            doc_id=f"stf-mon-{r['id']}",
-            tribunal="STF",
-            tipo="monocratica",
-            processo=processo,
-            relator=clean_legal_text(r["relator"] or ""),
-            ramo_direito=clean_legal_text(r["ramo_direito"] or ""),
-            data_julgamento=r["julgamento_data"] or "",
-            orgao_julgador="Decisão Monocrática",
-            texto_busca=texto_busca,
-            texto_integral=decisao[:30000],
-            url=r["inteiro_teor_url"] or "",
-            metadata_extra=json.dumps({
-                "titulo": titulo,
-                "ai_tags": r["ai_tags"],
-            }, ensure_ascii=False),
-        ))
-    return docs
+    return _iter_row_docs(db, query, _row_to_monocratica_doc)
 
 # ---------------------------------------------------------------------------
 # Embedding
@@ -544,57 +692,352 @@ def embed_batch(texts: List[str]) -> List[List[float]]:
     return [e.values for e in result.embeddings]
 
 
-def embed_documents(docs: List[Document]) -> List[dict]:
-    """Embed all documents and return list of dicts ready for LanceDB."""
-    records = []
-    total = len(docs)
-
-    for i in range(0, total, EMBED_BATCH_SIZE):
-        batch = docs[i:i + EMBED_BATCH_SIZE]
-        texts = [d.texto_busca for d in batch]
-
-        try:
-            vectors = embed_batch(texts)
-        except Exception as e:
-            print(f"  ⚠️ Embedding error at batch {i}: {e}")
+_RATE_LIMIT_MARKERS = ("429", "resource_exhausted", "rate limit", "too many requests", "quota")
+_RE_RETRY_AFTER = re.compile(r"retry(?:[ _-]?delay|[ _-]?after)?\W{0,4}(?:in\s+)?(\d+(?:\.\d+)?)\s*s", re.I)
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+    text = str(exc).lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+def _retry_after_seconds(exc: Exception, default: float = 30.0) -> float:
+    """Server-suggested wait from a Gemini 429 ("Please retry in 41.5s" / retryDelay: '41s')."""
+    match = _RE_RETRY_AFTER.search(str(exc))
+    return float(match.group(1)) if match else default
+
+
+class TokenBucket:
+    """Shared RPM/TPM limiter for the embed workers; halves its rate on 429 and ramps back when quiet."""
+
+    RAMP_AFTER_S = 60.0
+
+    def __init__(self, rpm: int = 0, tpm: int = 0) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.scale = 1.0
+        self._lock = threading.Lock()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_penalty = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm * self.scale, self._requests + elapsed * self.rpm * self.scale / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm * self.scale, self._tokens + elapsed * self.tpm * self.scale / 60.0)
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until one request of ~tokens fits in the bucket; free when the API is healthy."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.scale < 1.0 and now - self._last_penalty >= self.RAMP_AFTER_S:
+                    self.scale = min(1.0, self.scale * 1.25)
+                    self._last_penalty = now
+                # Um lote maior que a capacidade passa quando o balde esta cheio.
+                need = min(float(tokens), self.tpm * self.scale)
+                wait = self._paused_until - now
+                if self.rpm and self._requests < 1.0:
+                    wait = max(wait, (1.0 - self._requests) * 60.0 / (self.rpm * self.scale))
+                if self.tpm and self._tokens < need:
+                    wait = max(wait, (need - self._tokens) * 60.0 / (self.tpm * self.scale))
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1.0
+                    if self.tpm:
+                        self._tokens -= need
+                    return
+            time.sleep(min(wait, 5.0))
+
+    def penalize(self, retry_after: float) -> None:
+        """Pause every worker for retry_after seconds and halve the sustained rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self.scale = max(0.1, self.scale * 0.5)
+            self._last_penalty = now
+            self._requests = min(self._requests, 0.0)
+
+
+_embed_limiter = TokenBucket(EMBED_RPM, EMBED_TPM)
+
+
+def _embed_batch_with_retry(start: int, texts: List[str], jitter: bool = False) -> Optional[List[List[float]]]:
+    """Embed one batch through the shared limiter, retrying once; returns None when the batch is skipped."""
+    if jitter:
+        # Espalha a primeira onda de requisicoes para nao estourar 429 no arranque.
+        time.sleep(random.uniform(0, 0.2))
+    tokens = sum(len(text) for text in texts) // 4
+    _embed_limiter.acquire(tokens)
+    try:
+        return embed_batch(texts)
+    except Exception as e:
+        print(f"  ⚠️ Embedding error at batch {start}: {e}")
+        if _is_rate_limit_error(e):
+            wait = _retry_after_seconds(e)
+            print(f"  ⏳ Rate limited; pausing embed workers {wait:.0f}s and retrying...")
+            _embed_limiter.penalize(wait)
+        else:
             print(f"  ⏳ Waiting 30s and retrying...")
             time.sleep(30)
-            try:
-                vectors = embed_batch(texts)
-            except Exception as e2:
-                print(f"  ❌ Retry failed: {e2}. Skipping batch.")
-                continue
+    _embed_limiter.acquire(tokens)
+    try:
+        return embed_batch(texts)
+    except Exception as e2:
+        print(f"  ❌ Retry failed: {e2}. Skipping batch.")
+        if _is_rate_limit_error(e2):
+            _embed_limiter.penalize(_retry_after_seconds(e2))
+        return None
+
 
-        for doc, vec in zip(batch, vectors):
-            records.append({
-                "vector": vec,
-                "doc_id": doc.doc_id,
-                "tribunal": doc.tribunal,
-                "tipo": doc.tipo,
-                "processo": doc.processo,
-                "relator": doc.relator,
-                "ramo_direito": doc.ramo_direito,
-                "data_julgamento": doc.data_julgamento,
-                "orgao_julgador": doc.orgao_julgador,
-                "texto_busca": doc.texto_busca,
-                "texto_integral": doc.texto_integral,
-                "url": doc.url,
-                "metadata_extra": doc.metadata_extra,
-            })
-
-        progress = min(i + EMBED_BATCH_SIZE, total)
-        print(f"  📊 Embedded {progress}/{total} ({progress * 100 // total}%)")
-        time.sleep(EMBED_DELAY)
+_embed_cache_lock = threading.Lock()
+_embed_cache_conn: Optional[sqlite3.Connection] = None
+_embed_cache_conn_path: Optional[Path] = None
 
+
+def _embed_cache() -> Optional[sqlite3.Connection]:
+    global _embed_cache_conn, _embed_cache_conn_path
+    if EMBED_CACHE_PATH is None:
+        return None
+    if _embed_cache_conn is None or _embed_cache_conn_path != EMBED_CACHE_PATH:
+        try:
+            EMBED_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(EMBED_CACHE_PATH), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS v(h BLOB PRIMARY KEY, v BLOB)")
+        except sqlite3.Error as e:
+            print(f"  ⚠️ Embedding cache unavailable: {e}")
+            return None
+        _embed_cache_conn, _embed_cache_conn_path = conn, EMBED_CACHE_PATH
+    return _embed_cache_conn
+
+
+def _embed_cache_key(text: str) -> bytes:
+    # Modelo e dimensao entram na chave: trocar qualquer um invalida o cache.
+    payload = f"{EMBED_MODEL}|{EMBED_DIM}|{text}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _embed_cache_get(keys: List[bytes]) -> dict[bytes, List[float]]:
+    if not keys:
+        return {}
+    with _embed_cache_lock:
+        conn = _embed_cache()
+        if conn is None:
+            return {}
+        rows = conn.execute(
+            f"SELECT h, v FROM v WHERE h IN ({','.join('?' * len(keys))})", keys
+        ).fetchall()
+    hits: dict[bytes, List[float]] = {}
+    for key, blob in rows:
+        vec = array("f")
+        vec.frombytes(blob)
+        hits[bytes(key)] = vec.tolist()
+    return hits
+
+
+def _embed_cache_put(items: List[tuple[bytes, List[float]]]) -> None:
+    if not items:
+        return
+    with _embed_cache_lock:
+        conn = _embed_cache()
+        if conn is None:
+            return
+        conn.executemany(
+            "INSERT OR REPLACE INTO v(h, v) VALUES (?, ?)",
+            [(key, array("f", vec).tobytes()) for key, vec in items],
+        )
+        conn.commit()
+
+
+def _embed_unique_texts(start: int, texts: List[str], jitter: bool = False) -> Optional[List[List[float]]]:
+    """Embed only the distinct, uncached texts of a batch and scatter the vectors back to every owner."""
+    slots: dict[bytes, int] = {}
+    unique_keys: List[bytes] = []
+    unique_texts: List[str] = []
+    plan: List[int] = []
+    for text in texts:
+        key = _embed_cache_key(text)
+        slot = slots.get(key)
+        if slot is None:
+            slot = slots[key] = len(unique_texts)
+            unique_keys.append(key)
+            unique_texts.append(text)
+        plan.append(slot)
+
+    found = _embed_cache_get(unique_keys)
+    resolved: List[Optional[List[float]]] = [found.get(key) for key in unique_keys]
+    misses = [i for i, vec in enumerate(resolved) if vec is None]
+    if misses:
+        vectors = _embed_batch_with_retry(start, [unique_texts[i] for i in misses], jitter)
+        if vectors is None:
+            return None
+        for i, vec in zip(misses, vectors):
+            resolved[i] = vec
+        _embed_cache_put([(unique_keys[i], vec) for i, vec in zip(misses, vectors)])
+    return [resolved[slot] for slot in plan]
+
+
+def _document_record(doc: Document, vec: List[float]) -> dict:
+    return {
+        "vector": vec,
+        "doc_id": doc.doc_id,
+        "tribunal": doc.tribunal,
+        "tipo": doc.tipo,
+        "processo": doc.processo,
+        "relator": doc.relator,
+        "ramo_direito": doc.ramo_direito,
+        "data_julgamento": doc.data_julgamento,
+        "orgao_julgador": doc.orgao_julgador,
+        "texto_busca": doc.texto_busca,
+        "texto_integral": doc.texto_integral,
+        "url": doc.url,
+        "metadata_extra": doc.metadata_extra,
+    }
+
+
+def pack_batches(
+    docs: Iterable[Document],
+    max_chars: Optional[int] = None,
+    max_items: Optional[int] = None,
+) -> Iterator[List[Document]]:
+    """Greedily pack docs into batches bounded by total texto_busca chars and item count."""
+    char_budget = EMBED_BATCH_MAX_CHARS if max_chars is None else max_chars
+    item_budget = EMBED_BATCH_SIZE if max_items is None else max_items
+    current: List[Document] = []
+    current_chars = 0
+    for doc in docs:
+        size = len(doc.texto_busca or "")
+        if current and (len(current) >= item_budget or current_chars + size > char_budget):
+            yield current
+            current = []
+            current_chars = 0
+        # Um documento maior que o orcamento vai sozinho no lote.
+        current.append(doc)
+        current_chars += size
+    if current:
+        yield current
+
+
+def _iter_embedded_batches(docs: Iterable[Document]) -> Iterator[tuple[List[Document], List[List[float]]]]:
+    """Embed packed batches concurrently, yielding (batch, vectors) in submission order."""
+    total = len(docs) if isinstance(docs, Sized) else None
+    embedded = 0
+    blank = 0
+
+    def searchable(source: Iterable[Document]) -> Iterator[Document]:
+        nonlocal blank
+        # texto_busca vazio ou quase vazio nao tem o que buscar: nao gasta cota de embedding.
+        for doc in source:
+            if doc.texto_busca and len(doc.texto_busca.strip()) >= EMBED_MIN_CHARS:
+                yield doc
+            else:
+                blank += 1
+
+    def report(batch: List[Document]) -> None:
+        nonlocal embedded
+        embedded += len(batch)
+        if total:
+            print(f"  📊 Embedded {embedded}/{total} ({embedded * 100 // total}%)")
+        else:
+            print(f"  📊 Embedded {embedded}")
+
+    # Janela de lotes em voo; os documentos chegam sob demanda (leitores em streaming) e os
+    # resultados sao entregues na ordem de envio.
+    workers = EMBED_CONCURRENCY
+    pending: deque[tuple[List[Document], Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+        start = 0
+        submitted = 0
+        batches = pack_batches(searchable(docs))
+        while True:
+            for batch in batches:
+                future = executor.submit(
+                    _embed_unique_texts,
+                    start,
+                    [d.texto_busca for d in batch],
+                    submitted < workers,
+                )
+                pending.append((batch, future))
+                start += len(batch)
+                submitted += 1
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            batch, future = pending.popleft()
+            vectors = future.result()
+            report(batch)
+            if vectors is not None:
+                yield batch, vectors
+    if blank:
+        print(f"  ⚠️ Skipped {blank} documents with texto_busca under {EMBED_MIN_CHARS} chars")
+
+
+def _normalized_vectors(vectors: List[List[float]]):
+    """Batch of embeddings as a float32 matrix (numpy) or lists, L2-normalized if EMBED_L2_NORMALIZE."""
+    # Gemini so entrega vetores unitarios na dimensao cheia; truncados em 768 nao sao.
+    if np is not None:
+        arr = np.asarray(vectors, dtype=np.float32)
+        if EMBED_L2_NORMALIZE:
+            norms = np.linalg.norm(arr, axis=1, keepdims=True)
+            np.divide(arr, norms, out=arr, where=norms > 0)
+        return arr
+    if not EMBED_L2_NORMALIZE:
+        return [list(vec) for vec in vectors]
+    normalized = []
+    for vec in vectors:
+        norm = sum(v * v for v in vec) ** 0.5
+        normalized.append([v / norm for v in vec] if norm > 0 else list(vec))
+    return normalized
+
+
+def embed_documents(docs: Iterable[Document]) -> List[dict]:
+    """Embed all documents and return list of dicts ready for LanceDB."""
+    records: List[dict] = []
+    for batch, vectors in _iter_embedded_batches(docs):
+        normalized = _normalized_vectors(vectors)
+        rows = normalized.tolist() if np is not None else normalized
+        for doc, vec in zip(batch, rows):
+            records.append(_document_record(doc, vec))
     return records
 
 
+def _record_batch(batch: List[Document], vectors: List[List[float]]) -> pa.RecordBatch:
+    normalized = _normalized_vectors(vectors)
+    if np is not None:
+        # Matriz contigua -> um unico buffer Arrow, sem iterar floats Python.
+        flat = pa.array(normalized.ravel()).cast(LANCE_VECTOR_TYPE)
+    else:
+        flat = pa.array(list(chain.from_iterable(normalized)), type=LANCE_VECTOR_TYPE)
+    columns = [pa.FixedSizeListArray.from_arrays(flat, EMBED_DIM)]
+    for field in LANCE_SCHEMA:
+        if field.name == "vector":
+            continue
+        columns.append(pa.array([getattr(doc, field.name) for doc in batch], type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=LANCE_SCHEMA)
+
+
+def embed_record_batches(docs: Iterable[Document]) -> Iterator[pa.RecordBatch]:
+    """Embed docs and yield one Arrow RecordBatch (LANCE_SCHEMA) per embed batch."""
+    for batch, vectors in _iter_embedded_batches(docs):
+        yield _record_batch(batch[: len(vectors)], vectors)
+
+
 # ---------------------------------------------------------------------------
 # LanceDB storage
 # ---------------------------------------------------------------------------
 
+# Tipo do vetor (LANCE_VECTOR_DTYPE) compartilhado com backend/juris_update.py.
+
 LANCE_SCHEMA = pa.schema([
-    pa.field("vector", pa.list_(pa.float32(), EMBED_DIM)),
+    pa.field("vector", pa.list_(LANCE_VECTOR_TYPE, EMBED_DIM)),
     pa.field("doc_id", pa.utf8()),
     pa.field("tribunal", pa.utf8()),
     pa.field("tipo", pa.utf8()),
@@ -619,8 +1062,114 @@ def table_name_for_source(source: str) -> str:
     return TABLE_NAME
 
 
-def store_in_lancedb(records: List[dict], mode: str = "append", table_name: str = TABLE_NAME) -> int:
-    """Store embedded records in LanceDB."""
+def _coalesce_record_batches(
+    batches: Iterable[pa.RecordBatch], target_rows: Optional[int] = None
+) -> Iterator[pa.RecordBatch]:
+    """Regroup small RecordBatches into batches of ~target_rows rows."""
+    target_rows = target_rows or LANCE_WRITE_BATCH_ROWS
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+
+    def flush() -> pa.RecordBatch:
+        # combine_chunks junta as colunas num unico buffer contiguo.
+        merged = pa.Table.from_batches(pending, schema=LANCE_SCHEMA).combine_chunks()
+        pending.clear()
+        return merged.to_batches()[0]
+
+    for record_batch in batches:
+        if not record_batch.num_rows:
+            continue
+        pending.append(record_batch)
+        pending_rows += record_batch.num_rows
+        if pending_rows >= target_rows:
+            yield flush()
+            pending_rows = 0
+    if pending:
+        yield flush()
+
+
+def _add_batches_concurrently(tbl, batches: Iterable[pa.RecordBatch]) -> None:
+    """Append RecordBatches with up to LANCE_WRITE_CONCURRENCY concurrent tbl.add calls."""
+    if LANCE_WRITE_CONCURRENCY <= 1:
+        for record_batch in batches:
+            tbl.add(pa.Table.from_batches([record_batch]))
+        return
+
+    # Appends comutam no Lance; a janela limita os lotes de ~64k linhas em memoria.
+    window: deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=LANCE_WRITE_CONCURRENCY) as pool:
+        for record_batch in batches:
+            if len(window) >= LANCE_WRITE_CONCURRENCY:
+                window.popleft().result()
+            window.append(pool.submit(tbl.add, pa.Table.from_batches([record_batch])))
+        while window:
+            window.popleft().result()
+
+
+def _has_index(tbl, column: str, index_type: str) -> bool:
+    try:
+        return any(
+            str(idx.index_type).upper() == index_type and column in idx.columns
+            for idx in tbl.list_indices()
+        )
+    except Exception:
+        return False
+
+
+def _has_fts_index(tbl, column: str = "texto_busca") -> bool:
+    return _has_index(tbl, column, "FTS")
+
+
+def ensure_doc_id_index(tbl) -> None:
+    """BTREE on doc_id: merge_insert("doc_id") and doc_id IN (...) lookups use it instead of a scan."""
+    if _has_index(tbl, "doc_id", "BTREE"):
+        return
+    try:
+        tbl.create_scalar_index("doc_id", replace=True)
+        print("  🔑 Scalar index created on 'doc_id'")
+    except Exception as e:
+        print(f"  ⚠️ doc_id index creation: {e}")
+
+
+def refresh_fts_index(tbl, rebuild: bool = False) -> None:
+    """Keep the texto_busca FTS index current: full build on first load, incremental otherwise."""
+    if not rebuild and _has_fts_index(tbl):
+        # optimize() indexa so os fragmentos novos/atualizados, sem refazer o indice inteiro.
+        try:
+            tbl.optimize()
+            print("  🔍 FTS index on 'texto_busca' updated incrementally")
+            return
+        except Exception as e:
+            print(f"  ⚠️ FTS incremental update failed ({e}); rebuilding")
+    try:
+        tbl.create_fts_index("texto_busca", use_tantivy=False, replace=True)
+        print("  🔍 Native Full-text search index created on 'texto_busca'")
+    except Exception as e:
+        print(f"  ⚠️ FTS index creation: {e}")
+
+
+def store_in_lancedb(
+    records: List[dict] | Iterable[pa.RecordBatch],
+    mode: str = "append",
+    table_name: str = TABLE_NAME,
+) -> int:
+    """Store embedded records (dicts or LANCE_SCHEMA RecordBatches) in LanceDB."""
+    written = 0
+    batches: Optional[Iterator[pa.RecordBatch]] = None
+    if isinstance(records, list):
+        data = records
+        written = len(records)
+    else:
+        def counted(batches: Iterable[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+            nonlocal written
+            for record_batch in batches:
+                written += record_batch.num_rows
+                yield record_batch
+
+        # O LanceDB consome o reader lote a lote, sem a camada de dicts.
+        batches = counted(_coalesce_record_batches(records))
+        data = pa.RecordBatchReader.from_batches(LANCE_SCHEMA, batches)
+
     LANCE_DIR.mkdir(parents=True, exist_ok=True)
     db = lancedb.connect(str(LANCE_DIR))
 
@@ -631,34 +1180,36 @@ def store_in_lancedb(records: List[dict], mode: str = "append", table_name: str
     except Exception:
         pass
 
-    if mode == "overwrite" or not table_exists:
-        tbl = db.create_table(table_name, data=records, schema=LANCE_SCHEMA, mode="overwrite")
-        print(f"  ✅ Created table '{table_name}' with {len(records)} records")
+    if (mode == "overwrite" or not table_exists) and batches is not None:
+        # Tabela criada com o schema completo; os lotes entram em paralelo.
+        tbl = db.create_table(table_name, schema=LANCE_SCHEMA, mode="overwrite")
+        _add_batches_concurrently(tbl, batches)
+        print(f"  ✅ Created table '{table_name}' with {written} records")
+    elif mode == "overwrite" or not table_exists:
+        tbl = db.create_table(table_name, data=data, schema=LANCE_SCHEMA, mode="overwrite")
+        print(f"  ✅ Created table '{table_name}' with {written} records")
     else:
         tbl = db.open_table(table_name)
         before = tbl.count_rows()
         # True upsert: update existing doc_id and insert new ones.
+        # Serial: merge_inserts concorrentes reescrevem os mesmos fragmentos e conflitam.
         (
             tbl.merge_insert("doc_id")
             .when_matched_update_all()
             .when_not_matched_insert_all()
-            .execute(records)
+            .execute(data)
         )
         after = tbl.count_rows()
         inserted = after - before
-        updated = len(records) - inserted
+        updated = written - inserted
         print(
             f"  ✅ Upsert completed: {inserted} new, {updated} updated existing "
             f"(total: {after})"
         )
 
-    # Create FTS index for hybrid search
-    try:
-        tbl.create_fts_index("texto_busca", use_tantivy=False, replace=True)
-        print("  🔍 Native Full-text search index created on 'texto_busca'")
-    except Exception as e:
-        print(f"  ⚠️ FTS index creation: {e}")
-
+    # optimize() em refresh_fts_index tambem atualiza o indice de doc_id.
+    ensure_doc_id_index(tbl)
+    refresh_fts_index(tbl, rebuild=mode == "overwrite" or not table_exists)
     return tbl.count_rows()
 
 
@@ -674,8 +1225,7 @@ def read_tjsp_revistas() -> List[Document]:
         print(f"   Run: python scrapers/tjsp_revistas.py --all")
         return []
 
-    conn = sqlite3.connect(str(db))
-    conn.row_factory = sqlite3.Row
+    conn = open_db(db)
     rows = conn.execute("SELECT * FROM decisoes").fetchall()
     conn.close()
 
@@ -713,7 +1263,7 @@ def read_tjsp_revistas() -> List[Document]:
             texto_busca=texto_busca[:8000],
             texto_integral=texto_integral[:30000],
             url=url,
-            metadata_extra=json.dumps({
+            metadata_extra=_json_dumps_text({
                 "volume": volume,
                 "periodo": periodo,
                 "tipo_recurso": r["tipo_recurso"] or "",
@@ -721,7 +1271,7 @@ def read_tjsp_revistas() -> List[Document]:
                 "legislacao_citada": r["legislacao_citada"] or "",
                 "jurisprudencia_citada": r["jurisprudencia_citada"] or "",
                 "source": "tjsp_revista_jurisprudencia",
-            }, ensure_ascii=False),
+            }),
         ))
     return docs
 
@@ -768,19 +1318,29 @@ def run_pipeline(
         else:
             docs = reader()
 
-        print(f"   Loaded {len(docs)} documents")
-
-        if not docs:
-            print(f"   ⚠️ No documents found. Skipping.")
-            continue
+        if isinstance(docs, list):
+            print(f"   Loaded {len(docs)} documents")
+            if not docs:
+                print(f"   ⚠️ No documents found. Skipping.")
+                continue
+        else:
+            print(f"   Streaming documents from SQLite")
 
         print(f"🔄 Generating embeddings...")
-        records = embed_documents(docs)
+        record_batches = embed_record_batches(docs)
+        first_batch = next(record_batches, None)
+        if first_batch is None:
+            print(f"   ⚠️ No documents embedded. Skipping.")
+            continue
 
         print(f"💾 Storing in LanceDB...")
         table_name = table_name_for_source(source)
         current_mode = mode if table_name not in initialized_tables else "append"
-        total = store_in_lancedb(records, mode=current_mode, table_name=table_name)
+        total = store_in_lancedb(
+            chain([first_batch], record_batches),
+            mode=current_mode,
+            table_name=table_name,
+        )
         initialized_tables.add(table_name)
 
         print(f"   Total records in DB: {total}")
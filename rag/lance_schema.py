@@ -0,0 +1,26 @@
+"""
+Shared LanceDB vector settings for every writer of the `jurisprudencia` table.
+
+rag/ingest.py (full ingest) and backend/juris_update.py (incremental update)
+both append to the same table, so the vector storage type is defined once
+here. This module has no side effects on import (no API key, no client).
+"""
+
+from __future__ import annotations
+
+import os
+
+import pyarrow as pa
+
+# float16 corta pela metade o espaco e a banda de leitura dos vetores sem perda de recall
+# relevante; LANCE_VECTOR_DTYPE=float32 restaura o formato antigo.
+LANCE_VECTOR_TYPE = (
+    pa.float32() if os.getenv("LANCE_VECTOR_DTYPE", "float16").strip().lower() == "float32" else pa.float16()
+)
+
+# Normalizacao L2 dos vetores Gemini (truncados em 768 dims eles nao vem unitarios).
+# Opt-in: a busca usa a metrica L2 padrao, e vetores normalizados e nao normalizados na
+# mesma tabela ficam em escalas diferentes. Ligue EMBED_L2_NORMALIZE=1 somente junto de um
+# re-ingest completo (py rag/ingest.py --source all) e mantenha-o ligado dali em diante,
+# para que juris_update grave as novas linhas na mesma escala.
+EMBED_L2_NORMALIZE = os.getenv("EMBED_L2_NORMALIZE", "0").strip() == "1"
@@ -13,6 +13,9 @@ Flow:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
+import heapq
 import html
 import json
 import math
@@ -21,8 +24,9 @@ import random
 import re
 import subprocess
 import sys
+import threading
 import unicodedata
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 from pathlib import Path
 from time import perf_counter, sleep
@@ -57,6 +61,27 @@ try:
 except Exception:
     pass
 
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - combinacao de scores em Python puro
+    np = None
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - fallback para json
+    orjson = None
+
+try:
+    import onnxruntime as ort
+except Exception:  # pragma: no cover - reranker ONNX opcional
+    ort = None
+
+try:
+    import h2  # noqa: F401 - habilita HTTP/2 no httpx
+except Exception:  # pragma: no cover - HTTP/1.1 com keep-alive
+    h2 = None
+
+import httpx
 import lancedb
 from dotenv import load_dotenv
 from google import genai
@@ -85,6 +110,7 @@ else:
 
 GEMINI_KEY = (os.getenv("GEMINI_API_KEY") or "").strip()
 _CLIENT: Optional[genai.Client] = None
+GEMINI_HTTP_MAX_CONNECTIONS = max(4, min(int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "64")), 512))
 
 SUPPORTED_GENERATION_MODELS: tuple[str, ...] = (
     "gemini-3.1-pro-preview",
@@ -173,6 +199,32 @@ def _reset_runtime_model_cache() -> None:
     _AVAILABLE_MODELS_CACHE = None
 
 
+def _gemini_http_client_args() -> dict[str, Any]:
+    # Um pool por cliente Gemini, compartilhado por geracao e pelos lotes de rerank
+    # sync: as conexoes TLS ficam vivas entre chamadas em vez de reabrir. Opcoes so do
+    # httpx; nao valem para o transporte aio, que usa aiohttp quando ele esta instalado.
+    args: dict[str, Any] = {
+        "limits": httpx.Limits(
+            max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=max(2, GEMINI_HTTP_MAX_CONNECTIONS // 2),
+            keepalive_expiry=120.0,
+        )
+    }
+    if h2 is not None:
+        args["http2"] = True
+    return args
+
+
+def _new_gemini_client(key: str) -> genai.Client:
+    try:
+        # Sem async_client_args: com aiohttp instalado o SDK repassa esses kwargs a
+        # ClientSession.request, e limits/http2 falhariam so na primeira chamada aio.
+        http_options = types.HttpOptions(client_args=_gemini_http_client_args())
+    except Exception:  # pragma: no cover - google-genai sem client_args
+        return genai.Client(api_key=key)
+    return genai.Client(api_key=key, http_options=http_options)
+
+
 def get_gemini_client() -> genai.Client:
     global _CLIENT
     key = (GEMINI_KEY or "").strip()
@@ -181,7 +233,7 @@ def get_gemini_client() -> genai.Client:
             "GEMINI_API_KEY ausente. Configure a chave Gemini para usar embeddings e geracao."
         )
     if _CLIENT is None:
-        _CLIENT = genai.Client(api_key=key)
+        _CLIENT = _new_gemini_client(key)
     return _CLIENT
 
 
@@ -198,7 +250,7 @@ def configure_gemini_api_key(
         raise RuntimeError("GEMINI_API_KEY ausente. Informe uma chave valida.")
 
     probe_model = (test_model or GENERATION_MODEL or "gemini-3-flash-preview").strip()
-    candidate = genai.Client(api_key=key)
+    candidate = _new_gemini_client(key)
     if validate:
         timeout_ms = max(3000, min(int(validation_timeout_ms or GEMINI_KEY_VALIDATION_TIMEOUT_MS), 120000))
         probe_candidates: list[str] = []
@@ -271,6 +323,9 @@ NATIVE_SOURCE_CONFIG: dict[str, dict[str, str]] = {
 TOPK_HYBRID = int(os.getenv("TOPK_HYBRID", "80"))
 TOPK_RERANK = int(os.getenv("TOPK_RERANK", "11"))
 HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Opt-in: consultas com intencao vinculante buscam primeiro so nos tipos de precedente qualificado.
+HYBRID_INTENT_TYPE_SLICE = os.getenv("HYBRID_INTENT_TYPE_SLICE", "0").strip() == "1"
+QUERY_EMBED_CACHE_SIZE = max(1, min(int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024")), 100000))
 
 # Uniform ranking weights
 SEMANTIC_WEIGHT = float(os.getenv("SEMANTIC_WEIGHT", "0.45"))
@@ -321,8 +376,10 @@ LOCAL_RERANKER_PROBE_TIMEOUT_SECONDS = max(
     30,
     min(int(os.getenv("LOCAL_RERANKER_PROBE_TIMEOUT_SECONDS", "240")), 900),
 )
+# Diretorio com export ONNX (ex.: int8 dinamico) do reranker + arquivos do tokenizer.
+RERANKER_ONNX_DIR = (os.getenv("RERANKER_ONNX_DIR") or "").strip()
 GEMINI_RERANK_MODEL = os.getenv("GEMINI_RERANK_MODEL", "gemini-3.1-pro-preview")
-GEMINI_RERANK_BATCH_SIZE = int(os.getenv("GEMINI_RERANK_BATCH_SIZE", "8"))
+GEMINI_RERANK_BATCH_SIZE = int(os.getenv("GEMINI_RERANK_BATCH_SIZE", "16"))
 GEMINI_RERANK_EXCERPT_CHARS = int(os.getenv("GEMINI_RERANK_EXCERPT_CHARS", "1600"))
 GEMINI_RERANK_PASSES = int(os.getenv("GEMINI_RERANK_PASSES", "2"))
 GEMINI_RERANK_REFINE_TOP = int(os.getenv("GEMINI_RERANK_REFINE_TOP", "24"))
@@ -332,6 +389,9 @@ GEMINI_RERANK_MAX_RETRIES = int(os.getenv("GEMINI_RERANK_MAX_RETRIES", "5"))
 GEMINI_RERANK_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RERANK_RETRY_BASE_SECONDS", "1.5"))
 GEMINI_RERANK_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RERANK_RETRY_MAX_SECONDS", "20.0"))
 RERANK_DEDUP_PROCESS = os.getenv("RERANK_DEDUP_PROCESS", "1").strip() != "0"
+# Candidatos (pela primeira etapa) que passam pelo reranker semantico; 0 = todos. O pool
+# nunca fica abaixo de 2x o top_k pedido, para a deduplicacao por processo ter folga.
+RERANK_SEMANTIC_POOL = max(0, int(os.getenv("RERANK_SEMANTIC_POOL", "30")))
 _RERANKER: Optional[CrossEncoder] = None
 _RERANKER_RUNTIME_MODEL = ""
 _RERANKER_WARNING = ""
@@ -565,6 +625,9 @@ def _clip(value: float, low: float, high: float) -> float:
 
 
 def _as_float(value: Any, default: float) -> float:
+    # Caso comum: o JSON da UI ja entrega o tipo certo.
+    if type(value) is float:
+        return value
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -572,6 +635,8 @@ def _as_float(value: Any, default: float) -> float:
 
 
 def _as_int(value: Any, default: int) -> int:
+    if type(value) is int:
+        return value
     try:
         return int(round(float(value)))
     except (TypeError, ValueError):
@@ -596,6 +661,24 @@ def get_rag_tuning_defaults() -> dict[str, Any]:
     return dict(RAG_TUNING_DEFAULTS)
 
 
+def _tuning_coercer(key: str, default: Any) -> Callable[[Any], Any]:
+    """Build the override parser for one tuning key (type + bounds resolved once)."""
+    if key in _RAG_TUNING_BOOL_KEYS:
+        return lambda value: _as_bool(value, bool(default))
+    if key in _RAG_TUNING_STRING_KEYS:
+        return lambda value: str(value or "").strip() or default
+    low, high = _RAG_TUNING_NUMERIC_BOUNDS.get(key, (-1e9, 1e9))
+    if key in _RAG_TUNING_INT_KEYS:
+        return lambda value: int(_clip(float(_as_int(value, int(default))), low, high))
+    return lambda value: float(_clip(_as_float(value, float(default)), low, high))
+
+
+# Um parser por chave, montado no import: cada override custa um lookup e uma chamada.
+_RAG_TUNING_COERCERS: dict[str, Callable[[Any], Any]] = {
+    key: _tuning_coercer(key, default) for key, default in RAG_TUNING_DEFAULTS.items()
+}
+
+
 def resolve_rag_tuning(overrides: Optional[dict[str, Any]] = None) -> dict[str, Any]:
     cfg = dict(RAG_TUNING_DEFAULTS)
     if not overrides:
@@ -603,26 +686,11 @@ def resolve_rag_tuning(overrides: Optional[dict[str, Any]] = None) -> dict[str,
     if not isinstance(overrides, dict):
         return cfg
 
+    coercers = _RAG_TUNING_COERCERS
     for key, value in overrides.items():
-        if key not in cfg:
-            continue
-        default = cfg[key]
-        if key in _RAG_TUNING_BOOL_KEYS:
-            cfg[key] = _as_bool(value, bool(default))
-            continue
-        if key in _RAG_TUNING_STRING_KEYS:
-            txt = str(value or "").strip()
-            if txt:
-                cfg[key] = txt
-            continue
-
-        low, high = _RAG_TUNING_NUMERIC_BOUNDS.get(key, (-1e9, 1e9))
-        if key in _RAG_TUNING_INT_KEYS:
-            parsed = _as_int(value, int(default))
-            cfg[key] = int(_clip(float(parsed), low, high))
-        else:
-            parsed = _as_float(value, float(default))
-            cfg[key] = float(_clip(parsed, low, high))
+        coerce = coercers.get(key)
+        if coerce is not None:
+            cfg[key] = coerce(value)
 
     # Keep rerank <= hybrid to avoid empty cuts.
     if cfg["topk_rerank"] > cfg["topk_hybrid"]:
@@ -935,12 +1003,18 @@ def _emit_stage(stage_callback: StageCallback, stage: str, **payload) -> None:
         pass
 
 
+# Dominio pequeno (tipos e orgaos do acervo) e chamadas por passagem na montagem do contexto.
+@functools.lru_cache(maxsize=256)
 def type_label(tipo: str) -> str:
     if not tipo:
         return "Documento"
-    return TYPE_LABELS.get(tipo, tipo.replace("_", " ").title())
+    label = TYPE_LABELS.get(tipo)
+    if label is not None:
+        return label
+    return tipo.replace("_", " ").title()
 
 
+@functools.lru_cache(maxsize=4096)
 def orgao_label(raw: str) -> str:
     value = (raw or "").strip()
     if not value:
@@ -950,25 +1024,56 @@ def orgao_label(raw: str) -> str:
     return value
 
 
+# Uma passada para todas as tags: quebras e fechamentos de bloco viram "\n", <li> vira
+# marcador e o resto some. As alternativas ficam na mesma ordem de prioridade.
+_HTML_TAG_RE = re.compile(
+    r"(?i)(?P<br><br\s*/?>)"
+    r"|(?P<block></(?:p|div|li|tr|h\d|section|article)>)"
+    r"|(?P<li><li[^>]*>)"
+    r"|(?P<tag><[^>]+>)"
+)
+_HTML_TAG_REPLACEMENTS = {"br": "\n", "block": "\n", "li": "- ", "tag": ""}
+_EXTRA_NEWLINES_RE = re.compile(r"\n{3,}")
+
+
+def _replace_html_tag(match: re.Match) -> str:
+    return _HTML_TAG_REPLACEMENTS[match.lastgroup]
+
+
 def clean_retrieved_text(raw: str) -> str:
-    text = html.unescape((raw or "").replace("\r\n", "\n").replace("\r", "\n"))
-    text = re.sub(r"(?i)<br\s*/?>", "\n", text)
-    text = re.sub(r"(?i)</(p|div|li|tr|h\d|section|article)>", "\n", text)
-    text = re.sub(r"(?i)<li[^>]*>", "- ", text)
-    text = re.sub(r"(?i)<[^>]+>", "", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = (raw or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = html.unescape(text)
+    if "<" in text:
+        text = _HTML_TAG_RE.sub(_replace_html_tag, text)
+    if "\n\n\n" in text:
+        text = _EXTRA_NEWLINES_RE.sub("\n\n", text)
     return text.strip()
 
 
-def keyword_density(text: str, terms: tuple[str, ...], saturation_hits: float = 4.0) -> float:
-    base = normalize_text(text)
+@functools.lru_cache(maxsize=32)
+def _signal_terms(terms: tuple[str, ...]) -> tuple[tuple[str, ...], re.Pattern]:
+    """Normalized terms plus one alternation regex over them (built once per term tuple)."""
+    normalized = tuple(t for t in (normalize_text(term) for term in terms) if t)
+    alternatives = sorted(set(normalized), key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(t) for t in alternatives) or r"(?!)")
+    return normalized, pattern
+
+
+def keyword_density(
+    text: str,
+    terms: tuple[str, ...],
+    saturation_hits: float = 4.0,
+    *,
+    normalized: bool = False,
+) -> float:
+    base = text if normalized else normalize_text(text)
     if not base:
         return 0.0
-    hits = 0.0
-    for term in terms:
-        t = normalize_text(term)
-        if t and t in base:
-            hits += 1.0
+    norm_terms, pattern = _signal_terms(terms)
+    # Uma passada da regex descarta o caso comum (nenhum termo no texto).
+    if not pattern.search(base):
+        return 0.0
+    hits = float(sum(1 for t in norm_terms if t in base))
     return min(hits / max(saturation_hits, 1.0), 1.0)
 
 
@@ -1055,10 +1160,78 @@ def get_reranker_warning() -> str:
     return _RERANKER_WARNING
 
 
+_RERANKER_LOCK = threading.Lock()
+_RERANKER_WARMUP_THREAD: Optional[threading.Thread] = None
+
+
 def get_reranker() -> CrossEncoder:
-    global _RERANKER, _RERANKER_RUNTIME_MODEL, _RERANKER_WARNING
     if _RERANKER is not None:
         return _RERANKER
+    # O aquecimento em segundo plano e a primeira consulta podem chegar juntos.
+    with _RERANKER_LOCK:
+        if _RERANKER is not None:
+            return _RERANKER
+        return _load_reranker()
+
+
+class _OnnxCrossEncoder:
+    """CrossEncoder.predict over an ONNX Runtime export of a sequence-classification reranker."""
+
+    def __init__(self, model_dir: Path, max_length: int = 512) -> None:
+        from transformers import AutoTokenizer
+
+        model_path = model_dir / "model_quantized.onnx"
+        if not model_path.exists():
+            model_path = model_dir / "model.onnx"
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_length = max_length
+
+    def predict(self, pairs: list[list[str]], batch_size: int = 32) -> list[float]:
+        scores: list[float] = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start : start + batch_size]
+            encoded = self.tokenizer(
+                [pair[0] for pair in batch],
+                [pair[1] for pair in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+            logits = np.asarray(self.session.run(None, feeds)[0], dtype=np.float64)
+            if logits.ndim > 1:
+                logits = logits[:, 0]
+            # Mesma ativacao (sigmoide) que o CrossEncoder aplica a modelos de um rotulo.
+            scores.extend((1.0 / (1.0 + np.exp(-logits))).tolist())
+        return scores
+
+
+def _load_onnx_reranker() -> Optional[_OnnxCrossEncoder]:
+    if not RERANKER_ONNX_DIR:
+        return None
+    if ort is None or np is None:
+        print("RERANKER_ONNX_DIR definido, mas onnxruntime/numpy indisponiveis; usando CrossEncoder.", file=sys.stderr)
+        return None
+    try:
+        return _OnnxCrossEncoder(Path(RERANKER_ONNX_DIR).expanduser())
+    except Exception as exc:
+        print(f"ONNX reranker load warning ({RERANKER_ONNX_DIR}): {exc}. Usando CrossEncoder...", file=sys.stderr)
+        return None
+
+
+def _load_reranker() -> CrossEncoder:
+    global _RERANKER, _RERANKER_RUNTIME_MODEL, _RERANKER_WARNING
+    onnx_reranker = _load_onnx_reranker()
+    if onnx_reranker is not None:
+        _RERANKER = onnx_reranker
+        _RERANKER_RUNTIME_MODEL = f"onnx:{Path(RERANKER_ONNX_DIR).name}"
+        print(f"Reranker ready ({_RERANKER_RUNTIME_MODEL}) [onnxruntime cpu].", file=sys.stderr)
+        return _RERANKER
 
     candidates = _local_reranker_candidates()
     if not candidates:
@@ -1108,28 +1281,75 @@ def get_reranker() -> CrossEncoder:
     )
 
 
-def normalize_text(text: str) -> str:
-    text = (text or "").lower()
+def warm_up_reranker_async() -> Optional[threading.Thread]:
+    """Load the local CrossEncoder and run one predict in a daemon thread (once per process)."""
+    global _RERANKER_WARMUP_THREAD
+    if RERANKER_BACKEND != "local" or _RERANKER is not None:
+        return None
+    if _RERANKER_WARMUP_THREAD is not None:
+        return _RERANKER_WARMUP_THREAD
+
+    def warm_up() -> None:
+        try:
+            get_reranker().predict([["aquecimento", "aquecimento"]])
+        except Exception as exc:
+            print(f"Reranker warm-up warning: {exc}", file=sys.stderr)
+
+    _RERANKER_WARMUP_THREAD = threading.Thread(target=warm_up, name="reranker-warmup", daemon=True)
+    _RERANKER_WARMUP_THREAD.start()
+    return _RERANKER_WARMUP_THREAD
+
+
+def _normalize_text_nfkd(text: str) -> str:
     text = unicodedata.normalize("NFKD", text)
     return "".join(ch for ch in text if not unicodedata.combining(ch))
 
 
+# ASCII, Latin-1/Extended, marcas combinantes e pontuacao geral: cobre o texto juridico em portugues.
+# A NFKD seguida do filtro de marcas age por caractere, entao a tabela reproduz o caminho lento.
+# Tabela densa (inclusive identidades): chave ausente no str.translate custa mais que o acerto.
+_NORMALIZE_TABLE_RANGES = ((0x00, 0x250), (0x300, 0x370), (0x2000, 0x2070))
+_NORMALIZE_TABLE = {
+    cp: _normalize_text_nfkd(chr(cp)) for start, end in _NORMALIZE_TABLE_RANGES for cp in range(start, end)
+}
+_NORMALIZE_UNCOVERED_RE = re.compile(
+    "[^" + "".join(f"{chr(start)}-{chr(end - 1)}" for start, end in _NORMALIZE_TABLE_RANGES) + "]"
+)
+
+
+def normalize_text(text: str) -> str:
+    text = (text or "").lower()
+    if text.isascii():
+        return text
+    if _NORMALIZE_UNCOVERED_RE.search(text) is None:
+        return text.translate(_NORMALIZE_TABLE)
+    return _normalize_text_nfkd(text)
+
+
 def normalize_tokens(text: str) -> list[str]:
     return TOKEN_RE.findall(normalize_text(text))
 
 
-def lexical_overlap_score(query: str, doc_text: str) -> float:
+@functools.lru_cache(maxsize=64)
+def _query_token_pattern(query: str) -> tuple[frozenset[str], Optional[re.Pattern]]:
+    """Kept query tokens and a regex matching any of them as a whole TOKEN_RE token."""
     query_tokens = [t for t in normalize_tokens(query) if t not in LEGAL_STOP_TOKENS]
     if not query_tokens:
         query_tokens = normalize_tokens(query)
     if not query_tokens:
-        return 0.0
+        return frozenset(), None
+    query_set = frozenset(query_tokens)
+    alternatives = "|".join(re.escape(t) for t in sorted(query_set, key=len, reverse=True))
+    # Limites equivalentes a TOKEN_RE: o token precisa ser a sequencia [a-z0-9] inteira.
+    return query_set, re.compile(f"(?<![a-z0-9])(?:{alternatives})(?![a-z0-9])")
 
-    query_set = set(query_tokens)
-    doc_set = set(normalize_tokens(doc_text))
-    if not doc_set:
+
+def lexical_overlap_score(query: str, doc_text: str, *, doc_norm: Optional[str] = None) -> float:
+    query_set, pattern = _query_token_pattern(query)
+    if pattern is None:
         return 0.0
-    hits = len(query_set.intersection(doc_set))
+    base = normalize_text(doc_text) if doc_norm is None else doc_norm
+    hits = len(set(pattern.findall(base)))
     return hits / len(query_set)
 
 
@@ -1149,18 +1369,26 @@ def has_recency_intent(query: str) -> bool:
 
 
 def has_dominant_intent(query: str) -> bool:
-    q = normalize_text(query)
-    return any(term in q for term in DOMINANT_INTENT_TERMS)
+    return bool(_signal_terms(DOMINANT_INTENT_TERMS)[1].search(normalize_text(query)))
 
 
 def has_procedural_intent(query: str) -> bool:
-    q = normalize_text(query)
-    return any(term in q for term in PROCEDURAL_INTENT_TERMS)
+    return bool(_signal_terms(PROCEDURAL_INTENT_TERMS)[1].search(normalize_text(query)))
 
 
 def has_binding_intent(query: str) -> bool:
-    q = normalize_text(query)
-    return any(term in q for term in BINDING_INTENT_TERMS)
+    return bool(_signal_terms(BINDING_INTENT_TERMS)[1].search(normalize_text(query)))
+
+
+def _json_loads(value: str | bytes) -> Any:
+    """Parse JSON with orjson when available; raises ValueError on invalid input."""
+    if orjson is not None:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            # orjson recusa NaN/Infinity e inteiros grandes que o json aceita.
+            pass
+    return json.loads(value)
 
 
 def _parse_metadata_extra(raw: str) -> dict:
@@ -1170,8 +1398,8 @@ def _parse_metadata_extra(raw: str) -> dict:
     if not value:
         return {}
     try:
-        parsed = json.loads(value)
-    except json.JSONDecodeError:
+        parsed = _json_loads(value)
+    except ValueError:
         return {}
     return parsed if isinstance(parsed, dict) else {}
 
@@ -1189,15 +1417,49 @@ def authority_label(level: str) -> str:
     return AUTHORITY_LEVEL_LABELS.get(level, AUTHORITY_LEVEL_LABELS["D"])
 
 
+def _clean_row_texts(row: dict) -> tuple[str, str]:
+    """Cleaned texto_busca and texto_integral of a candidate, computed once per row."""
+    cached = row.get("_clean_texts")
+    if cached is None:
+        cached = (
+            clean_retrieved_text(row.get("texto_busca", "") or ""),
+            clean_retrieved_text(row.get("texto_integral", "") or ""),
+        )
+        row["_clean_texts"] = cached
+    return cached
+
+
+def _candidate_norm_text(row: dict) -> tuple[str, str]:
+    """Normalized ranking text and authority corpus of a candidate, computed once per row."""
+    cached = row.get("_norm_text")
+    if cached is not None:
+        return cached, row["_norm_authority_text"]
+    busca, integral = _clean_row_texts(row)
+    # normalize_text atua por caractere: normalizar os pedacos equivale a normalizar o texto unido.
+    processo = normalize_text(str(row.get("processo") or ""))
+    busca_norm = normalize_text(busca)
+    head = normalize_text(integral[:2500])
+    norm_text = f"{processo}\n{busca_norm}\n{head}"
+    authority_text = f"{norm_text}{normalize_text(integral[2500:3000])}"
+    row["_norm_text"] = norm_text
+    row["_norm_authority_text"] = authority_text
+    return norm_text, authority_text
+
+
 def classify_authority(row: dict) -> tuple[float, str, str]:
+    # Rerank, excertos e contexto classificam a mesma linha; guarda o resultado nela.
+    cached = row.get("_authority_result")
+    if cached is None:
+        cached = _classify_authority_uncached(row)
+        row["_authority_result"] = cached
+    return cached
+
+
+def _classify_authority_uncached(row: dict) -> tuple[float, str, str]:
     tipo = (row.get("tipo") or "").strip().lower()
     tribunal = (row.get("tribunal") or "").strip().upper()
     orgao = normalize_text(row.get("orgao_julgador", ""))
-    processo = normalize_text(row.get("processo", ""))
-    busca = clean_retrieved_text(row.get("texto_busca", "") or "")
-    integral = clean_retrieved_text(row.get("texto_integral", "") or "")
-    doc_text = normalize_text(f"{busca}\n{integral[:3000]}")
-    corpus = f"{processo}\n{doc_text}"
+    corpus = _candidate_norm_text(row)[1]
     meta = _parse_metadata_extra(row.get("metadata_extra", ""))
 
     if tipo == "sumula_vinculante":
@@ -1236,7 +1498,10 @@ def classify_authority(row: dict) -> tuple[float, str, str]:
     return 0.45, "D", "Forca nao vinculante padrao."
 
 
+@functools.lru_cache(maxsize=8192)
 def parse_date(value: str) -> Optional[date]:
+    # Memoizado: as mesmas datas se repetem entre candidatos e consultas, e o formato
+    # dd-mm-aaaa so e aceito depois de varias tentativas de strptime com excecao.
     raw = (value or "").strip()
     if not raw:
         return None
@@ -1290,6 +1555,13 @@ def min_max_scale(values: list[float]) -> list[float]:
     return [(v - low) / (high - low) for v in values]
 
 
+def _weighted_column_sum(weights: list[float], columns: list[list[float]]) -> list[float]:
+    """Per-candidate sum of weight * column (one matrix-vector product with numpy)."""
+    if np is not None:
+        return (np.asarray(weights, dtype=float) @ np.asarray(columns, dtype=float)).tolist()
+    return [sum(w * v for w, v in zip(weights, values)) for values in zip(*columns)]
+
+
 def _embed_query_config(*, include_task_type: bool) -> types.EmbedContentConfig:
     config_kwargs: dict[str, Any] = {
         "output_dimensionality": EMBED_DIM,
@@ -1299,7 +1571,17 @@ def _embed_query_config(*, include_task_type: bool) -> types.EmbedContentConfig:
     return types.EmbedContentConfig(**config_kwargs)
 
 
+def _canonical_query(query: str) -> str:
+    # NFKC + espacos colapsados: variacoes triviais da mesma pergunta reaproveitam o vetor.
+    return " ".join(unicodedata.normalize("NFKC", query or "").split())
+
+
 def embed_query(query: str) -> list[float]:
+    return list(_embed_query_cached(_canonical_query(query)))
+
+
+@functools.lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)
+def _embed_query_cached(query: str) -> tuple[float, ...]:
     client = get_gemini_client()
     try:
         result = client.models.embed_content(
@@ -1316,7 +1598,7 @@ def embed_query(query: str) -> list[float]:
             contents=[query],
             config=_embed_query_config(include_task_type=False),
         )
-    return result.embeddings[0].values
+    return tuple(result.embeddings[0].values)
 
 
 def _quote_sql(value: str) -> str:
@@ -1340,7 +1622,7 @@ def _load_user_source_manifest() -> list[dict[str, Any]]:
     try:
         if not USER_ACERVO_MANIFEST.exists():
             return []
-        payload = json.loads(USER_ACERVO_MANIFEST.read_text(encoding="utf-8"))
+        payload = _json_loads(USER_ACERVO_MANIFEST.read_bytes())
         sources = payload.get("sources")
         if not isinstance(sources, list):
             return []
@@ -1443,6 +1725,10 @@ def _rrf(rank: Optional[int], k: int = HYBRID_RRF_K) -> float:
     return 1.0 / (k + max(rank, 1))
 
 
+# Pernas FTS das buscas hibridas; o LanceDB executa em Rust e libera o GIL.
+_HYBRID_FTS_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lance-fts")
+
+
 def _table_hybrid_rows(
     tbl: Any,
     *,
@@ -1452,19 +1738,23 @@ def _table_hybrid_rows(
     hybrid_rrf_k: int,
     where_str: Optional[str],
 ) -> list[dict]:
+    def fts_rows() -> list[dict]:
+        try:
+            fts_q = tbl.search(query, query_type="fts").limit(top_k)
+            if where_str:
+                fts_q = fts_q.where(where_str)
+            return fts_q.to_list()
+        except Exception as exc:
+            print(f"FTS search warning: {exc}", file=sys.stderr)
+            return []
+
+    # As duas pernas rodam em paralelo, como no modo hybrid nativo do LanceDB.
+    fts_future = _HYBRID_FTS_POOL.submit(fts_rows)
     vec_q = tbl.search(query_vector).limit(top_k)
     if where_str:
         vec_q = vec_q.where(where_str, prefilter=True)
     vec_results = vec_q.to_list()
-
-    try:
-        fts_q = tbl.search(query, query_type="fts").limit(top_k)
-        if where_str:
-            fts_q = fts_q.where(where_str)
-        fts_results = fts_q.to_list()
-    except Exception as exc:
-        print(f"FTS search warning: {exc}", file=sys.stderr)
-        fts_results = []
+    fts_results = fts_future.result()
 
     combined: dict[str, dict] = {}
     for rank, row in enumerate(vec_results, 1):
@@ -1491,6 +1781,24 @@ def _table_hybrid_rows(
     return fused
 
 
+# Tipos colegiados/qualificados que o rerank ja favorece sob intencao vinculante.
+_BINDING_TYPE_SLICE = (
+    "acordao",
+    "acordao_sv",
+    "sumula",
+    "sumula_stj",
+    "sumula_vinculante",
+    "tema_repetitivo_stj",
+)
+
+
+def _detect_type_slice(query: str) -> Optional[list[str]]:
+    """Tipo slice implied by the query intent, or None to search every type."""
+    if has_binding_intent(query) and not has_procedural_intent(query):
+        return list(_BINDING_TYPE_SLICE)
+    return None
+
+
 def search_lancedb(
     query: str,
     query_vector: list[float],
@@ -1519,20 +1827,44 @@ def search_lancedb(
         date_from=date_from,
         date_to=date_to,
     )
+    slice_where: Optional[str] = None
+    type_slice = _detect_type_slice(query) if HYBRID_INTENT_TYPE_SLICE and not tipos else None
+    if type_slice:
+        slice_where = _build_filter(
+            tribunais=tribunais,
+            tipos=type_slice,
+            ramos=ramos,
+            orgaos=orgaos,
+            relator_contains=relator_contains,
+            date_from=date_from,
+            date_to=date_to,
+        )
     for source_id in native_ids:
         source_cfg = NATIVE_SOURCE_CONFIG.get(source_id)
         if not source_cfg:
             continue
         try:
             native_tbl = db.open_table(source_cfg["table_name"])
-            native_rows = _table_hybrid_rows(
-                native_tbl,
-                query=query,
-                query_vector=query_vector,
-                top_k=top_k,
-                hybrid_rrf_k=hybrid_rrf_k,
-                where_str=native_where,
-            )
+            native_rows: list[dict] = []
+            if slice_where:
+                native_rows = _table_hybrid_rows(
+                    native_tbl,
+                    query=query,
+                    query_vector=query_vector,
+                    top_k=top_k,
+                    hybrid_rrf_k=hybrid_rrf_k,
+                    where_str=slice_where,
+                )
+            # Sem filtro de intencao (ou fatia pequena demais): busca em todos os tipos.
+            if len(native_rows) < max(1, top_k // 2):
+                native_rows = _table_hybrid_rows(
+                    native_tbl,
+                    query=query,
+                    query_vector=query_vector,
+                    top_k=top_k,
+                    hybrid_rrf_k=hybrid_rrf_k,
+                    where_str=native_where,
+                )
             for row in native_rows:
                 row.setdefault("source_id", source_id)
                 row.setdefault("source_label", source_cfg["label"])
@@ -1859,9 +2191,9 @@ def get_informativo_items(
         try:
             meta_raw = row.get("metadata_extra") or ""
             if meta_raw and isinstance(meta_raw, str):
-                meta = json.loads(meta_raw)
+                meta = _json_loads(meta_raw)
                 data_publicacao = _parse_date_loose(str(meta.get("publicacao_data") or ""))
-        except (json.JSONDecodeError, TypeError, AttributeError):
+        except (ValueError, TypeError, AttributeError):
             pass
 
         date_norm = row.get("_date_norm") or ""
@@ -2067,8 +2399,7 @@ def _build_semantic_excerpt(row: dict, max_chars: int = GEMINI_RERANK_EXCERPT_CH
     tribunal = row.get("tribunal") or "-"
     dt = row.get("data_julgamento") or "-"
     authority_score, authority_level, authority_reason = classify_authority(row)
-    busca = clean_retrieved_text(row.get("texto_busca", "") or "")
-    integral = clean_retrieved_text(row.get("texto_integral", "") or "")
+    busca, integral = _clean_row_texts(row)
     header = (
         f"Tribunal: {tribunal}\n"
         f"Tipo: {tipo}\n"
@@ -2089,18 +2420,18 @@ def _extract_json_array(raw: str) -> Optional[list]:
     if not value:
         return None
     try:
-        parsed = json.loads(value)
+        parsed = _json_loads(value)
         if isinstance(parsed, list):
             return parsed
-    except json.JSONDecodeError:
+    except ValueError:
         pass
 
     match = re.search(r"\[[\s\S]*\]", value)
     if not match:
         return None
     try:
-        parsed = json.loads(match.group(0))
-    except json.JSONDecodeError:
+        parsed = _json_loads(match.group(0))
+    except ValueError:
         return None
     return parsed if isinstance(parsed, list) else None
 
@@ -2213,7 +2544,48 @@ def _is_retryable_gemini_error(exc: Exception) -> bool:
     return any(h in msg for h in hints)
 
 
-def _gemini_generate_text_with_retry(model_name: str, prompt: str, temperature: float) -> str:
+_RERANK_SCORE_PROPERTIES = {
+    "id": {"type": "INTEGER"},
+    "score": {"type": "NUMBER"},
+}
+_RERANK_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            **_RERANK_SCORE_PROPERTIES,
+            "relevance": {"type": "NUMBER"},
+            "thesis_density": {"type": "NUMBER"},
+            "authority_alignment": {"type": "NUMBER"},
+            "procedural_noise": {"type": "NUMBER"},
+        },
+        "required": ["id", "score"],
+    },
+}
+_REFINE_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {"type": "OBJECT", "properties": _RERANK_SCORE_PROPERTIES, "required": ["id", "score"]},
+}
+
+
+def _rerank_generate_config(temperature: float, json_schema: Optional[dict] = None) -> types.GenerateContentConfig:
+    if json_schema is None:
+        return types.GenerateContentConfig(temperature=temperature)
+    # Saida JSON estruturada: o modelo nao gasta tokens com markdown e o parse nao falha.
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        response_mime_type="application/json",
+        response_schema=json_schema,
+    )
+
+
+def _gemini_generate_text_with_retry(
+    model_name: str,
+    prompt: str,
+    temperature: float,
+    *,
+    json_schema: Optional[dict] = None,
+) -> str:
     last_exc: Optional[Exception] = None
     attempts = max(GEMINI_RERANK_MAX_RETRIES, 1)
     gemini_client = get_gemini_client()
@@ -2222,7 +2594,7 @@ def _gemini_generate_text_with_retry(model_name: str, prompt: str, temperature:
             response = gemini_client.models.generate_content(
                 model=model_name,
                 contents=prompt,
-                config=types.GenerateContentConfig(temperature=temperature),
+                config=_rerank_generate_config(temperature, json_schema),
             )
             return response.text or ""
         except Exception as exc:
@@ -2239,6 +2611,58 @@ def _gemini_generate_text_with_retry(model_name: str, prompt: str, temperature:
     return ""
 
 
+async def _gemini_generate_text_with_retry_async(
+    model_name: str,
+    prompt: str,
+    temperature: float,
+    *,
+    json_schema: Optional[dict] = None,
+) -> str:
+    last_exc: Optional[Exception] = None
+    attempts = max(GEMINI_RERANK_MAX_RETRIES, 1)
+    gemini_client = get_gemini_client()
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await gemini_client.aio.models.generate_content(
+                model=model_name,
+                contents=prompt,
+                config=_rerank_generate_config(temperature, json_schema),
+            )
+            return response.text or ""
+        except Exception as exc:
+            last_exc = exc
+            if attempt >= attempts or not _is_retryable_gemini_error(exc):
+                raise
+            delay = min(
+                GEMINI_RERANK_RETRY_BASE_SECONDS * (2 ** (attempt - 1)) + random.uniform(0.0, 0.5),
+                GEMINI_RERANK_RETRY_MAX_SECONDS,
+            )
+            await asyncio.sleep(delay)
+    if last_exc:
+        raise last_exc
+    return ""
+
+
+_ASYNC_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_ASYNC_LOOP_LOCK = threading.Lock()
+
+
+def _run_on_background_loop(coro):
+    """Run a coroutine on a long-lived loop thread and block for its result.
+
+    Um unico loop para o processo: o cliente async do genai reaproveita as conexoes entre
+    consultas, e funciona mesmo quando o chamador ja esta dentro de um event loop.
+    """
+    global _ASYNC_LOOP
+    with _ASYNC_LOOP_LOCK:
+        if _ASYNC_LOOP is None or _ASYNC_LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="rag-async", daemon=True).start()
+            _ASYNC_LOOP = loop
+        loop = _ASYNC_LOOP
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
 def _score_from_rerank_item(item: dict) -> Optional[float]:
     raw_score = item.get("score")
     if raw_score is not None:
@@ -2292,7 +2716,42 @@ def _score_single_gemini_batch(
     model_name: str,
 ) -> dict[int, float]:
     prompt = _build_batch_rerank_prompt(query, batch)
-    text = _gemini_generate_text_with_retry(model_name=model_name, prompt=prompt, temperature=0.1)
+    text = _gemini_generate_text_with_retry(
+        model_name=model_name, prompt=prompt, temperature=0.1, json_schema=_RERANK_RESPONSE_SCHEMA
+    )
+    return _scores_from_rerank_text(query, batch, text)
+
+
+async def _score_single_gemini_batch_async(
+    query: str,
+    batch: list[tuple[int, dict]],
+    model_name: str,
+    semaphore: asyncio.Semaphore,
+) -> dict[int, float]:
+    prompt = _build_batch_rerank_prompt(query, batch)
+    # Pequeno jitter para nao disparar todos os lotes no mesmo instante (429).
+    await asyncio.sleep(random.uniform(0.0, 0.05))
+    async with semaphore:
+        text = await _gemini_generate_text_with_retry_async(
+            model_name=model_name, prompt=prompt, temperature=0.1, json_schema=_RERANK_RESPONSE_SCHEMA
+        )
+    return _scores_from_rerank_text(query, batch, text)
+
+
+async def _score_gemini_batches_async(
+    query: str,
+    batch_jobs: list[list[tuple[int, dict]]],
+    model_name: str,
+    max_workers: int,
+) -> list:
+    semaphore = asyncio.Semaphore(max_workers)
+    return await asyncio.gather(
+        *(_score_single_gemini_batch_async(query, batch, model_name, semaphore) for batch in batch_jobs),
+        return_exceptions=True,
+    )
+
+
+def _scores_from_rerank_text(query: str, batch: list[tuple[int, dict]], text: str) -> dict[int, float]:
     parsed = _extract_json_array(text or "")
 
     scores_by_global: dict[int, float] = {}
@@ -2321,7 +2780,7 @@ def _score_single_gemini_batch(
 
 def _semantic_scores_local(query: str, results: list[dict]) -> list[float]:
     reranker = get_reranker()
-    pairs = [[query, clean_retrieved_text(r.get("texto_busca", ""))] for r in results]
+    pairs = [[query, _clean_row_texts(r)[0]] for r in results]
     return [float(v) for v in reranker.predict(pairs)]
 
 
@@ -2350,37 +2809,31 @@ def _semantic_scores_gemini(
                 batch = batch_base
             batch_jobs.append(batch)
 
+    def absorb(batch: list[tuple[int, dict]], outcome: Any) -> None:
+        if isinstance(outcome, BaseException):
+            print(f"Gemini rerank batch warning: {outcome}", file=sys.stderr)
+            outcome = {
+                global_idx: _fallback_semantic_score(query, row)
+                for global_idx, row in batch
+            }
+        for global_idx, score in outcome.items():
+            score_buckets[global_idx].append(_clip01(score))
+
     max_workers = max(1, min(GEMINI_RERANK_MAX_WORKERS, len(batch_jobs)))
     if max_workers == 1:
         for batch in batch_jobs:
             try:
-                scores_map = _score_single_gemini_batch(query=query, batch=batch, model_name=model_name)
+                outcome = _score_single_gemini_batch(query=query, batch=batch, model_name=model_name)
             except Exception as exc:
-                print(f"Gemini rerank batch warning: {exc}", file=sys.stderr)
-                scores_map = {
-                    global_idx: _fallback_semantic_score(query, row)
-                    for global_idx, row in batch
-                }
-            for global_idx, score in scores_map.items():
-                score_buckets[global_idx].append(_clip01(score))
+                outcome = exc
+            absorb(batch, outcome)
     else:
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(_score_single_gemini_batch, query, batch, model_name): batch
-                for batch in batch_jobs
-            }
-            for future in as_completed(futures):
-                batch = futures[future]
-                try:
-                    scores_map = future.result()
-                except Exception as exc:
-                    print(f"Gemini rerank batch warning: {exc}", file=sys.stderr)
-                    scores_map = {
-                        global_idx: _fallback_semantic_score(query, row)
-                        for global_idx, row in batch
-                    }
-                for global_idx, score in scores_map.items():
-                    score_buckets[global_idx].append(_clip01(score))
+        # Todos os lotes num unico event loop, limitados por semaforo (sem um thread por lote).
+        outcomes = _run_on_background_loop(
+            _score_gemini_batches_async(query, batch_jobs, model_name, max_workers)
+        )
+        for batch, outcome in zip(batch_jobs, outcomes):
+            absorb(batch, outcome)
 
     for batch_base in batch_bases:
         for global_idx, row in batch_base:
@@ -2423,7 +2876,7 @@ def _semantic_scores_gemini(
             refine_response = get_gemini_client().models.generate_content(
                 model=model_name,
                 contents=refine_prompt,
-                config=types.GenerateContentConfig(temperature=0.0),
+                config=_rerank_generate_config(0.0, _REFINE_RESPONSE_SCHEMA),
             )
             refine_parsed = _extract_json_array(refine_response.text or "")
         except Exception:
@@ -2470,12 +2923,19 @@ def compute_semantic_scores(
     return _semantic_scores_local(query, results), f"local:{get_active_local_reranker_model()}"
 
 
+@functools.lru_cache(maxsize=4096)
+def _process_dedupe_key(tribunal: str, tipo: str, processo: str) -> str:
+    """Canonical tribunal|tipo|processo key; cached, so chunks of one process share one key object."""
+    processo_norm = normalize_text(processo)
+    if not processo_norm:
+        return ""
+    return f"{normalize_text(tribunal)}|{normalize_text(tipo)}|{processo_norm}"
+
+
 def _ranking_dedupe_key(row: dict) -> str:
-    processo = normalize_text(row.get("processo", ""))
-    if processo:
-        tribunal = normalize_text(row.get("tribunal", ""))
-        tipo = normalize_text(row.get("tipo", ""))
-        return f"{tribunal}|{tipo}|{processo}"
+    key = _process_dedupe_key(row.get("tribunal") or "", row.get("tipo") or "", row.get("processo") or "")
+    if key:
+        return key
     doc_id = row.get("doc_id")
     if doc_id:
         return f"id|{doc_id}"
@@ -2521,14 +2981,6 @@ def rerank_results(
 
     cfg = config or RAG_TUNING_DEFAULTS
 
-    semantic_raw, semantic_backend = compute_semantic_scores(
-        query,
-        results,
-        reranker_backend=reranker_backend,
-        gemini_rerank_model=str(cfg.get("gemini_rerank_model", GEMINI_RERANK_MODEL) or GEMINI_RERANK_MODEL),
-    )
-    semantic_norm = min_max_scale(semantic_raw)
-
     semantic_weight = float(cfg.get("semantic_weight", SEMANTIC_WEIGHT))
     lexical_weight = float(cfg.get("lexical_weight", LEXICAL_WEIGHT))
     recency_weight = float(cfg.get("recency_weight", RECENCY_WEIGHT))
@@ -2570,53 +3022,57 @@ def rerank_results(
     if binding_intent:
         authority_weight *= authority_intent_multiplier
 
+    binding_tipo_adjust: dict[str, float] = {}
+    if binding_intent:
+        for binding_tipo in ("acordao", "acordao_sv", "sumula", "sumula_stj", "sumula_vinculante", "tema_repetitivo_stj"):
+            binding_tipo_adjust[binding_tipo] = collegial_binding_bonus
+        for binding_tipo in ("monocratica", "monocratica_sv"):
+            binding_tipo_adjust[binding_tipo] = -monocratic_binding_penalty
+
+    # Componentes por candidato em colunas (SoA); o score de primeira etapa (tudo menos o
+    # semantico e a recencia, que depende dele) sai de uma unica soma ponderada.
+    size = len(results)
+    lexical_col = [0.0] * size
+    thesis_col = [0.0] * size
+    procedural_col = [0.0] * size
+    authority_col = [0.0] * size
+    rrf_col = [0.0] * size
+    offset_col = [0.0] * size
+    recency_col = [0.0] * size
+
     for idx, row in enumerate(results):
         tipo = (row.get("tipo") or "").strip().lower()
-        clean_busca = clean_retrieved_text(row.get("texto_busca", "") or "")
-        clean_integral = clean_retrieved_text(row.get("texto_integral", "") or "")
-        doc_text = f"{row.get('processo', '')}\n{clean_busca}\n{clean_integral[:2500]}"
-        lexical = lexical_overlap_score(query, doc_text)
+        doc_norm = _candidate_norm_text(row)[0]
+        lexical = lexical_overlap_score(query, doc_norm, doc_norm=doc_norm)
         recency, age_years = compute_recency_score(
             row.get("data_julgamento", ""),
             recency_unknown_score=recency_unknown_score,
             recency_half_life_years=recency_half_life_years,
         )
-        thesis_signal = keyword_density(doc_text, THESIS_SIGNAL_TERMS)
-        procedural_signal = keyword_density(doc_text, PROCEDURAL_SIGNAL_TERMS)
+        thesis_signal = keyword_density(doc_norm, THESIS_SIGNAL_TERMS, normalized=True)
+        procedural_signal = keyword_density(doc_norm, PROCEDURAL_SIGNAL_TERMS, normalized=True)
         role = infer_document_role(thesis_signal, procedural_signal)
         authority_score, authority_level, authority_reason = classify_authority(row)
         source_kind = str(row.get("source_kind") or "").strip().lower()
 
-        final = (semantic_weight * semantic_norm[idx]) + (lexical_weight * lexical)
-        recency_contrib = 0.0
-        if prefer_recent:
-            if recency_intent:
-                recency_contrib = recency_weight * recency
-            elif semantic_norm[idx] >= recency_min_semantic_gate:
-                recency_contrib = min(recency_weight * recency, recency_max_contribution)
-        final += recency_contrib
-        final += thesis_bonus_weight * thesis_signal
-        final += authority_weight * authority_score
-        final += rrf_weight * float(row.get("_rrf_score", 0.0))
         source_priority_contrib = 0.0
         if prefer_user_sources and source_kind == "user":
             source_priority_contrib = user_source_priority_boost
-            final += source_priority_contrib
-        final += authority_level_boost.get(authority_level, 0.0)
-        if binding_intent:
-            if tipo in {"acordao", "acordao_sv", "sumula", "sumula_stj", "sumula_vinculante", "tema_repetitivo_stj"}:
-                final += collegial_binding_bonus
-            if tipo in {"monocratica", "monocratica_sv"}:
-                final -= monocratic_binding_penalty
-        if not procedural_intent:
-            final -= procedural_penalty_weight * procedural_signal
 
-        row["_semantic_raw"] = semantic_raw[idx]
-        row["_semantic_score"] = semantic_norm[idx]
-        row["_semantic_backend"] = semantic_backend
+        lexical_col[idx] = lexical
+        thesis_col[idx] = thesis_signal
+        procedural_col[idx] = procedural_signal
+        authority_col[idx] = authority_score
+        rrf_col[idx] = float(row.get("_rrf_score", 0.0))
+        recency_col[idx] = recency
+        offset_col[idx] = (
+            source_priority_contrib
+            + authority_level_boost.get(authority_level, 0.0)
+            + binding_tipo_adjust.get(tipo, 0.0)
+        )
+
         row["_lexical_score"] = lexical
         row["_recency_score"] = recency
-        row["_recency_contrib"] = recency_contrib
         row["_thesis_score"] = thesis_signal
         row["_procedural_score"] = procedural_signal
         row["_document_role"] = role
@@ -2627,21 +3083,67 @@ def rerank_results(
         row["_authority_reason"] = authority_reason
         row["_age_years"] = age_years
         row["_source_priority_contrib"] = source_priority_contrib
-        row["_final_score"] = final
 
-    results.sort(
-        key=lambda x: (
+    first_stage = _weighted_column_sum(
+        [
+            lexical_weight,
+            thesis_bonus_weight,
+            0.0 if procedural_intent else -procedural_penalty_weight,
+            authority_weight,
+            rrf_weight,
+            1.0,
+        ],
+        [lexical_col, thesis_col, procedural_col, authority_col, rrf_col, offset_col],
+    )
+    for row, score in zip(results, first_stage):
+        row["_first_stage_score"] = score
+
+    # Cascata: o reranker semantico (cross-encoder/Gemini, a etapa cara) so pontua os
+    # melhores candidatos da primeira etapa; o restante sai do ranking.
+    semantic_pool = max(RERANK_SEMANTIC_POOL, 2 * max(1, int(top_k))) if RERANK_SEMANTIC_POOL > 0 else 0
+    if 0 < semantic_pool < size:
+        keep = sorted(range(size), key=first_stage.__getitem__, reverse=True)[:semantic_pool]
+        keep.sort()
+        results = [results[i] for i in keep]
+        first_stage = [first_stage[i] for i in keep]
+        recency_col = [recency_col[i] for i in keep]
+
+    semantic_raw, semantic_backend = compute_semantic_scores(
+        query,
+        results,
+        reranker_backend=reranker_backend,
+        gemini_rerank_model=str(cfg.get("gemini_rerank_model", GEMINI_RERANK_MODEL) or GEMINI_RERANK_MODEL),
+    )
+    semantic_norm = min_max_scale(semantic_raw)
+
+    for idx, row in enumerate(results):
+        recency_contrib = 0.0
+        if prefer_recent:
+            if recency_intent:
+                recency_contrib = recency_weight * recency_col[idx]
+            elif semantic_norm[idx] >= recency_min_semantic_gate:
+                recency_contrib = min(recency_weight * recency_col[idx], recency_max_contribution)
+        row["_semantic_raw"] = semantic_raw[idx]
+        row["_semantic_score"] = semantic_norm[idx]
+        row["_semantic_backend"] = semantic_backend
+        row["_recency_contrib"] = recency_contrib
+        row["_final_score"] = first_stage[idx] + semantic_weight * semantic_norm[idx] + recency_contrib
+
+    def rank_key(x: dict) -> tuple[float, float, float, float, float]:
+        return (
             x.get("_final_score", 0.0),
             x.get("_authority_score", 0.0),
             x.get("_thesis_score", 0.0),
             x.get("_semantic_score", 0.0),
             x.get("_lexical_score", 0.0),
-        ),
-        reverse=True,
-    )
+        )
+
     if bool(cfg.get("rerank_dedup_process", RERANK_DEDUP_PROCESS)):
+        # A deduplicacao pode pular varios candidatos e completar com o restante: ordem total.
+        results.sort(key=rank_key, reverse=True)
         return _dedupe_ranked_results(results, top_k=top_k)
-    return results[:top_k]
+    # Sem dedup basta selecionar o top-k (O(N log k)); mesma ordem e desempates do sort.
+    return heapq.nlargest(top_k, results, key=rank_key)
 
 
 def _truncate_text(value: str, max_chars: int) -> str:
@@ -2668,8 +3170,7 @@ def _extract_labeled_line(text: str, labels: tuple[str, ...]) -> str:
 
 def _extract_normative_statement(row: dict, max_chars: int = 260) -> str:
     tipo = (row.get("tipo") or "").strip().lower()
-    busca = clean_retrieved_text(row.get("texto_busca", "") or "")
-    integral = clean_retrieved_text(row.get("texto_integral", "") or "")
+    busca, integral = _clean_row_texts(row)
     joined_text = f"{busca}\n{integral}".strip()
     corpus_norm = normalize_text(f"{row.get('processo', '')}\n{joined_text}")
     meta = _parse_metadata_extra(row.get("metadata_extra", ""))
@@ -2755,10 +3256,9 @@ def _extract_context_passages(
     context_max_passage_chars: int = CONTEXT_MAX_PASSAGE_CHARS,
     context_max_doc_chars: int = CONTEXT_MAX_DOC_CHARS,
 ) -> list[str]:
-    busca = clean_retrieved_text(row.get("texto_busca", "") or "")
-    integral = clean_retrieved_text(row.get("texto_integral", "") or "")
-    query_tokens = [t for t in normalize_tokens(query) if t not in LEGAL_STOP_TOKENS]
-    query_tokens = query_tokens or normalize_tokens(query)
+    busca, integral = _clean_row_texts(row)
+    # Mesmos tokens (sem stopwords, ou todos se so houver stopwords) ja tokenizados por consulta.
+    query_tokens = _query_token_pattern(query)[0]
 
     selected: list[str] = []
     seen: set[str] = set()
@@ -2774,9 +3274,9 @@ def _extract_context_passages(
     scored: list[tuple[float, str]] = []
     for p in candidates:
         p_norm = normalize_text(p)
-        query_hits = sum(1 for t in set(query_tokens) if t and t in p_norm)
-        thesis_signal = keyword_density(p, THESIS_SIGNAL_TERMS)
-        procedural_signal = keyword_density(p, PROCEDURAL_SIGNAL_TERMS)
+        query_hits = sum(1 for t in query_tokens if t in p_norm)
+        thesis_signal = keyword_density(p_norm, THESIS_SIGNAL_TERMS, normalized=True)
+        procedural_signal = keyword_density(p_norm, PROCEDURAL_SIGNAL_TERMS, normalized=True)
         score = (1.20 * query_hits) + (1.80 * thesis_signal) + (0.80 * procedural_signal)
         if score > 0:
             scored.append((score, p))
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import base64
+import gc
 import importlib
 import io
 import json
@@ -8,6 +10,7 @@ import sys
 import threading
 import time
 import types
+import weakref
 from pathlib import Path
 
 import pytest
@@ -146,6 +149,7 @@ def _load_backend_with_stub():
     stub.explain_answer = explain_answer
     stub.orgao_label = orgao_label
     stub.type_label = type_label
+    stub.warm_up_reranker_async = lambda: None
     stub.get_rag_tuning_defaults = get_rag_tuning_defaults
     stub.get_rag_tuning_schema = get_rag_tuning_schema
     stub.has_gemini_api_key = has_gemini_api_key
@@ -184,6 +188,43 @@ def test_health_contract():
     assert "rag_tuning" in payload["defaults"]
 
 
+def test_health_defaults_are_memoized_until_tts_config_changes():
+    backend_main = _load_backend_with_stub()
+    calls = {"count": 0}
+    original_defaults = backend_main.get_rag_tuning_defaults
+
+    def counting_defaults():
+        calls["count"] += 1
+        return original_defaults()
+
+    backend_main.get_rag_tuning_defaults = counting_defaults
+    backend_main._health_defaults.cache_clear()
+    client = TestClient(backend_main.app)
+
+    client.get("/health")
+    client.get("/health")
+    assert calls["count"] == 1
+
+    response = client.post("/api/tts/config", json={"provider": "legacy_google"})
+    assert response.status_code == 200
+    payload = client.get("/health").json()
+    assert calls["count"] == 2
+    assert payload["defaults"]["tts_provider"] == "legacy_google"
+
+
+def test_pymupdf_is_loaded_lazily_on_first_pdf_use():
+    backend_main = _load_backend_with_stub()
+    client = TestClient(backend_main.app)
+
+    assert client.get("/health").status_code == 200
+    assert backend_main.fitz is None
+    assert backend_main._FITZ_IMPORT_ATTEMPTED is False
+
+    fake_fitz = types.SimpleNamespace(csGRAY="gray")
+    backend_main.fitz = fake_fitz
+    assert backend_main._get_fitz() is fake_fitz
+
+
 def test_query_contract_serialization():
     backend_main = _load_backend_with_stub()
 
@@ -642,6 +683,51 @@ def test_meu_acervo_index_job_status_returns_404_for_unknown_job():
     assert response.status_code == 404
 
 
+def test_user_acervo_jobs_evict_expired_finished_jobs_on_insert():
+    backend_main = _load_backend_with_stub()
+
+    done_id = backend_main._new_user_acervo_job(
+        source_id="banco_1", source_label="Banco 1", accepted_files=1, skipped_files=0
+    )
+    running_id = backend_main._new_user_acervo_job(
+        source_id="banco_1", source_label="Banco 1", accepted_files=1, skipped_files=0
+    )
+    backend_main._update_user_acervo_job(done_id, status="done")
+    backend_main.USER_ACERVO_INDEX_JOB_TTL_SECONDS = -1
+
+    new_id = backend_main._new_user_acervo_job(
+        source_id="banco_1", source_label="Banco 1", accepted_files=1, skipped_files=0
+    )
+
+    assert backend_main._get_user_acervo_job_payload(done_id) is None
+    assert backend_main._get_user_acervo_job_payload(running_id) is not None
+    assert backend_main._get_user_acervo_job_payload(new_id) is not None
+
+
+def test_user_acervo_jobs_cap_keeps_running_jobs_and_rejects_when_full():
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_INDEX_JOB_MAX_ENTRIES = 2
+
+    def new_job():
+        return backend_main._new_user_acervo_job(
+            source_id="banco_1", source_label="Banco 1", accepted_files=1, skipped_files=0
+        )
+
+    running_id = new_job()
+    done_id = new_job()
+    backend_main._update_user_acervo_job(done_id, status="done")
+
+    new_id = new_job()
+    assert backend_main._get_user_acervo_job_payload(done_id) is None
+    assert backend_main._get_user_acervo_job_payload(running_id) is not None
+    assert backend_main._get_user_acervo_job_payload(new_id) is not None
+
+    with pytest.raises(backend_main.HTTPException) as excinfo:
+        new_job()
+    assert excinfo.value.status_code == 429
+    assert backend_main._get_user_acervo_job_payload(running_id) is not None
+
+
 def test_user_acervo_clean_has_hard_timeout_fallback():
     backend_main = _load_backend_with_stub()
     backend_main._run_with_hard_timeout = lambda **_kwargs: (_ for _ in ()).throw(TimeoutError("timeout hard"))
@@ -654,6 +740,709 @@ def test_user_acervo_clean_has_hard_timeout_fallback():
     assert elapsed < 2.0
 
 
+def test_user_acervo_clean_heuristic_drops_noise_lines_and_keeps_content():
+    backend_main = _load_backend_with_stub()
+    raw = "Pagina 3\nTribunal de Justica do Estado\nConforme o art   5 da CF\n12\nAssinado digitalmente por X"
+
+    out = backend_main._clean_user_chunk_heuristic(raw)
+
+    assert "Conforme o art 5 da CF" in out
+    assert "Pagina 3" not in out
+    assert "Tribunal" not in out
+    assert "12" not in out
+    assert "Assinado" not in out
+
+
+def test_user_acervo_chunk_stream_matches_joined_text_split():
+    backend_main = _load_backend_with_stub()
+    pages = ["[PAGINA 1]\nPrimeiro paragrafo.\n\nSegundo paragrafo.", "[PAGINA 2]\n" + ("x" * 90)]
+
+    streamed = list(backend_main._iter_user_text_chunks(iter(pages), max_chars=40))
+
+    assert streamed == backend_main._split_user_text_chunks("\n\n".join(pages), max_chars=40)
+    assert all(len(chunk) <= 40 for chunk in streamed)
+
+
+def test_user_acervo_pdf_pages_run_ocr_concurrently_and_keep_page_order():
+    backend_main = _load_backend_with_stub()
+
+    class _FakePixmap:
+        def __init__(self, idx):
+            self.idx = idx
+
+        def tobytes(self, _fmt, **_kwargs):
+            return str(self.idx).encode("ascii")
+
+    class _FakePage:
+        def __init__(self, idx):
+            self.idx = idx
+
+        def get_text(self, _mode):
+            return "texto nativo" if self.idx == 1 else ""
+
+        def get_pixmap(self, **_kwargs):
+            return _FakePixmap(self.idx)
+
+    class _FakeDoc:
+        def __len__(self):
+            return 4
+
+        def load_page(self, idx):
+            return _FakePage(idx)
+
+        def close(self):
+            pass
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_ocr(image_bytes, _mime_type="image/png"):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05 * (4 - int(image_bytes)))
+        with lock:
+            active["now"] -= 1
+        return f"ocr {image_bytes.decode()}"
+
+    backend_main._require_user_acervo_runtime = lambda: None
+    backend_main.fitz = types.SimpleNamespace(open=lambda _path: _FakeDoc())
+    backend_main._ocr_page_image_with_gemini = fake_ocr
+    backend_main.USER_ACERVO_OCR_CONCURRENCY = 4
+    backend_main.USER_ACERVO_OCR_BATCH_SIZE = 1
+
+    stats: dict[str, int] = {}
+    pages = list(backend_main._iter_pdf_pages_with_optional_ocr(Path("fake.pdf"), True, stats))
+
+    assert pages == [
+        "[PAGINA 1]\nocr 0",
+        "[PAGINA 2]\ntexto nativo",
+        "[PAGINA 3]\nocr 2",
+        "[PAGINA 4]\nocr 3",
+    ]
+    assert stats == {"pages_total": 4, "pages_with_text": 4, "pages_with_ocr": 3}
+    assert active["peak"] > 1
+
+
+def test_user_acervo_pdf_page_pixmaps_are_released_before_yield():
+    backend_main = _load_backend_with_stub()
+    alive: weakref.WeakSet[object] = weakref.WeakSet()
+
+    class _FakePixmap:
+        def tobytes(self, _fmt, **_kwargs):
+            return b"img"
+
+    class _FakePage:
+        def get_text(self, _mode):
+            return ""
+
+        def get_pixmap(self, **_kwargs):
+            pix = _FakePixmap()
+            alive.add(pix)
+            return pix
+
+    class _FakeDoc:
+        def __len__(self):
+            return 3
+
+        def load_page(self, _idx):
+            return _FakePage()
+
+        def close(self):
+            pass
+
+    backend_main._require_user_acervo_runtime = lambda: None
+    backend_main.fitz = types.SimpleNamespace(open=lambda _path: _FakeDoc())
+    backend_main._ocr_page_image_with_gemini = lambda _image, _mime="image/png": "ocr"
+    backend_main.USER_ACERVO_OCR_CONCURRENCY = 1
+    backend_main.USER_ACERVO_OCR_BATCH_SIZE = 1
+
+    pages = backend_main._iter_pdf_pages_with_optional_ocr(Path("fake.pdf"), True, {})
+    assert next(pages) == "[PAGINA 1]\nocr"
+    gc.collect()
+    assert len(alive) == 0
+    pages.close()
+
+
+def test_user_acervo_ocr_batch_splits_marked_pages_and_retries_missing_ones():
+    backend_main = _load_backend_with_stub()
+    captured: dict[str, object] = {}
+
+    class _Models:
+        def generate_content(self, **kwargs):
+            captured["contents"] = kwargs.get("contents")
+            return types.SimpleNamespace(text="[[PAGE_1]]\nprimeira\n[[/PAGE_1]]\n[[PAGE_3]] terceira [[/PAGE_3]]")
+
+    backend_main.get_gemini_client = lambda: types.SimpleNamespace(models=_Models())
+    backend_main._run_with_hard_timeout = lambda **kwargs: kwargs["operation"]()
+    backend_main._ocr_page_image_with_gemini = lambda image_bytes, mime_type: f"avulso {image_bytes.decode()}"
+
+    texts = backend_main._ocr_page_image_batch_with_gemini([(0, b"a"), (1, b"b"), (2, b"c")], "image/jpeg")
+
+    assert texts == {0: "primeira", 1: "avulso b", 2: "terceira"}
+    assert len(captured["contents"]) == 7
+    assert captured["contents"][2].inline_data.mime_type == "image/jpeg"
+
+
+def test_user_acervo_embed_cache_skips_remote_calls_for_known_chunks(tmp_path):
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_EMBED_CACHE_PATH = tmp_path / "embed_cache.sqlite3"
+    backend_main.USER_ACERVO_EMBED_CACHE_ENABLED = True
+    remote_calls: list[list[str]] = []
+
+    def fake_remote(chunks):
+        remote_calls.append(list(chunks))
+        return [[float(len(chunk))] * backend_main.USER_ACERVO_EMBED_DIM for chunk in chunks]
+
+    backend_main._embed_user_chunks_remote = fake_remote
+
+    first = backend_main._embed_user_chunks(["aa", "bbb"])
+    second = backend_main._embed_user_chunks(["bbb", "cccc", "aa"])
+
+    assert remote_calls == [["aa", "bbb"], ["cccc"]]
+    assert second.dtype == backend_main.np.float32
+    assert second.shape == (3, backend_main.USER_ACERVO_EMBED_DIM)
+    assert second[0].tolist() == first[1].tolist()
+    assert second[2].tolist() == first[0].tolist()
+    assert second[1][0] == 4.0
+
+
+def test_user_acervo_embed_cache_evicts_least_recently_used_rows(tmp_path, monkeypatch):
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_EMBED_CACHE_PATH = tmp_path / "embed_cache.sqlite3"
+    backend_main.USER_ACERVO_EMBED_CACHE_ENABLED = True
+    backend_main.USER_ACERVO_EMBED_CACHE_MAX_ROWS = 2
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(backend_main.time, "time", lambda: clock["now"])
+    remote_calls: list[list[str]] = []
+
+    def fake_remote(chunks):
+        remote_calls.append(list(chunks))
+        return [[float(len(chunk))] * backend_main.USER_ACERVO_EMBED_DIM for chunk in chunks]
+
+    backend_main._embed_user_chunks_remote = fake_remote
+
+    backend_main._embed_user_chunks(["aa"])
+    clock["now"] += 1
+    backend_main._embed_user_chunks(["bbb"])
+    clock["now"] += 1
+    backend_main._embed_user_chunks(["aa"])  # hit: "aa" passa a ser o uso mais recente
+    clock["now"] += 1
+    backend_main._embed_user_chunks(["cccc"])  # excede o limite e remove "bbb"
+    clock["now"] += 1
+    backend_main._embed_user_chunks(["aa", "bbb"])
+
+    assert remote_calls == [["aa"], ["bbb"], ["cccc"], ["bbb"]]
+    rows = backend_main._USER_ACERVO_EMBED_CACHE_CONN.execute("SELECT COUNT(*) FROM embed_cache").fetchone()[0]
+    assert rows == 2
+
+
+def test_user_acervo_embed_deduplicates_identical_chunks_before_remote_call(tmp_path):
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_EMBED_CACHE_ENABLED = False
+    remote_calls: list[list[str]] = []
+
+    def fake_remote(chunks):
+        remote_calls.append(list(chunks))
+        return [[float(len(chunk))] * 3 for chunk in chunks]
+
+    backend_main._embed_user_chunks_remote = fake_remote
+
+    vectors = backend_main._embed_user_chunks(["cabecalho", "corpo", "cabecalho"])
+
+    assert remote_calls == [["cabecalho", "corpo"]]
+    assert vectors.tolist() == [[9.0] * 3, [5.0] * 3, [9.0] * 3]
+
+
+def test_user_acervo_embed_batches_run_in_parallel_and_keep_order():
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_EMBED_BATCH_SIZE = 2
+    backend_main.USER_ACERVO_EMBED_PARALLELISM = 3
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_batch(batch):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05 if batch[0] == "c0" else 0.01)
+        with lock:
+            active["now"] -= 1
+        return [[float(chunk[1:])] for chunk in batch]
+
+    backend_main._embed_user_chunk_batch = fake_batch
+
+    vectors = backend_main._embed_user_chunks_remote([f"c{i}" for i in range(6)])
+
+    assert vectors.tolist() == [[0.0], [1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert active["peak"] > 1
+
+
+class _FakeUserTable:
+    def __init__(self):
+        self.merged: list[list[dict]] = []
+        self.fts_builds = 0
+
+    def count_rows(self):
+        raise AssertionError("upsert must not scan the table to count rows")
+
+    def merge_insert(self, _key):
+        table = self
+
+        class _Builder:
+            def when_matched_update_all(self):
+                return self
+
+            def when_not_matched_insert_all(self):
+                return self
+
+            def execute(self, records):
+                table.merged.append(list(records))
+                return types.SimpleNamespace(num_inserted_rows=len(records) - 1, num_updated_rows=1)
+
+        return _Builder()
+
+    def create_fts_index(self, *_args, **_kwargs):
+        self.fts_builds += 1
+
+
+def test_user_acervo_upsert_writes_in_bounded_batches():
+    backend_main = _load_backend_with_stub()
+    table = _FakeUserTable()
+    backend_main._open_user_table = lambda create_if_missing=False: table
+    backend_main.USER_ACERVO_UPSERT_BATCH_SIZE = 2
+
+    inserted = backend_main._upsert_user_records([{"doc_id": str(i)} for i in range(5)])
+
+    assert [len(batch) for batch in table.merged] == [2, 2, 1]
+    assert inserted == 2
+
+
+def test_user_acervo_records_convert_to_arrow_from_float32_vectors():
+    backend_main = _load_backend_with_stub()
+    backend_main._require_user_acervo_runtime = lambda: None
+    dim = backend_main.USER_ACERVO_EMBED_DIM
+    vectors = backend_main.np.arange(2 * dim, dtype=backend_main.np.float32).reshape(2, dim)
+
+    records = backend_main._build_user_acervo_record_batch(
+        cleaned_batch=["primeiro", "segundo"],
+        vectors=vectors,
+        batch_start=0,
+        total_chunks=2,
+        source_id="user:teste",
+        source_label="Teste",
+        filename="a.pdf",
+        digest="f" * 64,
+        ocr_missing_only=True,
+    )
+    table = backend_main._user_records_to_arrow(records)
+
+    assert table.schema == backend_main._user_lance_schema()
+    assert table.num_rows == 2
+    assert table.column("vector")[1].values.to_numpy().tolist() == vectors[1].tolist()
+    assert table.column("doc_id").to_pylist() == [record["doc_id"] for record in records]
+
+
+def test_user_acervo_existing_hashes_query_only_uploaded_digests():
+    backend_main = _load_backend_with_stub()
+    captured: dict[str, object] = {}
+    known = "a" * 64
+
+    class _Query:
+        def where(self, clause):
+            captured["where"] = clause
+            return self
+
+        def select(self, columns):
+            captured["select"] = columns
+            return self
+
+        def limit(self, value):
+            captured["limit"] = value
+            return self
+
+        def to_list(self):
+            return [{"doc_sha256": known}, {"doc_sha256": known}]
+
+    class _Table:
+        def search(self):
+            return _Query()
+
+        def to_list(self):
+            raise AssertionError("must not scan the whole table")
+
+    backend_main._open_user_table = lambda create_if_missing=False: _Table()
+
+    found = backend_main._existing_hashes_for_source("user:o'brien", digests=[known, "B" * 64, "not-a-hash", ""])
+
+    assert found == {known}
+    assert captured["where"] == f"source_id = 'user:o''brien' AND doc_sha256 IN ('{known}', '{'b' * 64}')"
+    assert captured["select"] == ["doc_sha256"]
+    assert backend_main._existing_hashes_for_source("user:x", digests=["x"]) == set()
+
+
+def test_user_acervo_fts_rebuild_is_deferred_until_threshold_or_job_end():
+    backend_main = _load_backend_with_stub()
+    table = _FakeUserTable()
+    backend_main._open_user_table = lambda create_if_missing=False: table
+    backend_main.USER_ACERVO_FTS_REBUILD_ROWS = 4
+
+    backend_main._upsert_user_records([{"doc_id": "a"}, {"doc_id": "b"}])
+    assert table.fts_builds == 0
+
+    backend_main._upsert_user_records([{"doc_id": "c"}, {"doc_id": "d"}])
+    assert table.fts_builds == 1
+
+    backend_main._upsert_user_records([{"doc_id": "e"}])
+    backend_main._flush_user_fts_index()
+    assert table.fts_builds == 2
+
+    backend_main._flush_user_fts_index()
+    assert table.fts_builds == 2
+
+
+def test_user_acervo_vector_index_is_built_once_above_row_threshold():
+    backend_main = _load_backend_with_stub()
+    built: list[dict] = []
+
+    class _Table:
+        rows = 10
+        indices: list = []
+
+        def list_indices(self):
+            return self.indices
+
+        def count_rows(self):
+            return self.rows
+
+        def create_index(self, **kwargs):
+            built.append(kwargs)
+            self.indices = [types.SimpleNamespace(columns=["vector"], index_type="IVF_HNSW_SQ")]
+
+    table = _Table()
+    backend_main.USER_ACERVO_VECTOR_INDEX_MIN_ROWS = 100
+
+    assert backend_main._maybe_build_user_vector_index(table) is False
+    table.rows = 100
+    assert backend_main._maybe_build_user_vector_index(table) is True
+    assert built[0]["index_type"] == "IVF_HNSW_SQ" and built[0]["metric"] == "l2"
+    assert backend_main._maybe_build_user_vector_index(table) is False
+    assert len(built) == 1
+
+
+def test_user_acervo_vector_index_optimize_is_serialized_with_upserts():
+    backend_main = _load_backend_with_stub()
+    backend_main.USER_ACERVO_VECTOR_INDEX_MIN_ROWS = 100
+    backend_main.USER_ACERVO_FTS_REBUILD_ROWS = 100
+    optimizing = threading.Event()
+    release = threading.Event()
+    overlaps: list[bool] = []
+
+    class _IndexedTable(_FakeUserTable):
+        def __init__(self):
+            super().__init__()
+            self.optimize_running = False
+
+        def list_indices(self):
+            return [types.SimpleNamespace(columns=["vector"], index_type="IVF_HNSW_SQ")]
+
+        def optimize(self):
+            self.optimize_running = True
+            optimizing.set()
+            assert release.wait(2.0)
+            self.optimize_running = False
+
+        def merge_insert(self, key):
+            overlaps.append(self.optimize_running)
+            return super().merge_insert(key)
+
+    table = _IndexedTable()
+    backend_main._open_user_table = lambda create_if_missing=False: table
+    backend_main._maybe_build_user_vector_index = lambda _tbl: pytest.fail("index already exists")
+
+    with backend_main._USER_ACERVO_WRITE_LOCK:
+        backend_main._upsert_user_records([{"doc_id": "a"}])
+
+    def upsert():
+        with backend_main._USER_ACERVO_WRITE_LOCK:
+            backend_main._upsert_user_records([{"doc_id": "b"}])
+
+    flusher = threading.Thread(target=backend_main._flush_user_fts_index)
+    flusher.start()
+    assert optimizing.wait(2.0)
+    writer = threading.Thread(target=upsert)
+    writer.start()
+    time.sleep(0.05)
+    assert len(table.merged) == 1  # o upsert espera o optimize liberar o lock de escrita
+    release.set()
+    flusher.join(2.0)
+    writer.join(2.0)
+
+    assert len(table.merged) == 2
+    assert overlaps == [False, False]
+
+
+def test_user_acervo_vector_index_is_built_outside_write_lock():
+    backend_main = _load_backend_with_stub()
+    table = _FakeUserTable()
+    backend_main._open_user_table = lambda create_if_missing=False: table
+    backend_main.USER_ACERVO_FTS_REBUILD_ROWS = 100
+    lock_held: list[bool] = []
+
+    def fake_build(tbl):
+        lock_held.append(backend_main._USER_ACERVO_WRITE_LOCK.locked())
+        return True
+
+    backend_main._maybe_build_user_vector_index = fake_build
+    backend_main._upsert_user_records([{"doc_id": "a"}])
+    backend_main._flush_user_fts_index()
+
+    assert lock_held == [False]
+
+
+def test_user_acervo_oversized_paragraph_splits_on_word_boundaries():
+    backend_main = _load_backend_with_stub()
+
+    chunks = backend_main._split_user_text_chunks("alpha beta gamma delta epsilon", max_chars=12)
+
+    assert chunks == ["alpha beta", "gamma delta", "epsilon"]
+
+
+def test_user_acervo_record_batch_emits_valid_metadata_per_chunk():
+    backend_main = _load_backend_with_stub()
+
+    records = backend_main._build_user_acervo_record_batch(
+        cleaned_batch=["primeiro", "segundo"],
+        vectors=[[0.1], [0.2]],
+        batch_start=32,
+        total_chunks=40,
+        source_id="banco_1",
+        source_label="Banco 1 \"aspas\"",
+        filename="peça.pdf",
+        digest="a" * 64,
+        ocr_missing_only=True,
+    )
+
+    assert [r["doc_id"] for r in records] == [f"banco_1:{'a' * 16}:33", f"banco_1:{'a' * 16}:34"]
+    meta = json.loads(records[1]["metadata_extra"])
+    assert meta["chunk_index"] == 34
+    assert meta["chunk_total"] == 40
+    assert meta["file_name"] == "peça.pdf"
+    assert meta["source_label"] == "Banco 1 \"aspas\""
+    assert records[0]["texto_integral"] == "primeiro"
+    assert records[0]["vector"] == [0.1]
+
+
+def test_user_acervo_clean_skips_llm_for_already_clean_chunks():
+    backend_main = _load_backend_with_stub()
+    calls: list[str] = []
+
+    def fake_timeout(**kwargs):
+        calls.append(kwargs["label"])
+        return types.SimpleNamespace(text="texto limpo pelo modelo")
+
+    backend_main._run_with_hard_timeout = fake_timeout
+
+    clean = backend_main._clean_user_chunk_with_flash("Trata-se de recurso especial interposto pela parte autora.")
+    noisy = backend_main._clean_user_chunk_with_flash("Recurso especial (fls. 12)\nPagina 3 de 40")
+
+    assert clean == "Trata-se de recurso especial interposto pela parte autora."
+    assert noisy == "texto limpo pelo modelo"
+    assert calls == ["acervo_clean_chunk"]
+
+
+def test_user_acervo_clean_cache_reuses_llm_output_but_not_fallbacks():
+    backend_main = _load_backend_with_stub()
+    backend_main._USER_ACERVO_CLEAN_CACHE.clear()
+    calls: list[str] = []
+    fail = {"value": True}
+
+    def fake_timeout(**kwargs):
+        calls.append(kwargs["label"])
+        if fail["value"]:
+            raise RuntimeError("resposta vazia do modelo")
+        return types.SimpleNamespace(text="Cabecalho limpo")
+
+    backend_main._run_with_hard_timeout = fake_timeout
+    chunk = "TRIBUNAL DE JUSTICA (fls. 12)"
+
+    first = backend_main._clean_user_chunk_with_flash(chunk)
+    fail["value"] = False
+    second = backend_main._clean_user_chunk_with_flash(chunk)
+    third = backend_main._clean_user_chunk_with_flash(chunk)
+
+    assert first == backend_main._clean_user_chunk_heuristic(chunk)
+    assert second == "Cabecalho limpo"
+    assert third == "Cabecalho limpo"
+    assert len(calls) == 2
+
+
+def test_jsonl_line_matches_stdlib_json_output():
+    backend_main = _load_backend_with_stub()
+    payload = {"event": "stage", "payload": {"texto": "acao rescisoria ç", 1: [1.5, None, True]}}
+
+    line = backend_main._jsonl_line(payload)
+
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert json.loads(line) == json.loads(json.dumps(payload, ensure_ascii=False))
+    assert "ç".encode("utf-8") in line
+
+    backend_main.orjson = None
+    assert json.loads(backend_main._jsonl_line(payload)) == json.loads(line)
+
+
+def test_tts_stream_endpoint_relays_worker_events_through_async_queue():
+    backend_main = _load_backend_with_stub()
+    backend_main._stream_tts_chunks = lambda *_args, **_kwargs: iter(
+        [(b"a1", "audio/wav", 1, 2), (b"a2", "audio/wav", 2, 2)]
+    )
+    client = TestClient(backend_main.app)
+
+    response = client.post("/api/tts/stream", json={"text": "texto para stream"})
+    assert response.status_code == 200
+
+    events = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    events = [item for item in events if item["event"] != "heartbeat"]
+    assert [item["event"] for item in events] == ["started", "chunk", "chunk", "done"]
+    assert [item["index"] for item in events if item["event"] == "chunk"] == [1, 2]
+    assert events[-1]["chunks_emitted"] == 2
+
+
+def test_runtime_error_classifier_keeps_rule_priority_and_and_conditions():
+    backend_main = _load_backend_with_stub()
+
+    status, detail = backend_main._classify_runtime_error(RuntimeError("timeout apos RESOURCE_EXHAUSTED"))
+    assert (status, detail["code"]) == (429, "quota_exhausted")
+
+    status, detail = backend_main._classify_runtime_error(RuntimeError("Model not found\nGEMINI_API_KEY ausente"))
+    assert (status, detail["code"]) == (400, "missing_api_key")
+
+    status, detail = backend_main._classify_runtime_error(RuntimeError("unsupported model"))
+    assert (status, detail["code"]) == (400, "model_unavailable")
+
+    status, detail = backend_main._classify_runtime_error(RuntimeError("boom"))
+    assert (status, detail["code"]) == (500, "internal_error")
+    detail["trace_id"] = "x"
+    assert "trace_id" not in backend_main._classify_runtime_error(RuntimeError("boom"))[1]
+
+
+def test_acervo_httpx_client_is_shared_across_timeouts():
+    backend_main = _load_backend_with_stub()
+
+    first = backend_main._get_acervo_httpx_client(45000)
+    second = backend_main._get_acervo_httpx_client(120000)
+
+    assert first is second
+    first.close()
+
+
+def test_query_response_cache_reuses_answer_until_corpus_changes():
+    backend_main = _load_backend_with_stub()
+    calls = {"count": 0}
+
+    def fake_run_query(**_kwargs):
+        calls["count"] += 1
+        return f"resposta {calls['count']}", [], {"n": calls["count"]}
+
+    backend_main.run_query = fake_run_query
+    client = TestClient(backend_main.app)
+    body = {"query": "dano moral bancario"}
+
+    first = client.post("/api/query", json=body).json()
+    second = client.post("/api/query", json=body).json()
+    traced = client.post("/api/query", json={**body, "trace": True}).json()
+    backend_main._QUERY_RESPONSE_CACHE.clear()
+    after_clear = client.post("/api/query", json=body).json()
+
+    assert first["answer"] == second["answer"] == "resposta 1"
+    assert traced["answer"] == "resposta 2"
+    assert after_clear["answer"] == "resposta 3"
+
+
+def test_query_response_cache_skips_failed_generation():
+    backend_main = _load_backend_with_stub()
+    backend_main._QUERY_RESPONSE_CACHE.clear()
+    calls = {"count": 0}
+
+    def fake_run_query(**_kwargs):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            return "Nao foi possivel gerar resposta.", [], {"generation": {"selected_model": ""}}
+        return "resposta valida", [], {"generation": {"selected_model": "gemini-3-flash-preview"}}
+
+    backend_main.run_query = fake_run_query
+    client = TestClient(backend_main.app)
+    body = {"query": "responsabilidade civil do estado"}
+
+    failed = client.post("/api/query", json=body).json()
+    retried = client.post("/api/query", json=body).json()
+    cached = client.post("/api/query", json=body).json()
+
+    assert failed["answer"] == "Nao foi possivel gerar resposta."
+    assert retried["answer"] == cached["answer"] == "resposta valida"
+    assert calls["count"] == 2
+
+
+def test_tts_response_cache_respects_byte_budget():
+    backend_main = _load_backend_with_stub()
+    cache = backend_main._ResponseCache(max_entries=10, max_bytes=10)
+
+    cache.put("a", b"123456", size=6)
+    cache.put("b", b"12345", size=5)
+    cache.put("huge", b"x" * 11, size=11)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == b"12345"
+    assert cache.get("huge") is None
+
+
+def test_acervo_gemini_call_retries_transient_errors_with_backoff(monkeypatch):
+    backend_main = _load_backend_with_stub()
+    sleeps: list[float] = []
+    monkeypatch.setattr(backend_main.time, "sleep", lambda seconds: sleeps.append(seconds))
+    backend_main.USER_ACERVO_RETRY_ATTEMPTS = 3
+    outcomes = [RuntimeError("429 RESOURCE_EXHAUSTED"), RuntimeError("503 UNAVAILABLE"), "ok"]
+
+    def fake_timeout(**_kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    backend_main._run_with_hard_timeout = fake_timeout
+
+    assert backend_main._run_acervo_gemini_call(label="t", timeout_ms=1000, operation=lambda: None) == "ok"
+    assert len(sleeps) == 2
+    assert 1.0 <= sleeps[0] <= 2.0
+    assert 2.0 <= sleeps[1] <= 3.0
+
+    backend_main._run_with_hard_timeout = lambda **_kwargs: (_ for _ in ()).throw(ValueError("payload invalido"))
+    with pytest.raises(ValueError):
+        backend_main._run_acervo_gemini_call(label="t", timeout_ms=1000, operation=lambda: None)
+    assert len(sleeps) == 2
+
+
+def test_acervo_token_bucket_waits_and_halves_rate_when_throttled(monkeypatch):
+    backend_main = _load_backend_with_stub()
+    clock = {"now": 100.0}
+    sleeps: list[float] = []
+
+    def fake_sleep(seconds):
+        sleeps.append(round(seconds, 3))
+        clock["now"] += seconds
+
+    monkeypatch.setattr(backend_main.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(backend_main.time, "sleep", fake_sleep)
+    bucket = backend_main._TokenBucket(rate_per_sec=2.0, burst=1)
+
+    bucket.acquire()
+    bucket.acquire()
+    bucket.throttle(60)
+    bucket.acquire()
+
+    assert sleeps == [0.5, 1.0]
+
+
 def test_meu_acervo_source_delete_and_restore_contract():
     backend_main = _load_backend_with_stub()
     backend_main._ensure_user_source("Banco 1")
@@ -711,6 +1500,300 @@ def test_legacy_tts_module_uses_api_key_header_instead_of_query_param():
     assert "?key=" not in legacy_source
 
 
+def test_legacy_tts_synthesizes_chunks_concurrently_and_joins_in_order(monkeypatch):
+    from backend import tts_legacy_google
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_request(*, ssml, config):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05 if ssml == "<c1>" else 0.01)
+        with lock:
+            active["now"] -= 1
+        return ssml.encode("ascii")
+
+    monkeypatch.setattr(tts_legacy_google, "_request_chunk_audio", fake_request)
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", max_concurrency=3, coalesce_chunks=False)
+    kwargs = dict(
+        text="c1 c2 c3 c4",
+        trace_id="t",
+        config=config,
+        normalize_for_tts=lambda text: text,
+        split_tts_chunks=lambda text, _max: text.split(),
+        build_ssml=lambda chunk: f"<{chunk}>",
+    )
+
+    audio, mime = tts_legacy_google.synthesize_legacy_google_tts(**kwargs)
+    parts = list(tts_legacy_google.synthesize_legacy_google_tts_iter(**kwargs))
+    streamed = list(tts_legacy_google.stream_legacy_google_tts_chunks(**kwargs))
+
+    assert (audio, mime) == (b"<c1><c2><c3><c4>", "audio/mpeg")
+    assert parts == [b"<c1>", b"<c2>", b"<c3>", b"<c4>"]
+    assert [(chunk, idx, total) for chunk, _mime, idx, total in streamed] == [
+        (b"<c1>", 1, 4),
+        (b"<c2>", 2, 4),
+        (b"<c3>", 3, 4),
+        (b"<c4>", 4, 4),
+    ]
+    assert active["peak"] > 1
+
+
+def test_legacy_tts_requests_share_a_pooled_session_with_post_retries():
+    from backend import tts_legacy_google
+
+    tts_legacy_google._SESSION = None
+    session = tts_legacy_google._get_session()
+    adapter = session.get_adapter("https://texttospeech.googleapis.com/v1/text:synthesize")
+
+    assert tts_legacy_google._get_session() is session
+    assert adapter.max_retries.total == 2
+    assert "POST" in adapter.max_retries.allowed_methods
+    assert 503 in adapter.max_retries.status_forcelist
+
+
+def test_legacy_tts_coalesces_small_chunks_up_to_ssml_limit(monkeypatch):
+    from backend import tts_legacy_google
+
+    sent = []
+    monkeypatch.setattr(
+        tts_legacy_google,
+        "_request_chunk_audio",
+        lambda *, ssml, config: sent.append(ssml) or b"a",
+    )
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", max_ssml_chars=24)
+
+    audio, _mime = tts_legacy_google.synthesize_legacy_google_tts(
+        text="um dois tres quatro cinco",
+        trace_id="t",
+        config=config,
+        normalize_for_tts=lambda text: text,
+        split_tts_chunks=lambda text, _max: text.split(),
+        build_ssml=lambda chunk: f"<speak>{chunk}</speak>",
+    )
+
+    assert sent == ["<speak>um dois</speak>", "<speak>tres</speak>", "<speak>quatro</speak>", "<speak>cinco</speak>"]
+    assert all(len(ssml) <= 24 for ssml in sent)
+    assert audio == b"aaaa"
+
+
+def test_legacy_tts_rejects_oversized_blocks_before_any_request(monkeypatch):
+    from backend import tts_legacy_google
+
+    monkeypatch.setattr(
+        tts_legacy_google,
+        "_request_chunk_audio",
+        lambda **_kwargs: pytest.fail("no request should be sent"),
+    )
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", max_ssml_chars=10)
+
+    with pytest.raises(RuntimeError, match=r"bloco SSML 3 com 14 bytes .* \(2 de 3 blocos acima do limite\)"):
+        tts_legacy_google._build_chunk_jobs(
+            chunks=["ok", "x" * 12, "y" * 14],
+            config=config,
+            build_ssml=lambda chunk: chunk,
+        )
+
+
+def test_legacy_tts_reuses_disk_cached_chunks(monkeypatch, tmp_path):
+    from backend import tts_legacy_google
+
+    calls = []
+
+    def fake_request(*, ssml, config):
+        calls.append(ssml)
+        return f"mp3:{ssml}".encode("ascii")
+
+    monkeypatch.setattr(tts_legacy_google, "_request_chunk_audio", fake_request)
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", cache_dir=str(tmp_path))
+    other_voice = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", cache_dir=str(tmp_path), pitch_semitones=0.0)
+
+    first, _ = tts_legacy_google._timed_chunk_audio("<speak>a</speak>", config)
+    second, _ = tts_legacy_google._timed_chunk_audio("<speak>a</speak>", config)
+    tts_legacy_google._timed_chunk_audio("<speak>a</speak>", other_voice)
+
+    assert first == second == b"mp3:<speak>a</speak>"
+    assert calls == ["<speak>a</speak>", "<speak>a</speak>"]
+    assert len(list(tmp_path.glob("*/*.mp3"))) == 2
+
+    tts_legacy_google._evict_chunk_cache(tmp_path, 1)
+    assert list(tmp_path.glob("*/*.mp3")) == []
+
+
+def test_legacy_tts_uses_per_thread_curl_handles_when_pycurl_is_available(monkeypatch):
+    from backend import tts_legacy_google
+
+    handles = []
+
+    class FakeCurlError(Exception):
+        pass
+
+    class FakeCurl:
+        def __init__(self):
+            self.options = {}
+            handles.append(self)
+
+        def setopt(self, option, value):
+            self.options[option] = value
+
+        def perform(self):
+            self.options["WRITEDATA"].write(b'{"audioContent": "YWJj"}')
+
+        def getinfo(self, _info):
+            return 200
+
+    shared: list = []
+
+    class FakeShare:
+        def setopt(self, _option, value):
+            shared.append(value)
+
+    fake_pycurl = types.SimpleNamespace(
+        Curl=FakeCurl,
+        CurlShare=FakeShare,
+        error=FakeCurlError,
+        **{
+            name: name
+            for name in (
+                "URL", "HTTPHEADER", "TIMEOUT_MS", "CONNECTTIMEOUT_MS", "WRITEDATA", "NOBODY", "POST",
+                "POSTFIELDS", "RESPONSE_CODE", "SHARE", "SH_SHARE", "TCP_KEEPALIVE", "HTTP_VERSION",
+                "CURL_HTTP_VERSION_2TLS", "LOCK_DATA_DNS", "LOCK_DATA_SSL_SESSION", "LOCK_DATA_CONNECT",
+            )
+        },
+    )
+    monkeypatch.setattr(tts_legacy_google, "pycurl", fake_pycurl)
+    monkeypatch.setattr(tts_legacy_google, "_CURL_LOCAL", threading.local())
+    monkeypatch.setattr(tts_legacy_google, "_CURL_SHARE", None)
+    monkeypatch.setattr(tts_legacy_google, "_get_http2_client", lambda: pytest.fail("curl path expected"))
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k")
+
+    first = tts_legacy_google._request_chunk_audio(ssml="<speak>a</speak>", config=config)
+    second = tts_legacy_google._request_chunk_audio(ssml="<speak>b</speak>", config=config)
+
+    assert first == second == b"abc"
+    assert len(handles) == 1
+    options = handles[0].options
+    assert "X-Goog-Api-Key: k" in options["HTTPHEADER"]
+    assert json.loads(options["POSTFIELDS"])["input"] == {"ssml": "<speak>b</speak>"}
+    assert options["HTTP_VERSION"] == "CURL_HTTP_VERSION_2TLS"
+    # Cache de conexoes nao e compartilhado entre handles de threads diferentes.
+    assert shared == ["LOCK_DATA_DNS", "LOCK_DATA_SSL_SESSION"]
+
+
+def test_legacy_tts_prewarms_connection_before_preparing_chunks(monkeypatch):
+    from backend import tts_legacy_google
+
+    warmed = threading.Event()
+    order = []
+
+    class FakeSession:
+        def head(self, url, timeout):
+            order.append(("head", url, timeout))
+            warmed.set()
+            return types.SimpleNamespace(close=lambda: None)
+
+    monkeypatch.setattr(tts_legacy_google, "pycurl", None)
+    monkeypatch.setattr(tts_legacy_google, "_get_http2_client", lambda: None)
+    monkeypatch.setattr(tts_legacy_google, "_get_session", lambda: FakeSession())
+    monkeypatch.setattr(tts_legacy_google, "_request_chunk_audio", lambda *, ssml, config: b"x")
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", prewarm=True)
+
+    def normalize(text):
+        assert warmed.wait(2.0)
+        return text
+
+    audio, _mime = tts_legacy_google.synthesize_legacy_google_tts(
+        text="a",
+        trace_id="t",
+        config=config,
+        normalize_for_tts=normalize,
+        split_tts_chunks=lambda text, _max: [text],
+        build_ssml=lambda chunk: chunk,
+    )
+
+    assert audio == b"x"
+    assert order == [("head", tts_legacy_google.DEFAULT_ENDPOINT, 2.0)]
+
+
+def test_legacy_tts_multiplexes_over_http2_client_when_available(monkeypatch):
+    import httpx
+
+    from backend import tts_legacy_google
+
+    calls = []
+
+    class FakeClient:
+        def post(self, url, **kwargs):
+            calls.append((url, kwargs["headers"], json.loads(kwargs["content"])))
+            status = 503 if len(calls) == 1 else 200
+            return httpx.Response(status, json={"audioContent": "YWJj"}, request=httpx.Request("POST", url))
+
+    monkeypatch.setattr(tts_legacy_google, "pycurl", None)
+    monkeypatch.setattr(tts_legacy_google, "httpx", httpx)
+    monkeypatch.setattr(tts_legacy_google, "_get_http2_client", lambda: FakeClient())
+    monkeypatch.setattr(tts_legacy_google, "_get_session", lambda: pytest.fail("should use http2 client"))
+    monkeypatch.setattr(tts_legacy_google.time, "sleep", lambda _seconds: None)
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k")
+
+    audio = tts_legacy_google._request_chunk_audio(ssml="<speak>a</speak>", config=config)
+
+    assert audio == b"abc"
+    assert len(calls) == 2
+    assert calls[-1][1] == {"X-Goog-Api-Key": "k", "Content-Type": "application/json"}
+    assert calls[-1][2]["input"] == {"ssml": "<speak>a</speak>"}
+
+
+def test_legacy_tts_decodes_audio_content_without_full_json_parse():
+    from backend import tts_legacy_google
+
+    body = b'{"audioContent": "YWJj", "audioConfig": {"audioEncoding": "MP3"}}'
+    escaped = b'{"timepoints": [], "audioContent":"YW\\/j"}'
+
+    assert tts_legacy_google._decode_audio_content(body) == b"abc"
+    assert tts_legacy_google._decode_audio_content(escaped) == base64.b64decode("YW/j")
+    with pytest.raises(RuntimeError, match="sem audioContent"):
+        tts_legacy_google._decode_audio_content(b'{"audioContent": ""}')
+    with pytest.raises(RuntimeError, match="sem audioContent"):
+        tts_legacy_google._decode_audio_content(b'{"audioContent": "  "}')
+    with pytest.raises(RuntimeError, match="audioContent invalido"):
+        tts_legacy_google._decode_audio_content(b'{"audioContent": "YWJ"}')
+
+
+def test_legacy_tts_error_detail_parses_body_bytes():
+    from backend import tts_legacy_google
+
+    def response(content):
+        # Sem atributo .text: o fallback tem de decodificar os bytes do corpo.
+        return types.SimpleNamespace(content=content)
+
+    assert tts_legacy_google._extract_error_detail(response(b'{"error": {"message": "quota"}}')) == "quota"
+    assert tts_legacy_google._extract_error_detail(response('["ação"]'.encode("utf-8"))) == '["ação"]'
+    assert tts_legacy_google._extract_error_detail(response("<html>erro ç</html>".encode("utf-8"))) == "<html>erro ç</html>"
+
+
+def test_legacy_tts_measures_ssml_bytes_without_reencoding_ascii():
+    from backend import tts_legacy_google
+
+    assert tts_legacy_google._utf8_len("<speak>abc</speak>") == 18
+    assert tts_legacy_google._utf8_len("ação") == len("ação".encode("utf-8"))
+    assert json.loads(tts_legacy_google._dumps_json({"ssml": "ação"})) == {"ssml": "ação"}
+
+
+def test_legacy_tts_request_body_splices_ssml_into_cached_payload_template():
+    from backend import tts_legacy_google
+
+    config = tts_legacy_google.LegacyGoogleTTSConfig(api_key="k", speaking_rate=1.1, pitch_semitones=-2.0)
+    body = tts_legacy_google._build_request_body('<speak>"ação"</speak>', config)
+
+    assert json.loads(body) == {
+        "input": {"ssml": '<speak>"ação"</speak>'},
+        "voice": {"languageCode": "pt-BR", "name": "pt-BR-Neural2-B"},
+        "audioConfig": {"audioEncoding": "MP3", "speakingRate": 1.1, "pitch": -2.0},
+    }
+
+
 def test_tts_dispatch_routes_to_gemini_provider_by_default():
     backend_main = _load_backend_with_stub()
     backend_main._synthesize_google_tts = lambda *_args, **_kwargs: (b"gemini-audio", "audio/wav")
@@ -857,6 +1940,16 @@ def test_tts_chunks_keep_ssml_under_google_5000_byte_limit():
         assert len(ssml.encode("utf-8")) <= backend_main.TTS_MAX_CHARS
 
 
+def test_ssml_byte_count_matches_built_ssml():
+    backend_main = _load_backend_with_stub()
+
+    for chunk in ["Art. 5", "ação & <reserva>", f"A {backend_main.TTS_MARK_ALT} B {backend_main.TTS_MARK_ART}", ""]:
+        ssml = backend_main._build_ssml(chunk)
+        assert ssml.startswith("<speak>") and ssml.endswith("</speak>")
+        assert backend_main._ssml_bytes(chunk) == len(ssml.encode("utf-8"))
+    assert "<break time='450ms'/>" in backend_main._build_ssml(backend_main.TTS_MARK_ALT)
+
+
 def test_rag_config_contract():
     backend_main = _load_backend_with_stub()
     client = TestClient(backend_main.app)
@@ -1,40 +1,34 @@
+import socket
 import sys
 import threading
 import time
+import types
 from pathlib import Path
 
-import requests
+from starlette.testclient import TestClient
 
-from desktop_launcher import QuietSimpleHTTPRequestHandler, _ensure_safe_stdio
+import desktop_launcher
+from desktop_launcher import _build_frontend_app, _ensure_safe_stdio, _is_port_busy, _wait_port
 
 
-def test_quiet_frontend_handler_serves_requests_when_stderr_is_none(tmp_path: Path):
+def test_frontend_app_serves_index_when_stderr_is_none(tmp_path: Path):
     frontend_dir = tmp_path / "frontend"
     frontend_dir.mkdir()
     (frontend_dir / "index.html").write_text("<html><body>ok</body></html>", encoding="utf-8")
+    (frontend_dir / "app.js").write_text("console.log('ok');", encoding="utf-8")
 
     old_stderr = sys.stderr
     sys.stderr = None
     try:
-        from http.server import ThreadingHTTPServer
-        from functools import partial
-
-        server = ThreadingHTTPServer(
-            ("127.0.0.1", 0),
-            partial(QuietSimpleHTTPRequestHandler, directory=str(frontend_dir)),
-        )
-        thread = threading.Thread(target=server.serve_forever, daemon=True)
-        thread.start()
-        time.sleep(0.2)
-
-        url = f"http://127.0.0.1:{server.server_port}/"
-        response = requests.get(url, timeout=5)
+        client = TestClient(_build_frontend_app(frontend_dir))
+        response = client.get("/")
+        script = client.get("/app.js")
 
         assert response.status_code == 200
         assert "ok" in response.text
+        assert script.status_code == 200
+        assert "javascript" in script.headers["content-type"]
     finally:
-        server.shutdown()
-        server.server_close()
         sys.stderr = old_stderr
 
 
@@ -60,3 +54,72 @@ def test_ensure_safe_stdio_wraps_broken_streams():
     finally:
         sys.stdout = old_stdout
         sys.stderr = old_stderr
+
+
+def test_wait_port_detects_listener_quickly_and_times_out_when_closed():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+
+    started = time.monotonic()
+    assert _wait_port("127.0.0.1", port, timeout_s=0.2) is False
+    assert time.monotonic() - started < 1.0
+
+    timer = threading.Timer(0.05, listener.listen)
+    timer.start()
+    try:
+        started = time.monotonic()
+        assert _wait_port("127.0.0.1", port, timeout_s=5) is True
+        assert time.monotonic() - started < 1.0
+    finally:
+        timer.cancel()
+        listener.close()
+
+
+def test_uvicorn_runtime_options_fall_back_without_optional_accelerators(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    monkeypatch.setitem(sys.modules, "httptools", None)
+    assert desktop_launcher._uvicorn_runtime_options() == {"loop": "asyncio", "http": "h11"}
+
+    monkeypatch.setitem(sys.modules, "uvloop", types.ModuleType("uvloop"))
+    monkeypatch.setitem(sys.modules, "httptools", types.ModuleType("httptools"))
+    monkeypatch.setattr(desktop_launcher.sys, "platform", "win32")
+    assert desktop_launcher._uvicorn_runtime_options() == {"loop": "asyncio", "http": "httptools"}
+
+
+def test_is_port_busy_detects_bound_socket_before_listen():
+    holder = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    holder.bind(("127.0.0.1", 0))
+    port = holder.getsockname()[1]
+    try:
+        assert _is_port_busy("127.0.0.1", port) is True
+    finally:
+        holder.close()
+
+    assert _is_port_busy("127.0.0.1", port) is False
+
+
+def test_ready_server_signals_event_once_listening(tmp_path: Path):
+    frontend_dir = tmp_path / "frontend"
+    frontend_dir.mkdir()
+    (frontend_dir / "index.html").write_text("ok", encoding="utf-8")
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    config = desktop_launcher.uvicorn.Config(
+        app=_build_frontend_app(frontend_dir),
+        host="127.0.0.1",
+        port=port,
+        log_level="warning",
+    )
+    server = desktop_launcher._ReadyServer(config)
+    worker = threading.Thread(target=server.run, daemon=True)
+    worker.start()
+    try:
+        assert desktop_launcher._wait_server_ready(server, worker, "127.0.0.1", port, timeout_s=10) is True
+        assert desktop_launcher._probe_port("127.0.0.1", port, 1.0) is True
+    finally:
+        server.should_exit = True
+        worker.join(timeout=5)
@@ -386,3 +386,11 @@ def test_stj_fix_common_ocr_glitches_normalizes_ministro_prefix_case() -> None:
     assert juris_update._stj_fix_common_ocr_glitches("min. Benedito Gonçalves") == "Min. Benedito Gonçalves"
     assert juris_update._stj_fix_common_ocr_glitches("ministra Nancy Andrighi") == "Ministra Nancy Andrighi"
     assert juris_update._stj_fix_common_ocr_glitches("ministro Humberto Martins") == "Ministro Humberto Martins"
+
+
+def test_juris_lance_schema_uses_shared_vector_type() -> None:
+    from rag.lance_schema import LANCE_VECTOR_TYPE
+
+    vector_type = juris_update._juris_lance_schema().field("vector").type
+    assert vector_type.value_type == LANCE_VECTOR_TYPE
+    assert vector_type.list_size == juris_update.EMBED_DIM
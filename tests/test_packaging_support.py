@@ -16,7 +16,8 @@ def test_backend_and_rag_support_project_root_override_for_exe_mode():
 def test_desktop_launcher_starts_backend_and_frontend_servers():
     launcher_py = _read("desktop_launcher.py")
 
-    assert "ThreadingHTTPServer" in launcher_py
+    assert "StaticFiles(directory=str(frontend_dir), html=True)" in launcher_py
+    assert "ThreadingHTTPServer" not in launcher_py
     assert "uvicorn" in launcher_py
     assert "webbrowser.open" in launcher_py
     assert "RATIO_PROJECT_ROOT" in launcher_py
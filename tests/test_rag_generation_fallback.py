@@ -285,3 +285,17 @@ def test_format_context_omits_internal_ranking_labels():
     assert "Forca normativa: Nivel" not in context
     assert "Papel no ranking:" not in context
     assert "Qualificacao do precedente:" in context
+
+
+def test_embed_query_caches_vectors_by_canonical_query(monkeypatch):
+    fake_client = _FakeEmbedClient()
+    monkeypatch.setattr(query_mod, "get_gemini_client", lambda: fake_client)
+    query_mod._embed_query_cached.cache_clear()
+
+    first = query_mod.embed_query("prescricao  intercorrente\n execucao fiscal")
+    second = query_mod.embed_query(" prescricao intercorrente execucao fiscal ")
+    first.append(9.9)
+
+    assert second == [0.25, 0.5, 0.75]
+    assert len(fake_client.models.configs) == 2
+    query_mod._embed_query_cached.cache_clear()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import importlib
+import math
 
 import pytest
 
@@ -9,6 +10,13 @@ rag_query = pytest.importorskip("rag.query", reason="requires full RAG runtime")
 rag_ingest = pytest.importorskip("rag.ingest", reason="requires ingest runtime")
 
 
+@pytest.fixture(autouse=True)
+def _no_embed_cache(monkeypatch):
+    monkeypatch.setattr(rag_ingest, "EMBED_CACHE_PATH", None)
+    # Os documentos de teste usam textos curtos.
+    monkeypatch.setattr(rag_ingest, "EMBED_MIN_CHARS", 1)
+
+
 class _FakeTable:
     def __init__(self, name: str) -> None:
         self.name = name
@@ -131,6 +139,53 @@ def test_ingest_routes_tjsp_to_isolated_table() -> None:
     assert rag_ingest.table_name_for_source("tjsp") == "tjsp_jurisprudencia"
 
 
+def _ingest_doc(doc_id: str, texto: str = "texto") -> "rag_ingest.Document":
+    return rag_ingest.Document(
+        doc_id=doc_id,
+        tribunal="STF",
+        tipo="sumula",
+        processo="",
+        relator="",
+        ramo_direito="",
+        data_julgamento="",
+        orgao_julgador="",
+        texto_busca=texto,
+        texto_integral=texto,
+        url="",
+        metadata_extra="{}",
+    )
+
+
+def test_embed_documents_runs_batches_concurrently_and_keeps_order(monkeypatch) -> None:
+    import threading
+    import time
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_embed_batch(texts):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05 if texts[0] == "d0" else 0.01)
+        with lock:
+            active["now"] -= 1
+        return [[1.0, float(text[1:])] for text in texts]
+
+    monkeypatch.setattr(rag_ingest, "embed_batch", fake_embed_batch)
+    monkeypatch.setattr(rag_ingest, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_ingest, "EMBED_CONCURRENCY", 3)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+    docs = [_ingest_doc(f"id{i}", f"d{i}") for i in range(7)]
+
+    records = rag_ingest.embed_documents(docs)
+
+    assert [record["doc_id"] for record in records] == [f"id{i}" for i in range(7)]
+    # Vetores saem normalizados; a razao entre componentes identifica o documento de origem.
+    assert [round(record["vector"][1] / record["vector"][0]) for record in records] == list(range(7))
+    assert active["peak"] > 1
+
+
 def test_resolve_query_sources_distinguishes_none_from_explicit_empty_list() -> None:
     native_default, user_default, resolved_default = rag_query._resolve_query_sources(None)
     assert native_default == ["ratio"]
@@ -193,3 +248,845 @@ def test_recent_timeline_reads_tjsp_table_alongside_ratio(monkeypatch: pytest.Mo
 
     assert fake_db.opened == ["jurisprudencia", "tjsp_jurisprudencia"]
     assert [row["tribunal"] for row in rows] == ["TJSP", "STF"]
+
+
+def test_pack_batches_respects_char_and_item_budgets() -> None:
+    docs = [
+        _ingest_doc("a", "x" * 40),
+        _ingest_doc("b", "x" * 40),
+        _ingest_doc("c", "x" * 30),
+        _ingest_doc("d", "x" * 500),
+        _ingest_doc("e", "x"),
+        _ingest_doc("f", "x"),
+        _ingest_doc("g", "x"),
+    ]
+
+    batches = rag_ingest.pack_batches(docs, max_chars=100, max_items=2)
+
+    assert [[doc.doc_id for doc in batch] for batch in batches] == [["a", "b"], ["c"], ["d"], ["e", "f"], ["g"]]
+
+
+def test_clean_legal_text_strips_html_keeping_line_and_list_markers() -> None:
+    raw = (
+        "<div><p>EMENTA: Recurso&nbsp;extraordinário.</p>"
+        "<ul><li>item um</li><li>item dois</li></ul>linha<br/>quebra</div>"
+        "\nSupremo Tribunal Federal\n\n\n\nfim"
+    )
+
+    assert rag_ingest.clean_legal_text(raw) == (
+        "EMENTA: Recurso\xa0extraordinário.\n- item um\n- item dois\nlinha\nquebra\n\nfim"
+    )
+    assert rag_ingest.clean_legal_text("a < b e c > d") == "a < b e c > d"
+    assert rag_ingest.clean_legal_text("") == ""
+    assert rag_ingest.clean_legal_text(None) == ""
+    assert rag_ingest.clean_legal_text("a\r\nb\rc &amp; d") == "a\nb\nc & d"
+
+
+def _write_acordaos_db(data_dir, count: int) -> None:
+    import sqlite3
+
+    db_dir = data_dir / "acordaos"
+    db_dir.mkdir(parents=True)
+    conn = sqlite3.connect(db_dir / "acordaos.db")
+    conn.execute(
+        "CREATE TABLE acordaos (id INTEGER, ementa TEXT, tese TEXT, indexacao TEXT, classe_sigla TEXT,"
+        " processo_numero TEXT, relator TEXT, ramo_direito TEXT, julgamento_data TEXT, orgao_julgador TEXT,"
+        " inteiro_teor_url TEXT, tese_tema TEXT, legislacao_citada TEXT, ai_tags TEXT, is_repercussao_geral INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO acordaos VALUES (?, ?, ?, '', 'RE', ?, 'Min. X', '', ?, 'Pleno', '', '', '', '', 0)",
+        [(i, f"<p>Ementa {i}</p>", f"Tese {i}", str(i), f"2024-01-{i + 1:02d}") for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_read_acordaos_transforms_rows_in_a_process_pool(monkeypatch, tmp_path) -> None:
+    _write_acordaos_db(tmp_path, 6)
+    monkeypatch.setattr(rag_ingest, "DATA_DIR", tmp_path)
+
+    monkeypatch.setattr(rag_ingest, "INGEST_FETCH_SIZE", 4)
+    monkeypatch.setattr(rag_ingest, "INGEST_WORKERS", 1)
+    serial = list(rag_ingest.read_acordaos())
+    monkeypatch.setattr(rag_ingest, "INGEST_WORKERS", 2)
+    monkeypatch.setattr(rag_ingest, "INGEST_PARALLEL_MIN_ROWS", 1)
+    parallel = list(rag_ingest.read_acordaos())
+
+    assert parallel == serial
+    assert [doc.doc_id for doc in parallel] == [f"stf-ac-{i}" for i in range(5, -1, -1)]
+    assert parallel[0].texto_busca == "Tese 5\nEmenta 5\n"
+
+
+def test_read_acordaos_streams_rows_lazily(monkeypatch, tmp_path) -> None:
+    _write_acordaos_db(tmp_path, 5)
+    monkeypatch.setattr(rag_ingest, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(rag_ingest, "INGEST_FETCH_SIZE", 2)
+    monkeypatch.setattr(rag_ingest, "INGEST_WORKERS", 1)
+    transformed = []
+    original = rag_ingest._row_to_acordao_doc
+    monkeypatch.setattr(
+        rag_ingest,
+        "_row_to_acordao_doc",
+        lambda row: transformed.append(row["id"]) or original(row),
+    )
+
+    docs = rag_ingest.read_acordaos()
+    assert transformed == []
+    first = next(docs)
+
+    assert first.doc_id == "stf-ac-4"
+    assert transformed == [4]
+    assert [doc.doc_id for doc in docs] == ["stf-ac-3", "stf-ac-2", "stf-ac-1", "stf-ac-0"]
+
+
+def test_embed_documents_consumes_an_iterator(monkeypatch) -> None:
+    monkeypatch.setattr(rag_ingest, "embed_batch", lambda texts: [[1.0] for _ in texts])
+    monkeypatch.setattr(rag_ingest, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    records = rag_ingest.embed_documents(_ingest_doc(f"id{i}") for i in range(5))
+
+    assert [record["doc_id"] for record in records] == [f"id{i}" for i in range(5)]
+
+
+def test_store_in_lancedb_accepts_streamed_record_batches(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(rag_ingest, "LANCE_DIR", tmp_path / "lance")
+    monkeypatch.setattr(rag_ingest, "embed_batch", lambda texts: [[0.5] * rag_ingest.EMBED_DIM for _ in texts])
+    monkeypatch.setattr(rag_ingest, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    batches = list(rag_ingest.embed_record_batches(_ingest_doc(f"id{i}", f"texto {i}") for i in range(3)))
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    assert batches[0].schema == rag_ingest.LANCE_SCHEMA
+
+    assert rag_ingest.store_in_lancedb(iter(batches), mode="overwrite") == 3
+    update = rag_ingest.embed_record_batches([_ingest_doc("id2", "novo"), _ingest_doc("id3", "outro")])
+    assert rag_ingest.store_in_lancedb(update, mode="append") == 4
+
+    rows = rag_ingest.lancedb.connect(str(tmp_path / "lance")).open_table("jurisprudencia").to_arrow().to_pylist()
+    assert {row["doc_id"]: row["texto_busca"] for row in rows}["id2"] == "novo"
+
+
+def test_coalesce_record_batches_regroups_small_batches(monkeypatch) -> None:
+    monkeypatch.setattr(rag_ingest, "embed_batch", lambda texts: [[0.1] * rag_ingest.EMBED_DIM for _ in texts])
+    monkeypatch.setattr(rag_ingest, "EMBED_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    small = list(rag_ingest.embed_record_batches(_ingest_doc(f"id{i}", f"texto {i}") for i in range(7)))
+    assert [batch.num_rows for batch in small] == [2, 2, 2, 1]
+
+    merged = list(rag_ingest._coalesce_record_batches(iter(small), target_rows=4))
+    assert [batch.num_rows for batch in merged] == [4, 3]
+    assert merged[0].schema == rag_ingest.LANCE_SCHEMA
+    assert merged[1].column("doc_id").to_pylist() == ["id4", "id5", "id6"]
+
+
+def test_store_in_lancedb_creates_table_with_concurrent_adds(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(rag_ingest, "LANCE_DIR", tmp_path / "lance")
+    monkeypatch.setattr(rag_ingest, "LANCE_WRITE_BATCH_ROWS", 2)
+    monkeypatch.setattr(rag_ingest, "LANCE_WRITE_CONCURRENCY", 3)
+    monkeypatch.setattr(rag_ingest, "embed_batch", lambda texts: [[0.2] * rag_ingest.EMBED_DIM for _ in texts])
+    monkeypatch.setattr(rag_ingest, "EMBED_BATCH_SIZE", 1)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    batches = rag_ingest.embed_record_batches(_ingest_doc(f"id{i}", f"texto {i}") for i in range(9))
+    assert rag_ingest.store_in_lancedb(batches, mode="overwrite") == 9
+
+    rows = rag_ingest.lancedb.connect(str(tmp_path / "lance")).open_table("jurisprudencia").to_arrow()
+    assert sorted(rows.column("doc_id").to_pylist()) == [f"id{i}" for i in range(9)]
+
+
+def test_embed_documents_dedups_texts_and_skips_blank(monkeypatch) -> None:
+    calls: list[list[str]] = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] * rag_ingest.EMBED_DIM for text in texts]
+
+    monkeypatch.setattr(rag_ingest, "embed_batch", fake_embed)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    docs = [
+        _ingest_doc("a", "ementa"),
+        _ingest_doc("b", "  "),
+        _ingest_doc("c", "ementa"),
+        _ingest_doc("d", "outra"),
+    ]
+    records = rag_ingest.embed_documents(docs)
+
+    assert calls == [["ementa", "outra"]]
+    assert [record["doc_id"] for record in records] == ["a", "c", "d"]
+    assert records[1]["vector"] == records[0]["vector"]
+
+
+def test_embed_documents_reuses_persistent_cache(monkeypatch, tmp_path) -> None:
+    calls: list[list[str]] = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[0.25] * rag_ingest.EMBED_DIM for _ in texts]
+
+    monkeypatch.setattr(rag_ingest, "EMBED_CACHE_PATH", tmp_path / "embed_cache.db")
+    monkeypatch.setattr(rag_ingest, "embed_batch", fake_embed)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    first = rag_ingest.embed_documents([_ingest_doc("a", "ementa"), _ingest_doc("b", "outra")])
+    second = rag_ingest.embed_documents([_ingest_doc("a", "ementa"), _ingest_doc("c", "nova")])
+
+    assert calls == [["ementa", "outra"], ["nova"]]
+    assert second[0]["vector"] == first[0]["vector"]
+    assert len(second[0]["vector"]) == rag_ingest.EMBED_DIM
+
+
+def test_record_batches_store_float16_vectors_searchable_with_float_query(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(rag_ingest, "LANCE_DIR", tmp_path / "lance")
+    monkeypatch.setattr(
+        rag_ingest,
+        "embed_batch",
+        lambda texts: [[1.0 if i == int(text[-1]) else 0.0 for i in range(rag_ingest.EMBED_DIM)] for text in texts],
+    )
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    batches = list(rag_ingest.embed_record_batches(_ingest_doc(f"id{i}", f"texto {i}") for i in range(3)))
+    assert batches[0].schema.field("vector").type == rag_ingest.pa.list_(rag_ingest.pa.float16(), rag_ingest.EMBED_DIM)
+    rag_ingest.store_in_lancedb(iter(batches), mode="overwrite")
+
+    tbl = rag_ingest.lancedb.connect(str(tmp_path / "lance")).open_table("jurisprudencia")
+    query = [0.0] * rag_ingest.EMBED_DIM
+    query[2] = 1.0
+    assert tbl.search(query).limit(1).to_list()[0]["doc_id"] == "id2"
+
+
+def test_json_dumps_text_matches_stdlib_payload_with_and_without_orjson(monkeypatch) -> None:
+    import json
+
+    payload = {"tema": "Ação rescisória", "ramos": ["Civil", "Processual"], "numero": 7, "obs": None}
+    assert json.loads(rag_ingest._json_dumps_text(payload)) == payload
+    assert "Ação" in rag_ingest._json_dumps_text(payload)
+
+    monkeypatch.setattr(rag_ingest, "orjson", None)
+    assert rag_ingest._json_dumps_text(payload) == json.dumps(payload, ensure_ascii=False)
+
+
+def test_read_stf_informativos_selects_columns_and_tolerates_missing_ones(monkeypatch, tmp_path) -> None:
+    import sqlite3
+
+    db = tmp_path / "informativos" / "informativos.db"
+    db.parent.mkdir()
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE informativos (id INTEGER, titulo TEXT, ementa TEXT, relator TEXT, julgamento_data TEXT,"
+        " orgao_julgador TEXT, inteiro_teor_url TEXT, informativo_numero INTEGER, informativo_titulo TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO informativos VALUES (1, 'RE 123', 'Ementa <b>x</b>', 'Min. A', '2024-01-01', 'Pleno', '', 1100, 'Info')"
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(rag_ingest, "DATA_DIR", tmp_path)
+
+    [doc] = rag_ingest.read_stf_informativos()
+
+    assert doc.doc_id == "stf-info-1"
+    assert doc.processo == "RE 123"
+    assert doc.texto_busca.strip() == "Ementa x"
+
+
+def test_clean_field_memoizes_short_field_cleaning() -> None:
+    rag_ingest.clean_field.cache_clear()
+    assert rag_ingest.clean_field(" Primeira Turma ") == "Primeira Turma"
+    assert rag_ingest.clean_field(" Primeira Turma ") == "Primeira Turma"
+    assert rag_ingest.clean_field("Min. <b>Fux</b>") == rag_ingest.clean_legal_text("Min. <b>Fux</b>")
+    assert rag_ingest.clean_field.cache_info().hits == 1
+
+
+def test_store_in_lancedb_updates_fts_index_incrementally_on_append(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(rag_ingest, "LANCE_DIR", tmp_path / "lance")
+    monkeypatch.setattr(rag_ingest, "embed_batch", lambda texts: [[0.3] * rag_ingest.EMBED_DIM for _ in texts])
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    rag_ingest.store_in_lancedb(
+        rag_ingest.embed_record_batches([_ingest_doc("a", "recurso extraordinario")]), mode="overwrite"
+    )
+    tbl = rag_ingest.lancedb.connect(str(tmp_path / "lance")).open_table("jurisprudencia")
+    assert rag_ingest._has_fts_index(tbl)
+    assert rag_ingest._has_index(tbl, "doc_id", "BTREE")
+
+    rebuilds: list[str] = []
+    original = type(tbl).create_fts_index
+    monkeypatch.setattr(type(tbl), "create_fts_index", lambda self, *a, **k: rebuilds.append("x") or original(self, *a, **k))
+    rag_ingest.store_in_lancedb(rag_ingest.embed_record_batches([_ingest_doc("b", "habeas corpus")]), mode="append")
+
+    assert rebuilds == []
+    tbl = rag_ingest.lancedb.connect(str(tmp_path / "lance")).open_table("jurisprudencia")
+    assert [row["doc_id"] for row in tbl.search("habeas", query_type="fts").limit(5).to_list()] == ["b"]
+
+
+def test_open_db_sets_read_pragmas(tmp_path) -> None:
+    import sqlite3
+
+    db = tmp_path / "src.db"
+    sqlite3.connect(db).close()
+    conn = rag_ingest.open_db(db)
+    try:
+        assert conn.row_factory is sqlite3.Row
+        assert conn.execute("PRAGMA query_only").fetchone()[0] == 1
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -rag_ingest.INGEST_SQLITE_CACHE_MB * 1024
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def test_record_batch_l2_normalizes_vectors_when_opted_in(monkeypatch) -> None:
+    monkeypatch.setattr(rag_ingest, "EMBED_L2_NORMALIZE", True)
+    dim = rag_ingest.EMBED_DIM
+    raw = [[3.0, 4.0] + [0.0] * (dim - 2), [0.0] * dim]
+    batch = rag_ingest._record_batch([_ingest_doc("a"), _ingest_doc("b")], raw)
+
+    vectors = batch.column("vector").to_pylist()
+    assert vectors[0][:2] == pytest.approx([0.6, 0.8], abs=1e-3)
+    assert vectors[1] == [0.0] * dim
+
+    monkeypatch.setattr(rag_ingest, "np", None)
+    assert rag_ingest._record_batch([_ingest_doc("a"), _ingest_doc("b")], raw).column("vector").to_pylist() == vectors
+
+
+def test_embed_documents_skips_near_empty_texts(monkeypatch) -> None:
+    calls: list[list[str]] = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[1.0] * rag_ingest.EMBED_DIM for _ in texts]
+
+    monkeypatch.setattr(rag_ingest, "EMBED_MIN_CHARS", 16)
+    monkeypatch.setattr(rag_ingest, "embed_batch", fake_embed)
+    monkeypatch.setattr(rag_ingest.random, "uniform", lambda _a, _b: 0.0)
+
+    docs = [_ingest_doc("a", "RE 123\n "), _ingest_doc("b", "Recurso extraordinario provido.")]
+    records = rag_ingest.embed_documents(docs)
+
+    assert calls == [["Recurso extraordinario provido."]]
+    assert [record["doc_id"] for record in records] == ["b"]
+
+
+def test_token_bucket_paces_requests_and_backs_off_on_penalty(monkeypatch) -> None:
+    clock = {"now": 100.0}
+    sleeps: list[float] = []
+
+    def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(rag_ingest.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(rag_ingest.time, "sleep", fake_sleep)
+
+    bucket = rag_ingest.TokenBucket(rpm=60)
+    for _ in range(60):
+        bucket.acquire()
+    assert sleeps == []
+    bucket.acquire()
+    assert sum(sleeps) == pytest.approx(1.0)
+
+    bucket.penalize(10.0)
+    assert bucket.scale == 0.5
+    before = clock["now"]
+    bucket.acquire()
+    assert clock["now"] - before >= 10.0
+
+    clock["now"] += rag_ingest.TokenBucket.RAMP_AFTER_S
+    bucket.acquire()
+    assert bucket.scale == pytest.approx(0.625)
+
+
+def test_embed_batch_with_retry_honours_rate_limit_retry_delay(monkeypatch) -> None:
+    calls = {"n": 0}
+    penalties: list[float] = []
+
+    def flaky_embed(texts):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED. Please retry in 7.5s.")
+        return [[1.0] for _ in texts]
+
+    limiter = rag_ingest.TokenBucket()
+    monkeypatch.setattr(limiter, "penalize", penalties.append)
+    monkeypatch.setattr(rag_ingest, "_embed_limiter", limiter)
+    monkeypatch.setattr(rag_ingest, "embed_batch", flaky_embed)
+    monkeypatch.setattr(rag_ingest.time, "sleep", lambda _s: pytest.fail("fixed 30s sleep on rate limit"))
+
+    assert rag_ingest._embed_batch_with_retry(0, ["a"]) == [[1.0]]
+    assert penalties == [7.5]
+
+
+def test_keyword_density_regex_prefilter_matches_term_scan() -> None:
+    def reference(text, terms, saturation_hits=4.0):
+        base = rag_query.normalize_text(text)
+        hits = sum(1.0 for term in terms if rag_query.normalize_text(term) and rag_query.normalize_text(term) in base)
+        return min(hits / saturation_hits, 1.0) if base else 0.0
+
+    texts = [
+        "",
+        "Acórdão sem sinais relevantes.",
+        "Fixou-se a TESE no Tema 123 de Repercussão Geral, efeito vinculante.",
+        "Incide a Súmula 279: reexame de fatos; não conhecimento do recurso.",
+    ]
+    for text in texts:
+        for terms in (rag_query.THESIS_SIGNAL_TERMS, rag_query.PROCEDURAL_SIGNAL_TERMS):
+            assert rag_query.keyword_density(text, terms) == reference(text, terms)
+            assert rag_query.keyword_density(rag_query.normalize_text(text), terms, normalized=True) == reference(text, terms)
+
+    assert rag_query.has_procedural_intent("Cabe agravo interno contra decisão de admissibilidade?")
+    assert rag_query.has_binding_intent("Há súmula vinculante sobre o tema?")
+    assert rag_query.has_dominant_intent("qual o entendimento dominante")
+    assert not rag_query.has_dominant_intent("prazo prescricional")
+
+
+def test_lexical_overlap_score_matches_token_set_intersection() -> None:
+    def reference(query, doc_text):
+        tokens = [t for t in rag_query.normalize_tokens(query) if t not in rag_query.LEGAL_STOP_TOKENS]
+        tokens = tokens or rag_query.normalize_tokens(query)
+        if not tokens:
+            return 0.0
+        doc_set = set(rag_query.normalize_tokens(doc_text))
+        return len(set(tokens) & doc_set) / len(set(tokens)) if doc_set else 0.0
+
+    queries = ["Prescrição intercorrente em execução fiscal", "art lei", "a b", "ICMS 2023 substituição"]
+    docs = [
+        "A prescrição intercorrente na execução fiscal (Lei 6.830) exige inércia.",
+        "Leilão de bens; prescricional; execuções fiscais.",
+        "icms2023 e ICMS-2023: substituição tributária",
+        "",
+    ]
+    for query in queries:
+        for doc in docs:
+            assert rag_query.lexical_overlap_score(query, doc) == pytest.approx(reference(query, doc))
+            assert rag_query.lexical_overlap_score(
+                query, doc, doc_norm=rag_query.normalize_text(doc)
+            ) == pytest.approx(reference(query, doc))
+
+
+def test_parse_date_is_memoized_across_formats() -> None:
+    rag_query.parse_date.cache_clear()
+    assert rag_query.parse_date("05/03/2021") == rag_query.date(2021, 3, 5)
+    assert rag_query.parse_date("2021-03-05T10:00:00Z") == rag_query.date(2021, 3, 5)
+    assert rag_query.parse_date("05/03/2021") == rag_query.date(2021, 3, 5)
+    assert rag_query.parse_date("") is None
+    assert rag_query.parse_date.cache_info().hits == 1
+
+
+def test_semantic_scores_gemini_runs_batches_on_shared_event_loop(monkeypatch) -> None:
+    import asyncio
+    import json
+    import re
+    from types import SimpleNamespace
+
+    active = {"now": 0, "peak": 0}
+
+    async def fake_generate_content(*, model, contents, config):
+        assert config.response_mime_type == "application/json"
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.02)
+        active["now"] -= 1
+        ids = [int(v) for v in re.findall(r"ID=(\d+)", contents)]
+        return SimpleNamespace(text=json.dumps([{"id": i, "score": 0.9} for i in ids]))
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=fake_generate_content)))
+    monkeypatch.setattr(rag_query, "get_gemini_client", lambda: client)
+    monkeypatch.setattr(rag_query, "_resolve_best_gemini_model", lambda name: name)
+    monkeypatch.setattr(rag_query, "GEMINI_RERANK_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_query, "GEMINI_RERANK_PASSES", 1)
+    monkeypatch.setattr(rag_query, "GEMINI_RERANK_REFINE_TOP", 0)
+    monkeypatch.setattr(rag_query, "GEMINI_RERANK_MAX_WORKERS", 3)
+
+    rows = [{"doc_id": f"d{i}", "tipo": "acordao", "texto_busca": f"texto {i}"} for i in range(8)]
+    scores = rag_query._semantic_scores_gemini("pergunta", rows, model_name_override="m")
+
+    assert scores == [pytest.approx(0.9)] * 8
+    assert 1 < active["peak"] <= 3
+
+
+def test_table_hybrid_rows_runs_vector_and_fts_legs_concurrently() -> None:
+    import threading
+
+    barrier = threading.Barrier(2, timeout=2)
+
+    class _Query:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def limit(self, _n):
+            return self
+
+        def where(self, *_a, **_k):
+            return self
+
+        def to_list(self):
+            barrier.wait()
+            return self.rows
+
+    class _Table:
+        def search(self, value, query_type=None):
+            if query_type == "fts":
+                return _Query([{"doc_id": "b", "tribunal": "STF", "tipo": "acordao", "processo": "RE 2"}])
+            return _Query([{"doc_id": "a", "tribunal": "STF", "tipo": "acordao", "processo": "RE 1"}])
+
+    rows = rag_query._table_hybrid_rows(
+        _Table(), query="q", query_vector=[0.0], top_k=5, hybrid_rrf_k=60, where_str="tribunal = 'STF'"
+    )
+
+    by_id = {row["doc_id"]: row for row in rows}
+    assert by_id["a"]["_rank_vec"] == 1 and by_id["b"]["_rank_fts"] == 1
+    assert by_id["a"]["_rrf_score"] == pytest.approx(1 / 61)
+
+
+def test_resolve_rag_tuning_coerces_clamps_and_ignores_unknown_keys():
+    defaults = rag_query.get_rag_tuning_defaults()
+    cfg = rag_query.resolve_rag_tuning(
+        {
+            "topk_hybrid": "9999",
+            "topk_rerank": 1,
+            "rerank_dedup_process": "false",
+            "generation_model": "  ",
+            "gemini_rerank_model": " modelo-x ",
+            "chave_desconhecida": 1,
+        }
+    )
+
+    assert cfg["topk_hybrid"] == 400 and isinstance(cfg["topk_hybrid"], int)
+    assert cfg["topk_rerank"] == 2
+    assert cfg["rerank_dedup_process"] is False
+    assert cfg["generation_model"] == defaults["generation_model"]
+    assert cfg["gemini_rerank_model"] == "modelo-x"
+    assert "chave_desconhecida" not in cfg
+
+    capped = rag_query.resolve_rag_tuning({"topk_hybrid": 10, "topk_rerank": 80})
+    assert capped["topk_rerank"] == 10
+
+
+def test_candidate_norm_text_is_computed_once_and_shared_by_authority(monkeypatch):
+    row = {
+        "tipo": "acordao",
+        "tribunal": "STF",
+        "processo": "ADI 1234",
+        "texto_busca": "<p>Repercussão Geral</p>",
+        "texto_integral": "x" * 2600 + " Tema",
+    }
+    norm_text, authority_text = rag_query._candidate_norm_text(row)
+
+    assert norm_text == "adi 1234\nrepercussao geral\n" + "x" * 2500
+    assert authority_text == norm_text + "x" * 100 + " tema"
+
+    assert rag_query.classify_authority(row)[1] == "A"
+
+    monkeypatch.setattr(rag_query, "normalize_text", lambda _t: pytest.fail("texto normalizado de novo"))
+    assert rag_query._candidate_norm_text(row) == (norm_text, authority_text)
+
+
+def test_cleaned_texts_and_authority_are_memoized_per_row(monkeypatch):
+    row = {
+        "tipo": "sumula_vinculante",
+        "tribunal": "STF",
+        "texto_busca": "<b>Enunciado</b>",
+        "texto_integral": "Texto&nbsp;integral",
+    }
+    busca, integral = rag_query._clean_row_texts(row)
+    authority = rag_query.classify_authority(row)
+
+    assert busca == rag_query.clean_retrieved_text(row["texto_busca"])
+    assert integral == rag_query.clean_retrieved_text(row["texto_integral"])
+
+    monkeypatch.setattr(rag_query, "clean_retrieved_text", lambda _t: pytest.fail("texto limpo de novo"))
+    monkeypatch.setattr(rag_query, "normalize_text", lambda _t: pytest.fail("autoridade recalculada"))
+    assert rag_query._clean_row_texts(row) == (busca, integral)
+    assert rag_query.classify_authority(row) == authority
+
+
+def test_normalize_text_translation_table_matches_nfkd_path():
+    samples = [
+        "Ação Direta nº 1.234 — § 2º do art. 5º; SÚMULA “vinculante”… ﬁm ½",
+        "Coração e\u0301 İstanbul",
+        "Tribunal 한국 Ελλάδα",
+        "plain ascii",
+    ]
+    for sample in samples:
+        assert rag_query.normalize_text(sample) == rag_query._normalize_text_nfkd(sample.lower())
+    assert rag_query.normalize_text(None) == ""
+    assert rag_query.normalize_text("Órgão ESPECIAL") == "orgao especial"
+
+
+def test_weighted_column_sum_matches_pure_python_fallback(monkeypatch):
+    weights = [0.6, 0.2, -0.1, 1.0]
+    columns = [[1.0, 0.5, 0.0], [0.25, 0.0, 1.0], [0.5, 1.0, 0.0], [0.03, 0.0, -0.02]]
+    expected = [0.6 + 0.05 - 0.05 + 0.03, 0.3 - 0.1, 0.2 - 0.02]
+
+    assert rag_query._weighted_column_sum(weights, columns) == pytest.approx(expected)
+    monkeypatch.setattr(rag_query, "np", None)
+    assert rag_query._weighted_column_sum(weights, columns) == pytest.approx(expected)
+
+
+def test_json_parsing_helpers_accept_fenced_arrays_and_bytes(tmp_path, monkeypatch):
+    text = 'Segue:\n```json\n[{"i": 1, "score": 0.8}]\n```'
+    assert rag_query._extract_json_array(text) == [{"i": 1, "score": 0.8}]
+    assert rag_query._extract_json_array("sem json") is None
+    assert math.isnan(rag_query._parse_metadata_extra('{"valor": NaN}')["valor"])
+    assert rag_query._parse_metadata_extra("{quebrado") == {}
+
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"sources": [{"id": "user:á"}, 3]}', encoding="utf-8")
+    monkeypatch.setattr(rag_query, "USER_ACERVO_MANIFEST", manifest)
+    assert rag_query._load_user_source_manifest() == [{"id": "user:á"}]
+
+
+def test_type_and_orgao_labels_are_cached_lookups():
+    known = next(iter(rag_query.TYPE_LABELS))
+
+    assert rag_query.type_label(known) == rag_query.TYPE_LABELS[known]
+    assert rag_query.type_label("tipo_novo_x") == "Tipo Novo X"
+    assert rag_query.type_label("") == "Documento"
+    assert rag_query.orgao_label(" Decisao MONOCRATICA ") == "Decisão Monocrática"
+    assert rag_query.orgao_label("Primeira Turma") == "Primeira Turma"
+
+    rag_query.type_label("tipo_novo_x")
+    assert rag_query.type_label.cache_info().hits >= 1
+
+
+def test_ranking_dedupe_key_is_shared_by_chunks_of_the_same_process():
+    rows = [
+        {"doc_id": "a#1", "tribunal": "STJ", "tipo": "acordao", "processo": "REsp 1.234"},
+        {"doc_id": "a#2", "tribunal": "STJ", "tipo": "acordao", "processo": "REsp 1.234"},
+        {"doc_id": "b", "tribunal": "STJ", "tipo": "acordao", "processo": None},
+    ]
+
+    keys = [rag_query._ranking_dedupe_key(row) for row in rows]
+    assert keys[0] == "stj|acordao|resp 1.234"
+    assert keys[0] is keys[1]
+    assert keys[2] == "id|b"
+
+    deduped = rag_query._dedupe_ranked_results(list(rows), top_k=2)
+    assert [row["doc_id"] for row in deduped] == ["a#1", "b"]
+
+
+def test_tuning_coercion_helpers_keep_fast_and_slow_paths_equivalent():
+    assert rag_query._as_int(7, 1) == 7
+    assert rag_query._as_int(2.6, 1) == 3
+    assert rag_query._as_int(" 4 ", 1) == 4
+    assert rag_query._as_int(True, 5) == 1
+    assert rag_query._as_int("x", 5) == 5
+    assert rag_query._as_float(0.25, 1.0) == 0.25
+    assert rag_query._as_float(2, 1.0) == 2.0 and type(rag_query._as_float(2, 1.0)) is float
+    assert rag_query._as_float(None, 1.5) == 1.5
+
+
+def test_search_lancedb_tries_binding_type_slice_before_full_scan(monkeypatch: pytest.MonkeyPatch) -> None:
+    fake_db = _FakeDB()
+    wheres: list = []
+    slice_size = {"n": 4}
+
+    def fake_rows(tbl, *, where_str=None, **_kwargs):
+        wheres.append(where_str)
+        count = slice_size["n"] if where_str and "tipo IN" in where_str else 3
+        return [{"doc_id": f"{tbl.name}-{i}", "tipo": "acordao", "_rrf_score": 1.0} for i in range(count)]
+
+    monkeypatch.setattr(rag_query.lancedb, "connect", lambda _path: fake_db)
+    monkeypatch.setattr(rag_query, "_table_hybrid_rows", fake_rows)
+    monkeypatch.setattr(rag_query, "HYBRID_INTENT_TYPE_SLICE", True)
+
+    rows = rag_query.search_lancedb(query="precedente vinculante sobre ICMS", query_vector=[0.1], sources=["tjsp"], top_k=8)
+    assert len(wheres) == 1 and "'sumula_vinculante'" in wheres[0]
+    assert len(rows) == 4
+
+    wheres.clear()
+    slice_size["n"] = 1
+    rows = rag_query.search_lancedb(query="precedente vinculante sobre ICMS", query_vector=[0.1], sources=["tjsp"], top_k=8)
+    assert len(wheres) == 2 and wheres[1] is None
+    assert len(rows) == 3
+
+    wheres.clear()
+    rag_query.search_lancedb(query="dano moral hospital", query_vector=[0.1], sources=["tjsp"], top_k=8)
+    assert wheres == [None]
+
+
+def test_rerank_results_scores_only_the_first_stage_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    scored: list[list[str]] = []
+
+    def fake_semantic(_query, rows, **_kwargs):
+        scored.append([row["doc_id"] for row in rows])
+        return [float(i) for i in range(len(rows))], "fake"
+
+    monkeypatch.setattr(rag_query, "compute_semantic_scores", fake_semantic)
+    rows = [
+        {"doc_id": f"d{i}", "tipo": "acordao", "processo": f"P{i}", "texto_busca": "icms", "_rrf_score": i / 10}
+        for i in range(6)
+    ]
+
+    ranked = rag_query.rerank_results("icms", [dict(r) for r in rows], top_k=6, prefer_recent=False)
+    assert len(scored[-1]) == 6 and len(ranked) == 6
+
+    monkeypatch.setattr(rag_query, "RERANK_SEMANTIC_POOL", 3)
+    # O pool nunca fica abaixo de 2x o top_k: com top_k=6 todos passam.
+    rag_query.rerank_results("icms", [dict(r) for r in rows], top_k=6, prefer_recent=False)
+    assert len(scored[-1]) == 6
+
+    ranked = rag_query.rerank_results("icms", [dict(r) for r in rows], top_k=1, prefer_recent=False)
+    assert scored[-1] == ["d3", "d4", "d5"]
+    assert [row["doc_id"] for row in ranked] == ["d5"]
+    top = ranked[0]
+    assert top["_final_score"] == pytest.approx(
+        top["_first_stage_score"] + rag_query.SEMANTIC_WEIGHT * top["_semantic_score"]
+    )
+
+
+def test_reranker_warm_up_loads_model_once_in_background(monkeypatch: pytest.MonkeyPatch) -> None:
+    import threading
+
+    loads: list[str] = []
+    predicted: list = []
+
+    class _Model:
+        def predict(self, pairs):
+            predicted.append(pairs)
+            return [0.0]
+
+    release = threading.Event()
+
+    def fake_load():
+        release.wait(timeout=5)
+        loads.append("load")
+        rag_query._RERANKER = _Model()
+        return rag_query._RERANKER
+
+    monkeypatch.setattr(rag_query, "RERANKER_BACKEND", "local")
+    monkeypatch.setattr(rag_query, "_RERANKER", None)
+    monkeypatch.setattr(rag_query, "_RERANKER_WARMUP_THREAD", None)
+    monkeypatch.setattr(rag_query, "_load_reranker", fake_load)
+
+    thread = rag_query.warm_up_reranker_async()
+    assert rag_query.warm_up_reranker_async() is thread
+    release.set()
+    thread.join(timeout=5)
+
+    assert isinstance(rag_query.get_reranker(), _Model)
+    assert loads == ["load"] and len(predicted) == 1
+    assert rag_query.warm_up_reranker_async() is None
+
+
+def test_onnx_reranker_predict_batches_pairs_and_applies_sigmoid(monkeypatch: pytest.MonkeyPatch) -> None:
+    np = pytest.importorskip("numpy")
+    calls: list[int] = []
+
+    class _Session:
+        def run(self, _outputs, feeds):
+            assert set(feeds) == {"input_ids", "attention_mask"}
+            assert feeds["input_ids"].dtype == np.int64
+            calls.append(len(feeds["input_ids"]))
+            return [np.zeros((len(feeds["input_ids"]), 1), dtype=np.float32)]
+
+    def tokenizer(queries, docs, **_kwargs):
+        assert len(queries) == len(docs)
+        ones = np.ones((len(queries), 4), dtype=np.int32)
+        return {"input_ids": ones, "attention_mask": ones, "token_type_ids": ones}
+
+    model = object.__new__(rag_query._OnnxCrossEncoder)
+    model.session = _Session()
+    model.input_names = {"input_ids", "attention_mask"}
+    model.tokenizer = tokenizer
+    model.max_length = 512
+
+    scores = model.predict([["q", f"doc {i}"] for i in range(5)], batch_size=2)
+    assert calls == [2, 2, 1]
+    assert scores == pytest.approx([0.5] * 5)
+
+    monkeypatch.setattr(rag_query, "RERANKER_ONNX_DIR", "/nao/existe")
+    monkeypatch.setattr(rag_query, "ort", None)
+    assert rag_query._load_onnx_reranker() is None
+
+
+def test_gemini_client_is_built_with_a_shared_keepalive_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[dict] = []
+
+    def fake_client(**kwargs):
+        created.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(rag_query.genai, "Client", fake_client)
+    monkeypatch.setattr(rag_query, "GEMINI_KEY", "chave")
+    monkeypatch.setattr(rag_query, "_CLIENT", None)
+
+    client = rag_query.get_gemini_client()
+    assert rag_query.get_gemini_client() is client
+    assert len(created) == 1
+
+    options = created[0]["http_options"]
+    limits = options.client_args["limits"]
+    assert limits.max_connections == rag_query.GEMINI_HTTP_MAX_CONNECTIONS
+    assert limits.keepalive_expiry == 120.0
+
+
+def test_gemini_client_keeps_httpx_only_options_off_the_async_transport(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[dict] = []
+
+    def fake_client(**kwargs):
+        created.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(rag_query.genai, "Client", fake_client)
+    rag_query._new_gemini_client("chave")
+
+    options = created[0]["http_options"]
+    # O transporte aio pode ser aiohttp, que rejeita kwargs exclusivos do httpx.
+    async_args = getattr(options, "async_client_args", None) or {}
+    assert not {"limits", "http2"} & set(async_args)
+    assert "limits" in options.client_args
+
+
+def test_context_passages_rank_by_query_tokens_without_retokenizing(monkeypatch: pytest.MonkeyPatch) -> None:
+    row = {
+        "texto_busca": "",
+        "texto_integral": (
+            "Paragrafo sobre outro assunto qualquer, sem relacao com a pergunta feita.\n\n"
+            "A incidencia do ICMS sobre a tarifa de energia foi afastada pelo tribunal."
+        ),
+    }
+    rag_query._query_token_pattern("icms energia")
+    monkeypatch.setattr(rag_query, "normalize_tokens", lambda _t: pytest.fail("consulta tokenizada de novo"))
+
+    passages = rag_query._extract_context_passages("icms energia", row)
+    assert passages and "ICMS" in passages[0]
+
+
+def test_rerank_results_without_dedup_selects_top_k_in_rank_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        rag_query, "compute_semantic_scores", lambda _q, rows, **_k: ([float(i % 4) for i in range(len(rows))], "fake")
+    )
+    rows = [{"doc_id": f"d{i}", "tipo": "acordao", "processo": "P", "texto_busca": ""} for i in range(9)]
+    cfg = rag_query.resolve_rag_tuning({"rerank_dedup_process": False})
+
+    top = rag_query.rerank_results("icms", [dict(r) for r in rows], top_k=3, prefer_recent=False, config=cfg)
+    ranked = sorted(
+        rag_query.rerank_results("icms", [dict(r) for r in rows], top_k=9, prefer_recent=False, config=cfg),
+        key=lambda r: r["_final_score"],
+        reverse=True,
+    )
+
+    assert [r["doc_id"] for r in top] == [r["doc_id"] for r in ranked[:3]] == ["d3", "d7", "d2"]
+
+
+def test_clean_retrieved_text_strips_tags_in_one_pass():
+    raw = "<p>Ementa &amp; tese</p>\r\n<ul><LI class='x'>item</li></ul><br/>\n\n\n\n<b>fim</b>"
+
+    assert rag_query.clean_retrieved_text(raw) == "Ementa & tese\n\n- item\n\nfim"
+    assert rag_query.clean_retrieved_text("texto simples") == "texto simples"
+    assert rag_query.clean_retrieved_text(None) == ""
+
+
+def test_record_batch_keeps_raw_vectors_by_default(monkeypatch) -> None:
+    monkeypatch.setattr(rag_ingest, "EMBED_L2_NORMALIZE", False)
+    dim = rag_ingest.EMBED_DIM
+    raw = [[3.0, 4.0] + [0.0] * (dim - 2)]
+    batch = rag_ingest._record_batch([_ingest_doc("a")], raw)
+
+    assert batch.column("vector").to_pylist()[0][:2] == pytest.approx([3.0, 4.0], abs=1e-3)
+
+    monkeypatch.setattr(rag_ingest, "np", None)
+    assert rag_ingest._record_batch([_ingest_doc("a")], raw).column("vector").to_pylist() == batch.column("vector").to_pylist()